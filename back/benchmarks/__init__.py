@@ -0,0 +1,17 @@
+"""
+Benchmarks for the analysis functions and API endpoints, run on synthetic LA-like data.
+Suites follow asv conventions (setup plus time_* methods, params over row counts);
+`python -m benchmarks.run` from back/ runs them without asv and saves JSON results.
+"""
+import os
+from typing import List
+
+# Row counts every suite is parametrized over; BENCH_SIZES="10000,1000000" overrides them
+DEFAULT_SIZES = [10_000, 100_000]
+
+
+def bench_sizes() -> List[int]:
+    sizes = os.environ.get('BENCH_SIZES')
+    if not sizes:
+        return list(DEFAULT_SIZES)
+    return [int(size) for size in sizes.split(',') if size.strip()]
@@ -0,0 +1,126 @@
+import time
+from benchmarks import bench_sizes
+from benchmarks.synthetic import crime_frame, safety_frame
+from kmeans import build_time_location_features, deduplicate_rows, kmeans, run_hotspot_kmeans
+from near_repeat import run_near_repeat
+from sequence_mining import NUMBA_AVAILABLE, PrefixSpan, prepare_crime_sequence_store, prepare_crime_sequences
+from weather_analysis import run_seasonal_analysis
+
+# About the size of the full LA crime dataset, for suites whose cost matters most there
+FULL_LA_ROWS = 1_000_000
+
+# Column names of the cleaned crime data, which run_hotspot_kmeans takes explicitly
+HOTSPOT_COLUMNS = dict(datetime_col='date', time_col='time', lat_col='latitude', lon_col='longitude')
+
+
+class HotspotKMeans:
+    params = bench_sizes()
+    param_names = ['n_rows']
+    timeout = 600
+
+    def setup(self, n_rows):
+        self.df = crime_frame(n_rows)
+
+    def time_run_hotspot_kmeans(self, n_rows):
+        run_hotspot_kmeans(self.df, random_state=0, **HOTSPOT_COLUMNS)
+
+    def time_run_hotspot_kmeans_no_assignments(self, n_rows):
+        run_hotspot_kmeans(self.df, random_state=0, assignments=False, **HOTSPOT_COLUMNS)
+
+
+class KMeansFit:
+    """
+    K-Means alone on the feature matrix, with coordinates as given or snapped to a ~1 km grid,
+    which bounds the distinct (location, hour, weekday) points the way LAPD's block centroids do.
+    """
+    params = [bench_sizes(), ['raw', 'snapped']]
+    param_names = ['n_rows', 'coordinates']
+    timeout = 600
+
+    def setup(self, n_rows, coordinates):
+        df = crime_frame(n_rows)
+        if coordinates == 'snapped':
+            df = df.assign(latitude=df['latitude'].round(2), longitude=df['longitude'].round(2))
+        self.X, _ = build_time_location_features(df, **HOTSPOT_COLUMNS)
+
+    def time_kmeans(self, n_rows, coordinates):
+        kmeans(self.X, 8, random_state=0)
+
+    def track_distinct_share(self, n_rows, coordinates):
+        return len(deduplicate_rows(self.X)[1]) / len(self.X)
+
+    track_distinct_share.unit = 'ratio'
+
+
+class CrimeSequences:
+    params = [bench_sizes(), ['temporal_only', 'area_based', 'spatial_temporal']]
+    param_names = ['n_rows', 'grouping_method']
+    timeout = 600
+
+    def setup(self, n_rows, grouping_method):
+        self.df = crime_frame(n_rows)
+
+    def time_prepare_crime_sequences(self, n_rows, grouping_method):
+        prepare_crime_sequences(self.df, area_col='area_name', grouping_method=grouping_method)
+
+    def time_prepare_crime_sequence_store(self, n_rows, grouping_method):
+        prepare_crime_sequence_store(self.df, area_col='area_name', grouping_method=grouping_method)
+
+
+class PrefixSpanFit:
+    params = [bench_sizes(), ['python', 'numba']]
+    param_names = ['n_rows', 'backend']
+    timeout = 600
+
+    def setup(self, n_rows, backend):
+        if backend == 'numba' and not NUMBA_AVAILABLE:
+            raise NotImplementedError("numba is not installed")
+        self.store = prepare_crime_sequence_store(crime_frame(n_rows), area_col='area_name', grouping_method='area_based')
+        self.sequences = self.store.to_lists()
+        # Compile (or load the cached kernels) outside the timed call
+        PrefixSpan(0.05, backend=backend).fit(self.sequences[:100])
+
+    def time_fit(self, n_rows, backend):
+        PrefixSpan(0.01, backend=backend).fit(self.sequences)
+
+    def time_fit_csr(self, n_rows, backend):
+        PrefixSpan(0.01, backend=backend).fit_csr(self.store.offsets, self.store.items)
+
+
+class SeasonalAnalysis:
+    params = [bench_sizes(), ['native', 'mlxtend']]
+    param_names = ['n_rows', 'engine']
+    timeout = 600
+
+    def setup(self, n_rows, engine):
+        self.crime = crime_frame(n_rows)
+        self.safety = safety_frame(max(1, n_rows // 10))
+
+    def time_crime_data(self, n_rows, engine):
+        run_seasonal_analysis(self.crime, engine=engine)
+
+    def time_safety_data(self, n_rows, engine):
+        run_seasonal_analysis(self.safety, engine=engine)
+
+
+class NearRepeat:
+    """
+    Knox near-repeat test over every crime at full LA size: the observed table alone (the
+    endpoint's default) and, once, the wall time of 99 permutations on NEAR_REPEAT_WORKERS threads.
+    """
+    params = [FULL_LA_ROWS]
+    param_names = ['n_rows']
+    timeout = 3600
+
+    def setup(self, n_rows):
+        self.df = crime_frame(n_rows)
+
+    def time_observed(self, n_rows):
+        run_near_repeat(self.df, permutations=0)
+
+    def track_permutations_99(self, n_rows):
+        start = time.perf_counter()
+        run_near_repeat(self.df, permutations=99, random_state=0)
+        return round(time.perf_counter() - start, 1)
+
+    track_permutations_99.unit = 's'
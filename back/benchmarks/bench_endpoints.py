@@ -0,0 +1,201 @@
+import importlib
+import math
+import os
+import sys
+import tempfile
+from benchmarks import bench_sizes
+from benchmarks.bench_analysis import HOTSPOT_COLUMNS
+from benchmarks.synthetic import dataset_env, write_datasets
+from compression import available_encodings
+
+# Downtown LA, used for the proximity, bounding-box and tile requests
+CENTER_LAT = 34.0443
+CENTER_LON = -118.2470
+TILE_ZOOM = 12
+
+_clients = {}
+
+# The read-only pages the app fetches on every visit
+VISIT_PAGES = [
+    ('/api/seasons', {}),
+    ('/api/hotspot_grid', {}),
+    ('/api/time_of_day', {}),
+    ('/api/cleaned_data_preview', {}),
+    ('/api/crime_data_preview', {}),
+]
+
+
+# A TestClient over a fresh import of main.py loaded with n_rows synthetic crimes
+def endpoint_client(n_rows: int):
+    if n_rows not in _clients:
+        from fastapi.testclient import TestClient
+
+        directory = os.path.join(tempfile.gettempdir(), 'crime-benchmarks', str(n_rows))
+        os.environ.update(dataset_env(*write_datasets(directory, n_rows)))
+        sys.modules.pop('main', None)
+        main = importlib.import_module('main')
+        # Load synchronously; the client is not entered, so the lifespan's background load never runs
+        main.startup()
+        _clients.clear()
+        _clients[n_rows] = TestClient(main.app)
+    return _clients[n_rows]
+
+
+def tile_for(lat: float, lon: float, zoom: int):
+    n = 2 ** zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return zoom, x, y
+
+
+class Endpoints:
+    params = bench_sizes()
+    param_names = ['n_rows']
+    timeout = 900
+
+    def setup(self, n_rows):
+        self.client = endpoint_client(n_rows)
+
+    def _get(self, url, **params):
+        response = self.client.get(url, params=params)
+        response.raise_for_status()
+        return response
+
+    def _post(self, url, payload):
+        response = self.client.post(url, json=payload)
+        response.raise_for_status()
+        return response
+
+    def time_seasons(self, n_rows):
+        self._get('/api/seasons')
+
+    def time_weather_analysis_crime(self, n_rows):
+        self._post('/api/weather_analysis', {'dataset_name': 'crime_data'})
+
+    def time_weather_analysis_safety(self, n_rows):
+        self._post('/api/weather_analysis', {'dataset_name': 'safety_data'})
+
+    def time_hotspots(self, n_rows):
+        self._post('/api/hotspots', {'k': 5, 'random_state': 0, **HOTSPOT_COLUMNS})
+
+    # After the first run the features are cached, like a user tweaking k on the segment page
+    def time_hotspots_summary(self, n_rows):
+        self._post('/api/hotspots', {'k': 8, 'random_state': 1, 'assignments': False, **HOTSPOT_COLUMNS})
+
+    def time_hotspots_stream(self, n_rows):
+        self._post('/api/hotspots', {'k': 5, 'random_state': 0, 'stream': True, **HOTSPOT_COLUMNS})
+
+    def time_cleaned_data_preview(self, n_rows):
+        self._get('/api/cleaned_data_preview')
+
+    def time_crime_data_preview(self, n_rows):
+        self._get('/api/crime_data_preview')
+
+    def time_hotspot_grid_sparse(self, n_rows):
+        self._get('/api/hotspot_grid')
+
+    def time_hotspot_grid_nested(self, n_rows):
+        self._get('/api/hotspot_grid', format='nested')
+
+    def time_hotspot_gi(self, n_rows):
+        self._get('/api/hotspot_gi', bin_size=0.005)
+
+    def time_hotspot_gi_permutations(self, n_rows):
+        self._get('/api/hotspot_gi', bin_size=0.01, permutations=99, random_state=0)
+
+    def time_spatial_grid(self, n_rows):
+        self._get('/api/spatial_grid', bin_size=0.01)
+
+    def time_crimes_near(self, n_rows):
+        self._get('/api/crimes_near', lat=CENTER_LAT, lon=CENTER_LON, radius_m=500)
+
+    def time_crimes_in_bbox(self, n_rows):
+        self._get('/api/crimes_in_bbox', min_lat=34.0, min_lon=-118.3, max_lat=34.1, max_lon=-118.2)
+
+    def time_tile(self, n_rows):
+        z, x, y = tile_for(CENTER_LAT, CENTER_LON, TILE_ZOOM)
+        self._get(f'/api/tiles/{z}/{x}/{y}')
+
+    def time_near_repeat(self, n_rows):
+        self._get('/api/near_repeat', permutations=19, random_state=0)
+
+    def time_kde(self, n_rows):
+        self._get('/api/kde', format='bin')
+
+    def time_kde_fine(self, n_rows):
+        self._get('/api/kde', cell_size_m=50, bandwidth_m=150, format='bin')
+
+    def time_time_of_day(self, n_rows):
+        self._get('/api/time_of_day')
+
+    def time_crime_sequences_get(self, n_rows):
+        self._get('/api/crime_sequences', min_support=0.01)
+
+    def time_crime_sequences_post_area(self, n_rows):
+        self._post('/api/crime_sequences', {'grouping_method': 'area_based', 'min_support': 0.01})
+
+    # A user tuning min_support on the sequences page; the sessionized store is built once
+    def time_crime_sequences_support_tuning(self, n_rows):
+        for min_support in (0.05, 0.03, 0.02):
+            self._post('/api/crime_sequences', {'grouping_method': 'area_based', 'min_support': min_support})
+
+    # The same three levels from one mining pass at the lowest
+    def time_crime_sequences_support_sweep(self, n_rows):
+        self._post('/api/crime_sequences', {'grouping_method': 'area_based', 'min_support': 0.05, 'support_sweep': [0.05, 0.03, 0.02]})
+
+    def time_crime_sequences_stream(self, n_rows):
+        self._get('/api/crime_sequences', min_support=0.01, stream='true')
+
+
+class RepeatVisits:
+    """
+    Body bytes on the wire and latency for the VISIT_PAGES of one visit: a first visit
+    without compression, a first visit with the best installed coding, and a repeat
+    visit that revalidates with If-None-Match and gets 304s.
+    """
+    params = bench_sizes()
+    param_names = ['n_rows']
+    timeout = 900
+
+    def setup(self, n_rows):
+        self.client = endpoint_client(n_rows)
+        self.encoding = ', '.join(available_encodings())
+        self.etags = {}
+        for url, params in VISIT_PAGES:
+            response = self.client.get(url, params=params, headers={'Accept-Encoding': self.encoding})
+            response.raise_for_status()
+            self.etags[url] = response.headers['etag']
+
+    # Total body bytes received for one visit
+    def _visit(self, encoding: str, revalidate: bool = False) -> int:
+        received = 0
+        for url, params in VISIT_PAGES:
+            headers = {'Accept-Encoding': encoding}
+            if revalidate:
+                headers['If-None-Match'] = self.etags[url]
+            response = self.client.get(url, params=params, headers=headers)
+            if response.status_code != (304 if revalidate else 200):
+                raise RuntimeError(f"{url}: unexpected status {response.status_code}")
+            received += response.num_bytes_downloaded
+        return received
+
+    def time_first_visit(self, n_rows):
+        self._visit('identity')
+
+    def time_first_visit_compressed(self, n_rows):
+        self._visit(self.encoding)
+
+    def time_repeat_visit(self, n_rows):
+        self._visit(self.encoding, revalidate=True)
+
+    def track_bytes_first_visit(self, n_rows):
+        return self._visit('identity')
+    track_bytes_first_visit.unit = 'bytes'
+
+    def track_bytes_first_visit_compressed(self, n_rows):
+        return self._visit(self.encoding)
+    track_bytes_first_visit_compressed.unit = 'bytes'
+
+    def track_bytes_repeat_visit(self, n_rows):
+        return self._visit(self.encoding, revalidate=True)
+    track_bytes_repeat_visit.unit = 'bytes'
@@ -0,0 +1,199 @@
+"""
+Runs the benchmark suites without asv and saves the timings as JSON, one file per run:
+
+    cd back
+    python -m benchmarks.run --sizes 10000 100000
+    python -m benchmarks.run --bench 'PrefixSpanFit|Endpoints.time_seasons' --repeat 10
+    python -m benchmarks.run --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+track_* methods (asv convention) are called once and their return value saved, e.g. bytes sent.
+"""
+import argparse
+import importlib
+import inspect
+import itertools
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+BENCH_MODULES = ['benchmarks.bench_analysis', 'benchmarks.bench_endpoints']
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+# Median slowdown (new / old) above which --compare reports a regression
+REGRESSION_RATIO = 1.10
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def library_versions() -> Dict[str, Optional[str]]:
+    versions = {}
+    for name in ('numpy', 'pandas', 'scipy', 'fastapi', 'numba', 'orjson'):
+        try:
+            versions[name] = importlib.import_module(name).__version__
+        except ImportError:
+            versions[name] = None
+    return versions
+
+
+# Every combination of a suite's params, asv style (a flat list means a single parameter)
+def param_combinations(suite) -> List[tuple]:
+    params = getattr(suite, 'params', None)
+    if params is None:
+        return [()]
+    if len(getattr(suite, 'param_names', [])) <= 1:
+        return [(value,) for value in params]
+    return list(itertools.product(*params))
+
+
+def discover(pattern: Optional[str]):
+    selected = re.compile(pattern) if pattern else None
+    for module_name in BENCH_MODULES:
+        module = importlib.import_module(module_name)
+        for suite_name, suite in inspect.getmembers(module, inspect.isclass):
+            if suite.__module__ != module.__name__:
+                continue
+            methods = [name for name in dir(suite) if name.startswith(('time_', 'track_'))]
+            methods = [name for name in methods if not selected or selected.search(f"{suite_name}.{name}")]
+            if methods:
+                yield suite_name, suite, methods
+
+
+def time_call(func, args, repeat: int, min_time: float) -> List[float]:
+    func(*args)  # warm-up: caches, lazily built indexes, JIT compilation
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat or time.perf_counter() - started < min_time:
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_benchmarks(pattern: Optional[str], repeat: int, min_time: float) -> List[Dict[str, object]]:
+    results = []
+    for suite_name, suite, methods in discover(pattern):
+        names = list(getattr(suite, 'param_names', []))
+        for combo in param_combinations(suite):
+            params = dict(zip(names, combo))
+            instance = suite()
+            try:
+                if hasattr(instance, 'setup'):
+                    instance.setup(*combo)
+            except NotImplementedError:  # asv convention for "skip this combination"
+                continue
+            for method in methods:
+                name = f"{suite_name}.{method}"
+                record: Dict[str, object] = {'name': name, 'params': params}
+                if method.startswith('track_'):
+                    try:
+                        record['value'] = getattr(instance, method)(*combo)
+                    except Exception as exc:
+                        record['error'] = f"{type(exc).__name__}: {exc}"
+                        print(f"{name} {params}: FAILED ({record['error']})", flush=True)
+                    else:
+                        record['unit'] = getattr(getattr(suite, method), 'unit', '')
+                        print(f"{name} {params}: {record['value']} {record['unit']}", flush=True)
+                    results.append(record)
+                    continue
+                try:
+                    times = time_call(getattr(instance, method), combo, repeat, min_time)
+                except Exception as exc:
+                    record['error'] = f"{type(exc).__name__}: {exc}"
+                    print(f"{name} {params}: FAILED ({record['error']})", flush=True)
+                else:
+                    record.update({
+                        'times': times,
+                        'min': min(times),
+                        'median': statistics.median(times),
+                        'mean': statistics.fmean(times),
+                        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+                    })
+                    print(f"{name} {params}: median {record['median'] * 1000:.2f} ms over {len(times)} runs", flush=True)
+                results.append(record)
+    return results
+
+
+def compare(old_path: str, new_path: str, threshold: float = REGRESSION_RATIO) -> int:
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def keyed(run):
+        return {
+            (r['name'], json.dumps(r['params'], sort_keys=True)): r
+            for r in run['benchmarks'] if 'median' in r
+        }
+
+    old_results = keyed(old)
+    regressions = 0
+    print(f"{'benchmark':70s} {'old ms':>10s} {'new ms':>10s} {'ratio':>7s}")
+    for key, record in sorted(keyed(new).items()):
+        if key not in old_results:
+            continue
+        ratio = record['median'] / old_results[key]['median']
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        label = f"{key[0]} {key[1]}"
+        print(f"{label[:70]:70s} {old_results[key]['median'] * 1000:10.2f} {record['median'] * 1000:10.2f} {ratio:7.2f}{flag}")
+    print(f"\n{regressions} regression(s) above {threshold:.2f}x ({old.get('commit')} -> {new.get('commit')})")
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the crime analysis benchmarks")
+    parser.add_argument('--sizes', type=int, nargs='+', help="row counts to benchmark (default 10000 100000)")
+    parser.add_argument('--bench', help="regex selecting Suite.time_method / Suite.track_method names")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument('--min-time', type=float, default=0.0, help="keep repeating until this many seconds")
+    parser.add_argument('--out', default=RESULTS_DIR, help="directory for the JSON results")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+
+    # Suites read their sizes at import time
+    if args.sizes:
+        os.environ['BENCH_SIZES'] = ','.join(str(size) for size in args.sizes)
+    from benchmarks import bench_sizes
+
+    commit = git_commit()
+    created = datetime.now(timezone.utc)
+    run = {
+        'commit': commit,
+        'created': created.isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'versions': library_versions(),
+        'sizes': bench_sizes(),
+        'repeat': args.repeat,
+        'benchmarks': run_benchmarks(args.bench, args.repeat, args.min_time),
+    }
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{(commit or 'nocommit')[:10]}-{created.strftime('%Y%m%dT%H%M%S')}.json")
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"\nSaved {len(run['benchmarks'])} results to {path}")
+    return 1 if any('error' in r for r in run['benchmarks']) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+import os
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# LAPD areas (AREA code, name, approximate station latitude/longitude, relative crime volume)
+LA_AREAS = [
+    (1, 'Central', 34.0443, -118.2470, 1.40),
+    (2, 'Rampart', 34.0670, -118.2670, 0.95),
+    (3, 'Southwest', 34.0140, -118.3050, 1.10),
+    (4, 'Hollenbeck', 34.0450, -118.2130, 0.75),
+    (5, 'Harbor', 33.7570, -118.2890, 0.80),
+    (6, 'Hollywood', 34.0980, -118.3310, 1.00),
+    (7, 'Wilshire', 34.0460, -118.3430, 0.95),
+    (8, 'West LA', 34.0430, -118.4510, 0.90),
+    (9, 'Van Nuys', 34.1720, -118.4490, 0.85),
+    (10, 'West Valley', 34.1930, -118.5460, 0.80),
+    (11, 'Northeast', 34.1190, -118.2490, 0.85),
+    (12, '77th Street', 33.9700, -118.3000, 1.30),
+    (13, 'Newton', 34.0120, -118.2560, 0.95),
+    (14, 'Pacific', 33.9910, -118.4200, 1.05),
+    (15, 'N Hollywood', 34.1710, -118.3860, 0.95),
+    (16, 'Foothill', 34.2530, -118.4100, 0.60),
+    (17, 'Devonshire', 34.2570, -118.5310, 0.75),
+    (18, 'Southeast', 33.9380, -118.2750, 1.00),
+    (19, 'Mission', 34.2730, -118.4680, 0.80),
+    (20, 'Olympic', 34.0500, -118.2910, 0.95),
+    (21, 'Topanga', 34.1930, -118.6000, 0.75),
+]
+
+# Common LA crime descriptions with relative frequency and the share committed with a weapon
+LA_CRIME_TYPES = [
+    ('VEHICLE - STOLEN', 11.0, 0.00),
+    ('BATTERY - SIMPLE ASSAULT', 7.5, 0.97),
+    ('THEFT OF IDENTITY', 6.3, 0.00),
+    ('BURGLARY FROM VEHICLE', 6.1, 0.01),
+    ('BURGLARY', 6.0, 0.02),
+    ('VANDALISM - FELONY ($400 & OVER, ALL CHURCH VANDALISMS)', 5.9, 0.03),
+    ('ASSAULT WITH DEADLY WEAPON, AGGRAVATED ASSAULT', 5.3, 1.00),
+    ('THEFT PLAIN - PETTY ($950 & UNDER)', 5.1, 0.01),
+    ('INTIMATE PARTNER - SIMPLE ASSAULT', 4.6, 0.98),
+    ('THEFT FROM MOTOR VEHICLE - PETTY ($950 & UNDER)', 3.9, 0.00),
+    ('THEFT-GRAND ($950.01 & OVER)EXCPT,GUNS,FOWL,LIVESTK,PROD', 3.6, 0.01),
+    ('ROBBERY', 3.3, 1.00),
+    ('SHOPLIFTING - PETTY THEFT ($950 & UNDER)', 3.1, 0.01),
+    ('VANDALISM - MISDEAMEANOR ($399 OR UNDER)', 2.4, 0.03),
+    ('CRIMINAL THREATS - NO WEAPON DISPLAYED', 2.0, 0.90),
+    ('BRANDISH WEAPON', 1.2, 1.00),
+    ('TRESPASSING', 1.1, 0.05),
+    ('BIKE - STOLEN', 0.9, 0.00),
+    ('LETTERS, LEWD  -  TELEPHONE CALLS, LEWD', 0.5, 0.02),
+    ('ARSON', 0.3, 0.10),
+]
+
+LA_WEAPONS = [
+    ('STRONG-ARM (HANDS, FIST, FEET OR BODILY FORCE)', 0.55),
+    ('UNKNOWN WEAPON/OTHER WEAPON', 0.12),
+    ('VERBAL THREAT', 0.10),
+    ('HAND GUN', 0.08),
+    ('SEMI-AUTOMATIC PISTOL', 0.05),
+    ('KNIFE WITH BLADE 6INCHES OR LESS', 0.05),
+    ('OTHER KNIFE', 0.05),
+]
+
+LA_PREMISES = [
+    ('STREET', 0.26), ('SINGLE FAMILY DWELLING', 0.17), ('MULTI-UNIT DWELLING (APARTMENT, DUPLEX, ETC)', 0.12),
+    ('PARKING LOT', 0.07), ('OTHER BUSINESS', 0.05), ('SIDEWALK', 0.05), ('VEHICLE, PASSENGER/TRUCK', 0.04),
+    ('GARAGE/CARPORT', 0.02), ('DRIVEWAY', 0.02), ('RESTAURANT/FAST FOOD', 0.02), ('DEPARTMENT STORE', 0.02),
+    ('OTHER PREMISE', 0.16),
+]
+
+# Relative crime volume per hour of day: low before dawn, rising through the day, a noon spike
+HOURLY_WEIGHTS = np.array([
+    4.8, 2.9, 2.5, 2.0, 1.6, 1.6, 2.2, 2.9, 3.9, 4.0, 4.2, 4.3,
+    6.9, 4.5, 4.6, 4.9, 5.0, 5.3, 5.5, 5.2, 5.1, 4.6, 4.3, 3.6,
+])
+
+# Second dataset: the national crime-and-safety table main.py loads as safetyDF
+SAFETY_CRIME_TYPES = ['Theft', 'Assault', 'Burglary', 'Fraud', 'Vandalism', 'Robbery', 'Homicide', 'Arson']
+SAFETY_WEAPONS = ['Unarmed', 'Knife', 'Gun', 'Blunt Object', 'Other']
+SAFETY_CITIES = [
+    ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Houston', 'TX'), ('Phoenix', 'AZ'),
+    ('Philadelphia', 'PA'), ('San Antonio', 'TX'), ('New York', 'NY'), ('Miami', 'FL'),
+]
+
+DEFAULT_SEED = 0
+DEFAULT_START = '2020-01-01'
+DEFAULT_END = '2024-12-31'
+
+
+def _weights(values) -> np.ndarray:
+    weights = np.asarray(values, dtype=float)
+    return weights / weights.sum()
+
+
+# Same month -> season mapping as weather_analysis.get_season, vectorized
+def _seasons(month: np.ndarray) -> np.ndarray:
+    return np.select(
+        [np.isin(month, [12, 1, 2]), np.isin(month, [3, 4, 5]), np.isin(month, [6, 7, 8])],
+        ['Winter', 'Spring', 'Summer'],
+        default='Fall',
+    )
+
+
+def _random_days(rng: np.random.Generator, n_rows: int, start: str, end: str) -> np.ndarray:
+    days = pd.date_range(start, end, freq='D')
+    # Mild seasonality: a little more crime in summer than in winter
+    weights = _weights(1.0 + 0.08 * np.sin(2 * np.pi * (days.dayofyear.to_numpy() - 100) / 365.25))
+    return days.to_numpy()[rng.choice(days.size, size=n_rows, p=weights)]
+
+
+def generate_crime_data(
+    n_rows: int,
+    *,
+    seed: int = DEFAULT_SEED,
+    start: str = DEFAULT_START,
+    end: str = DEFAULT_END,
+) -> pd.DataFrame:
+    """
+    LA-like rows in the layout preprocess_data.py writes to crime_data_cleaned.csv
+    (date, time as HHMM, latitude/longitude, crime_type, AREA, area_name, weapon_used, ...),
+    with dates as 'YYYY-MM-DD' strings the way read_csv returns them. Fully vectorized
+    (about 2s per million rows); the same seed always gives the same frame.
+    """
+    if n_rows < 0:
+        raise ValueError("n_rows has to be non-negative")
+    rng = np.random.default_rng(seed)
+
+    area_codes = np.array([a[0] for a in LA_AREAS])
+    area_names = np.array([a[1] for a in LA_AREAS], dtype=object)
+    centers = np.array([(a[2], a[3]) for a in LA_AREAS])
+    area = rng.choice(len(LA_AREAS), size=n_rows, p=_weights([a[4] for a in LA_AREAS]))
+
+    # Points scatter around the area center, with a share pulled into a few tight hotspots per area
+    lat = centers[area, 0] + rng.normal(0, 0.018, n_rows)
+    lon = centers[area, 1] + rng.normal(0, 0.022, n_rows)
+    hotspot_offsets = rng.normal(0, 0.01, size=(len(LA_AREAS), 3, 2))
+    in_hotspot = rng.random(n_rows) < 0.25
+    spot = rng.integers(0, 3, n_rows)
+    lat = np.where(in_hotspot, centers[area, 0] + hotspot_offsets[area, spot, 0] + rng.normal(0, 0.002, n_rows), lat)
+    lon = np.where(in_hotspot, centers[area, 1] + hotspot_offsets[area, spot, 1] + rng.normal(0, 0.002, n_rows), lon)
+    lat = np.round(lat, 4)
+    lon = np.round(lon, 4)
+
+    crime_names = np.array([c[0] for c in LA_CRIME_TYPES], dtype=object)
+    crime = rng.choice(len(LA_CRIME_TYPES), size=n_rows, p=_weights([c[1] for c in LA_CRIME_TYPES]))
+    weapon_used = (rng.random(n_rows) < np.array([c[2] for c in LA_CRIME_TYPES])[crime]).astype(int)
+    weapon_names = np.array([w[0] for w in LA_WEAPONS], dtype=object)
+    weapon = weapon_names[rng.choice(len(LA_WEAPONS), size=n_rows, p=_weights([w[1] for w in LA_WEAPONS]))]
+    weapon_description = np.where(weapon_used == 1, weapon, None)
+    premise_names = np.array([p[0] for p in LA_PREMISES], dtype=object)
+    premise = premise_names[rng.choice(len(LA_PREMISES), size=n_rows, p=_weights([p[1] for p in LA_PREMISES]))]
+
+    dates = pd.DatetimeIndex(_random_days(rng, n_rows, start, end))
+    hour = rng.choice(24, size=n_rows, p=_weights(HOURLY_WEIGHTS))
+    # Reports cluster on the hour and half hour
+    minute = np.where(rng.random(n_rows) < 0.45, rng.choice([0, 30], size=n_rows), rng.integers(0, 60, n_rows))
+    month = dates.month.to_numpy()
+    day_of_week = dates.dayofweek.to_numpy()
+
+    lat_span = lat.max() - lat.min() if n_rows else 1.0
+    lon_span = lon.max() - lon.min() if n_rows else 1.0
+    return pd.DataFrame({
+        'date': np.datetime_as_string(dates.to_numpy(), unit='D').astype(object),
+        'time': hour * 100 + minute,
+        'latitude': lat,
+        'longitude': lon,
+        'crime_type': crime_names[crime],
+        'weapon_description': weapon_description,
+        'AREA': area_codes[area],
+        'area_name': area_names[area],
+        'Premis Desc': premise,
+        'hour': hour,
+        'minute': minute,
+        'lat_norm': (lat - lat.min()) / lat_span if n_rows else lat,
+        'lon_norm': (lon - lon.min()) / lon_span if n_rows else lon,
+        'season': _seasons(month).astype(object),
+        'weapon_used': weapon_used,
+        'year': dates.year.to_numpy(),
+        'month': month,
+        'day_of_week': day_of_week,
+        'is_weekend': (day_of_week >= 5).astype(int),
+        'time_period': pd.cut(
+            hour, bins=[0, 6, 12, 18, 24], labels=['Night', 'Morning', 'Afternoon', 'Evening'], include_lowest=True
+        ).astype(object),
+    })
+
+
+# Rows shaped like crime_safety_cleaned.csv (the second dataset served by /api/weather_analysis)
+def generate_safety_data(
+    n_rows: int,
+    *,
+    seed: int = DEFAULT_SEED,
+    start: str = DEFAULT_START,
+    end: str = DEFAULT_END,
+) -> pd.DataFrame:
+    if n_rows < 0:
+        raise ValueError("n_rows has to be non-negative")
+    rng = np.random.default_rng(seed + 1)
+    dates = pd.DatetimeIndex(_random_days(rng, n_rows, start, end))
+    city = rng.integers(0, len(SAFETY_CITIES), n_rows)
+    month = dates.month.to_numpy()
+    day_of_week = dates.dayofweek.to_numpy()
+    return pd.DataFrame({
+        'id': np.arange(1, n_rows + 1),
+        'date': np.datetime_as_string(dates.to_numpy(), unit='D').astype(object),
+        'time': np.char.add(np.char.zfill(rng.integers(0, 24, n_rows).astype(str), 2), ':00').astype(object),
+        'crime_type': np.array(SAFETY_CRIME_TYPES, dtype=object)[
+            rng.choice(len(SAFETY_CRIME_TYPES), size=n_rows, p=_weights([8, 6, 5, 5, 4, 3, 1, 1]))
+        ],
+        'city': np.array([c[0] for c in SAFETY_CITIES], dtype=object)[city],
+        'state': np.array([c[1] for c in SAFETY_CITIES], dtype=object)[city],
+        'victim_age': rng.integers(10, 90, n_rows),
+        'victim_gender': np.array(['Male', 'Female', 'Other'], dtype=object)[
+            rng.choice(3, size=n_rows, p=[0.49, 0.49, 0.02])
+        ],
+        'victim_race': np.array(['White', 'Black', 'Hispanic', 'Asian', 'Other'], dtype=object)[
+            rng.integers(0, 5, n_rows)
+        ],
+        'weapon_used': np.array(SAFETY_WEAPONS, dtype=object)[
+            rng.choice(len(SAFETY_WEAPONS), size=n_rows, p=_weights([5, 2, 2, 1, 1]))
+        ],
+        'season': _seasons(month).astype(object),
+        'year': dates.year.to_numpy(),
+        'month': month,
+        'day_of_week': day_of_week,
+        'is_weekend': (day_of_week >= 5).astype(int),
+    })
+
+
+# Frames are cached per (size, seed) so benchmark setup does not regenerate them
+@lru_cache(maxsize=4)
+def crime_frame(n_rows: int, seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    return generate_crime_data(n_rows, seed=seed)
+
+
+@lru_cache(maxsize=4)
+def safety_frame(n_rows: int, seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    return generate_safety_data(n_rows, seed=seed)
+
+
+def write_datasets(directory: str, n_rows: int, *, seed: int = DEFAULT_SEED, safety_rows: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Writes crime_data_cleaned.csv and crime_safety_cleaned.csv into directory
+    (skipped when they already exist) and returns both paths. The safety table
+    defaults to a tenth of the crime rows, like the real pair of datasets.
+    """
+    os.makedirs(directory, exist_ok=True)
+    crime_path = os.path.join(directory, 'crime_data_cleaned.csv')
+    safety_path = os.path.join(directory, 'crime_safety_cleaned.csv')
+    if not os.path.exists(crime_path):
+        crime_frame(n_rows, seed).to_csv(crime_path, index=False)
+    if not os.path.exists(safety_path):
+        safety_rows = max(1, n_rows // 10) if safety_rows is None else safety_rows
+        safety_frame(safety_rows, seed).to_csv(safety_path, index=False)
+    return crime_path, safety_path
+
+
+# Environment overrides that make main.py load a generated pair of datasets
+def dataset_env(crime_path: str, safety_path: str) -> Dict[str, str]:
+    return {'CRIME_DATA_PATH': crime_path, 'SAFETY_DATA_PATH': safety_path}
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Write synthetic LA-like crime datasets")
+    parser.add_argument('rows', type=int, help="number of crime rows (10k-10M)")
+    parser.add_argument('--out', default='.', help="output directory")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    paths = write_datasets(args.out, args.rows, seed=args.seed)
+    print(f"Wrote {args.rows:,} rows to {paths[0]} and {paths[1]} in {time.perf_counter() - start_time:.1f}s")
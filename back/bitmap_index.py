@@ -0,0 +1,265 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Roaring-style layout: row ids are split into 2^16 chunks keyed by their high bits.
+# Sparse chunks keep a sorted uint16 array, dense chunks keep a 1024-word uint64 bitset.
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+ARRAY_MAX_CARDINALITY = 4096
+
+# Categorical columns indexed by default when present in a cleaned dataset
+DEFAULT_INDEX_COLUMNS = [
+    'season', 'crime_type', 'weapon_used', 'area_name', 'AREA NAME', 'time_period',
+    'victim_gender', 'victim_race', 'victim_age_group',
+]
+
+
+def _popcount(words: np.ndarray) -> int:
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(words).sum())
+    return int(np.unpackbits(words.view(np.uint8)).sum())
+
+
+def _array_to_bitset(values: np.ndarray) -> np.ndarray:
+    dense = np.zeros(CHUNK_SIZE, dtype=bool)
+    dense[values] = True
+    return np.packbits(dense, bitorder='little').view(np.uint64)
+
+
+def _bitset_to_array(words: np.ndarray) -> np.ndarray:
+    bits = np.unpackbits(words.view(np.uint8), bitorder='little')
+    return np.flatnonzero(bits).astype(np.uint16)
+
+
+def _bitset_contains(words: np.ndarray, values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint32)
+    return ((words[values >> 6] >> (values & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+
+# Keep the smaller representation for a chunk after an operation
+def _normalize(container: np.ndarray) -> Optional[np.ndarray]:
+    if container.dtype == np.uint64:
+        card = _popcount(container)
+        if card == 0:
+            return None
+        if card <= ARRAY_MAX_CARDINALITY:
+            return _bitset_to_array(container)
+        return container
+    if container.size == 0:
+        return None
+    if container.size > ARRAY_MAX_CARDINALITY:
+        return _array_to_bitset(container)
+    return container
+
+
+def _container_cardinality(container: np.ndarray) -> int:
+    if container.dtype == np.uint64:
+        return _popcount(container)
+    return int(container.size)
+
+
+def _container_and(a: np.ndarray, b: np.ndarray) -> Optional[np.ndarray]:
+    a_dense = a.dtype == np.uint64
+    b_dense = b.dtype == np.uint64
+    if a_dense and b_dense:
+        return _normalize(a & b)
+    if a_dense:
+        return _normalize(b[_bitset_contains(a, b)])
+    if b_dense:
+        return _normalize(a[_bitset_contains(b, a)])
+    return _normalize(np.intersect1d(a, b, assume_unique=True))
+
+
+def _container_and_cardinality(a: np.ndarray, b: np.ndarray) -> int:
+    a_dense = a.dtype == np.uint64
+    b_dense = b.dtype == np.uint64
+    if a_dense and b_dense:
+        return _popcount(a & b)
+    if a_dense:
+        return int(_bitset_contains(a, b).sum())
+    if b_dense:
+        return int(_bitset_contains(b, a).sum())
+    return int(np.intersect1d(a, b, assume_unique=True).size)
+
+
+def _container_or(a: np.ndarray, b: np.ndarray) -> Optional[np.ndarray]:
+    a_dense = a.dtype == np.uint64
+    b_dense = b.dtype == np.uint64
+    if a_dense and b_dense:
+        return a | b
+    if a_dense or b_dense:
+        dense, sparse = (a, b) if a_dense else (b, a)
+        return dense | _array_to_bitset(sparse)
+    return _normalize(np.union1d(a, b))
+
+
+class RoaringBitmap:
+    """
+    Compressed set of row positions supporting fast AND/OR and popcount.
+    """
+
+    __slots__ = ('keys', 'containers')
+
+    def __init__(self, keys: Optional[np.ndarray] = None, containers: Optional[List[np.ndarray]] = None):
+        self.keys = keys if keys is not None else np.empty(0, dtype=np.int64)
+        self.containers = containers if containers is not None else []
+
+    # Build from row positions (sorted or not, duplicates are dropped)
+    @classmethod
+    def from_rows(cls, rows: Iterable[int]) -> 'RoaringBitmap':
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        return cls.from_sorted_rows(rows)
+
+    @classmethod
+    def from_sorted_rows(cls, rows: np.ndarray) -> 'RoaringBitmap':
+        if rows.size == 0:
+            return cls()
+        high = rows >> CHUNK_BITS
+        boundaries = np.flatnonzero(np.diff(high)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [rows.size]))
+        low = (rows & (CHUNK_SIZE - 1)).astype(np.uint16)
+        containers = [_normalize(low[s:e]) for s, e in zip(starts, ends)]
+        return cls(high[starts].astype(np.int64), containers)
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> 'RoaringBitmap':
+        return cls.from_sorted_rows(np.flatnonzero(mask))
+
+    def __len__(self) -> int:
+        return self.cardinality()
+
+    def __and__(self, other: 'RoaringBitmap') -> 'RoaringBitmap':
+        return self.intersection(other)
+
+    def __or__(self, other: 'RoaringBitmap') -> 'RoaringBitmap':
+        return self.union(other)
+
+    def cardinality(self) -> int:
+        return sum(_container_cardinality(c) for c in self.containers)
+
+    def intersection(self, other: 'RoaringBitmap') -> 'RoaringBitmap':
+        _, ia, ib = np.intersect1d(self.keys, other.keys, assume_unique=True, return_indices=True)
+        keys = []
+        containers = []
+        for i, j in zip(ia, ib):
+            container = _container_and(self.containers[i], other.containers[j])
+            if container is not None:
+                keys.append(self.keys[i])
+                containers.append(container)
+        return RoaringBitmap(np.asarray(keys, dtype=np.int64), containers)
+
+    # Size of the intersection without materializing it
+    def intersection_cardinality(self, other: 'RoaringBitmap') -> int:
+        _, ia, ib = np.intersect1d(self.keys, other.keys, assume_unique=True, return_indices=True)
+        return sum(_container_and_cardinality(self.containers[i], other.containers[j]) for i, j in zip(ia, ib))
+
+    def union(self, other: 'RoaringBitmap') -> 'RoaringBitmap':
+        keys = np.union1d(self.keys, other.keys)
+        mine = dict(zip(self.keys.tolist(), self.containers))
+        theirs = dict(zip(other.keys.tolist(), other.containers))
+        containers = []
+        for key in keys.tolist():
+            a = mine.get(key)
+            b = theirs.get(key)
+            if a is None:
+                containers.append(b)
+            elif b is None:
+                containers.append(a)
+            else:
+                containers.append(_container_or(a, b))
+        return RoaringBitmap(keys.astype(np.int64), containers)
+
+    def to_rows(self) -> np.ndarray:
+        if not self.containers:
+            return np.empty(0, dtype=np.int64)
+        parts = []
+        for key, container in zip(self.keys, self.containers):
+            low = _bitset_to_array(container) if container.dtype == np.uint64 else container
+            parts.append((int(key) << CHUNK_BITS) + low.astype(np.int64))
+        return np.concatenate(parts)
+
+    def nbytes(self) -> int:
+        return int(self.keys.nbytes + sum(c.nbytes for c in self.containers))
+
+
+class CategoricalBitmapIndex:
+    """
+    One RoaringBitmap per (column, value) over the categorical columns of a dataset.
+    Values are indexed by their string form so they line up with the one-hot item
+    names produced for Apriori (e.g. 'weapon_used_1').
+    """
+
+    def __init__(self, n_rows: int, bitmaps: Dict[str, Dict[str, RoaringBitmap]], labels: Dict[str, pd.Index]):
+        self.n_rows = n_rows
+        self.bitmaps = bitmaps
+        # Original (un-stringified) values per column, in the order of bitmaps[column]
+        self.labels = labels
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, columns: Optional[List[str]] = None) -> 'CategoricalBitmapIndex':
+        if columns is None:
+            columns = [c for c in DEFAULT_INDEX_COLUMNS if c in df.columns]
+        bitmaps: Dict[str, Dict[str, RoaringBitmap]] = {}
+        labels: Dict[str, pd.Index] = {}
+        for col in columns:
+            # Missing values get code -1 and are left out, like pd.crosstab does
+            codes, uniques = pd.factorize(df[col])
+            # A stable sort by code groups the (already ascending) row ids of every value
+            order = np.argsort(codes, kind='stable')
+            sorted_codes = codes[order]
+            boundaries = np.searchsorted(sorted_codes, np.arange(len(uniques) + 1))
+            bitmaps[col] = {
+                str(value): RoaringBitmap.from_sorted_rows(order[boundaries[i]:boundaries[i + 1]].astype(np.int64))
+                for i, value in enumerate(uniques)
+            }
+            labels[col] = pd.Index(uniques)
+        return cls(len(df), bitmaps, labels)
+
+    def columns(self) -> List[str]:
+        return list(self.bitmaps)
+
+    def values(self, column: str) -> List[str]:
+        return list(self.bitmaps[column])
+
+    def has_column(self, column: str) -> bool:
+        return column in self.bitmaps
+
+    def bitmap(self, column: str, value) -> RoaringBitmap:
+        return self.bitmaps.get(column, {}).get(str(value), RoaringBitmap())
+
+    def count(self, column: str, value) -> int:
+        return self.bitmap(column, value).cardinality()
+
+    def and_count(self, *items: Tuple[str, object]) -> int:
+        if not items:
+            return self.n_rows
+        bitmaps = sorted((self.bitmap(col, val) for col, val in items), key=lambda b: len(b.keys))
+        if len(bitmaps) == 1:
+            return bitmaps[0].cardinality()
+        acc = bitmaps[0]
+        for other in bitmaps[1:-1]:
+            acc = acc & other
+        return acc.intersection_cardinality(bitmaps[-1])
+
+    # Full crosstab of two indexed columns, computed from bitmap intersections.
+    # Matches pd.crosstab(df[row_col], df[col_col]): sorted labels, empty rows/columns dropped.
+    def crosstab(self, row_col: str, col_col: str) -> pd.DataFrame:
+        row_labels = self.labels[row_col].sort_values()
+        col_labels = self.labels[col_col].sort_values()
+        row_bitmaps = [self.bitmaps[row_col][str(v)] for v in row_labels]
+        col_bitmaps = [self.bitmaps[col_col][str(v)] for v in col_labels]
+        counts = np.array(
+            [[r.intersection_cardinality(c) for c in col_bitmaps] for r in row_bitmaps],
+            dtype=np.int64,
+        ).reshape(len(row_bitmaps), len(col_bitmaps))
+        table = pd.DataFrame(
+            counts,
+            index=row_labels.rename(row_col),
+            columns=col_labels.rename(col_col),
+        )
+        return table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+
+    def nbytes(self) -> int:
+        return sum(b.nbytes() for values in self.bitmaps.values() for b in values.values())
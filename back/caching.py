@@ -0,0 +1,97 @@
+import hashlib
+from typing import Callable, Optional
+from urllib.parse import parse_qsl
+import pandas as pd
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+from compression import negotiate, vary_on_encoding
+from profiling import profile_requested
+
+# Read endpoints are revalidated on every visit; an unchanged dataset costs a 304 and no body
+READ_CACHE_CONTROL = "no-cache"
+CONDITIONAL_PREFIX = '/api/'
+
+
+# Content fingerprint of a dataset; changes only when the underlying rows change
+def dataset_version(df: pd.DataFrame) -> str:
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(repr(list(df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+# Strong ETag from a dataset version plus whatever request parameters shape the body
+def make_etag(version: str, *parts: object) -> str:
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(version.encode())
+    for part in parts:
+        digest.update(b'\x00')
+        digest.update(repr(part).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+# If-None-Match uses the weak comparison, so a W/ prefix on either side is ignored
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    return '*' in candidates or etag.removeprefix('W/') in (tag.removeprefix('W/') for tag in candidates)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    return if_none_match(request.headers.get('if-none-match'), etag)
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': cache_control})
+
+
+class ConditionalGetMiddleware:
+    """
+    Strong ETags for every GET under /api/, derived from the dataset version, the path, the
+    query parameters (in any order) and the negotiated content coding, so each representation
+    gets its own tag. A matching If-None-Match is answered with 304 before the handler runs.
+    Handlers opt out with Cache-Control: no-store (e.g. unseeded random sampling) or by
+    setting their own ETag.
+    """
+
+    def __init__(self, app, version: Callable[[], Optional[str]], cache_control: str = READ_CACHE_CONTROL):
+        self.app = app
+        self.version = version
+        self.cache_control = cache_control
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope['type'] != 'http'
+            or scope['method'] not in ('GET', 'HEAD')
+            or not scope['path'].startswith(CONDITIONAL_PREFIX)
+            or profile_requested(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+        version = self.version()
+        if version is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        query = sorted(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+        etag = make_etag(version, scope['path'], query, negotiate(headers.get('accept-encoding')))
+        if if_none_match(headers.get('if-none-match'), etag):
+            response = not_modified(etag, self.cache_control)
+            response.headers['Vary'] = 'Accept-Encoding'
+            await response(scope, receive, send)
+            return
+
+        async def send_with_etag(message):
+            if message['type'] == 'http.response.start' and message['status'] == 200:
+                response_headers = MutableHeaders(scope=message)
+                cache_control = response_headers.get('cache-control', '')
+                if 'etag' not in response_headers and 'no-store' not in cache_control:
+                    response_headers['ETag'] = etag
+                    if not cache_control:
+                        response_headers['Cache-Control'] = self.cache_control
+                    vary_on_encoding(response_headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
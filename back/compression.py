@@ -0,0 +1,221 @@
+import gzip
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; br is simply not offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; zstd is simply not offered without it
+    zstandard = None
+
+# Bodies smaller than this are sent as they are; the headers would eat most of the savings
+MIN_COMPRESS_SIZE = int(os.environ.get('MIN_COMPRESS_SIZE', '1024'))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+# Server preference when the client weighs several encodings equally
+PREFERRED_ENCODINGS = ('zstd', 'br', 'gzip')
+# Already-compressed formats that are not worth another pass
+INCOMPRESSIBLE_TYPES = ('image/', 'video/', 'audio/', 'application/zip', 'application/gzip')
+# Compressed bodies of ETagged responses, so repeat requests for the same body skip the compressor
+COMPRESSED_CACHE_BYTES = int(os.environ.get('COMPRESSED_CACHE_BYTES', str(32 * 1024 * 1024)))
+
+
+def available_encodings() -> List[str]:
+    available = {'gzip': True, 'br': brotli is not None, 'zstd': zstandard is not None}
+    return [encoding for encoding in PREFERRED_ENCODINGS if available[encoding]]
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    The content coding to use for an Accept-Encoding header: the available coding with the
+    highest q-value (ties go to PREFERRED_ENCODINGS order), or None for identity.
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress_body(encoding: str, body: bytes) -> bytes:
+    if encoding == 'gzip':
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    raise ValueError(f"Unsupported encoding '{encoding}'")
+
+
+class StreamEncoder:
+    """Incremental compressor for streamed bodies; flush() makes every chunk decodable on arrival."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'gzip':
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding '{encoding}'")
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        if self.encoding == 'gzip':
+            return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by (strong ETag, encoding), bounded by total bytes."""
+
+    def __init__(self, max_bytes: int = COMPRESSED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag: str, encoding: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get((etag, encoding))
+            if body is not None:
+                self._entries.move_to_end((etag, encoding))
+            return body
+
+    def put(self, etag: str, encoding: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop((etag, encoding), None)
+            if previous is not None:
+                self.nbytes -= len(previous)
+            self._entries[(etag, encoding)] = body
+            self.nbytes += len(body)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+
+compressed_bodies = CompressedBodyCache()
+
+
+# Vary: Accept-Encoding, unless an earlier layer already added it
+def vary_on_encoding(headers: MutableHeaders):
+    vary = [value.strip().lower() for value in headers.get('vary', '').split(',')]
+    if 'accept-encoding' not in vary:
+        headers.add_vary_header('Accept-Encoding')
+
+
+def _compressible(headers: MutableHeaders) -> bool:
+    if 'content-encoding' in headers:
+        return False
+    content_type = headers.get('content-type', '')
+    return not content_type.startswith(INCOMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best coding the client accepts (zstd, br or gzip,
+    depending on what is installed). Whole bodies under MIN_COMPRESS_SIZE are left alone;
+    streamed bodies are compressed chunk by chunk and flushed so NDJSON lines still arrive promptly.
+    """
+
+    def __init__(self, app, minimum_size: int = MIN_COMPRESS_SIZE, cache: CompressedBodyCache = compressed_bodies):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get('accept-encoding'))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        encoder: Optional[StreamEncoder] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, encoder, passthrough
+            if message['type'] == 'http.response.start':
+                start_message = message
+                return
+            if message['type'] != 'http.response.body' or passthrough:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if encoder is not None:
+                chunk = encoder.compress(body) if body else b''
+                if not more_body:
+                    chunk += encoder.finish()
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+                return
+
+            headers = MutableHeaders(scope=start_message)
+            if not _compressible(headers) or (not more_body and len(body) < self.minimum_size):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            headers['Content-Encoding'] = encoding
+            vary_on_encoding(headers)
+            etag = headers.get('etag')
+            if more_body:
+                # Streamed: the final length is unknown
+                del headers['Content-Length']
+                encoder = StreamEncoder(encoding)
+                await send(start_message)
+                await send({'type': 'http.response.body', 'body': encoder.compress(body), 'more_body': True})
+                return
+
+            compressed = self.cache.get(etag, encoding) if etag and not etag.startswith('W/') else None
+            if compressed is None:
+                compressed = compress_body(encoding, body)
+                if etag and not etag.startswith('W/'):
+                    self.cache.put(etag, encoding, compressed)
+            headers['Content-Length'] = str(len(compressed))
+            await send(start_message)
+            await send({'type': 'http.response.body', 'body': compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,170 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.special import chdtrc
+
+# Matrices kept per (dataset version, columns); only a handful of datasets are ever served
+MAX_CACHED_MATRICES = 8
+_matrix_cache: "OrderedDict[Tuple[str, Tuple[str, ...]], CooccurrenceMatrix]" = OrderedDict()
+_matrix_lock = threading.Lock()
+
+
+# Chi-square statistics for many 2x2 tables at once, given only the marginal and joint counts.
+# Matches chi2_contingency (including Yates' correction); tables with an empty cell get NaN.
+def batch_chi_square_2x2(n_rows: int, count_a: np.ndarray, count_c: np.ndarray, count_ac: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    count_a = np.asarray(count_a, dtype=float)
+    count_c = np.asarray(count_c, dtype=float)
+    count_ac = np.asarray(count_ac, dtype=float)
+    # Cells in crosstab(mask_a, mask_c) order: (!a,!c), (!a,c), (a,!c), (a,c)
+    observed = np.stack(
+        [n_rows - count_a - count_c + count_ac, count_c - count_ac, count_a - count_ac, count_ac], axis=1
+    )
+    row_totals = np.stack([n_rows - count_a, n_rows - count_a, count_a, count_a], axis=1)
+    col_totals = np.stack([n_rows - count_c, count_c, n_rows - count_c, count_c], axis=1)
+    expected = row_totals * col_totals / n_rows
+    valid = (observed > 0).all(axis=1)
+
+    diff = expected - observed
+    corrected = observed + np.sign(diff) * np.minimum(0.5, np.abs(diff))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats = ((corrected - expected) ** 2 / expected).sum(axis=1)
+    stats = np.where(valid, stats, np.nan)
+    p_values = np.where(valid, chdtrc(1, stats), np.nan)
+    return stats, p_values
+
+
+class CooccurrenceMatrix:
+    """
+    Item x item co-occurrence counts over integer-coded categorical columns.
+    An item is one (column, value) pair; the diagonal holds item counts and the
+    off-diagonal blocks hold every pairwise crosstab, so support, confidence,
+    lift, chi-square and contingency tables for any two columns are slices of it.
+    """
+
+    def __init__(self, n_rows: int, columns: List[str], labels: Dict[str, pd.Index], offsets: Dict[str, int], counts: sparse.csr_matrix):
+        self.n_rows = n_rows
+        self.columns = columns
+        self.labels = labels
+        self.offsets = offsets
+        self.counts = counts
+        self.item_counts = counts.diagonal()
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, columns: List[str]) -> 'CooccurrenceMatrix':
+        missing = [c for c in columns if c not in df.columns]
+        if missing:
+            raise ValueError(f"Missing required columns: {missing}")
+
+        labels: Dict[str, pd.Index] = {}
+        offsets: Dict[str, int] = {}
+        row_parts, item_parts = [], []
+        n_items = 0
+        for col in columns:
+            # Missing values get code -1 and are left out, like pd.crosstab does
+            codes, uniques = pd.factorize(df[col])
+            present = codes >= 0
+            row_parts.append(np.flatnonzero(present))
+            item_parts.append(codes[present] + n_items)
+            labels[col] = pd.Index(uniques)
+            offsets[col] = n_items
+            n_items += len(uniques)
+
+        rows = np.concatenate(row_parts) if row_parts else np.empty(0, dtype=np.int64)
+        items = np.concatenate(item_parts) if item_parts else np.empty(0, dtype=np.int64)
+        # One sparse pass: rows x items indicator, then its Gram matrix
+        indicator = sparse.csr_matrix(
+            (np.ones(rows.size, dtype=np.int64), (rows, items)), shape=(len(df), n_items)
+        )
+        counts = (indicator.T @ indicator).tocsr()
+        return cls(len(df), list(columns), labels, offsets, counts)
+
+    def _block(self, col_a: str, col_b: str) -> np.ndarray:
+        a0, b0 = self.offsets[col_a], self.offsets[col_b]
+        a1, b1 = a0 + len(self.labels[col_a]), b0 + len(self.labels[col_b])
+        return self.counts[a0:a1, b0:b1].toarray()
+
+    # Same table as pd.crosstab(df[col_a], df[col_b]): sorted labels, empty rows/columns dropped
+    def contingency(self, col_a: str, col_b: str) -> pd.DataFrame:
+        row_order = np.argsort(self.labels[col_a], kind='stable')
+        col_order = np.argsort(self.labels[col_b], kind='stable')
+        block = self._block(col_a, col_b)[np.ix_(row_order, col_order)]
+        table = pd.DataFrame(
+            block,
+            index=self.labels[col_a][row_order].rename(col_a),
+            columns=self.labels[col_b][col_order].rename(col_b),
+        )
+        return table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+
+    # Chi-square test of independence between two whole columns
+    def chi_square(self, col_a: str, col_b: str) -> Tuple[Optional[float], Optional[float]]:
+        table = self.contingency(col_a, col_b)
+        if table.empty or table.shape[0] < 2 or table.shape[1] < 2:
+            return None, None
+        from scipy.stats import chi2_contingency
+        stat, p, _, _ = chi2_contingency(table)
+        return float(stat), float(p)
+
+    # Matrix position of each (column, value) item, -1 when absent. Values match by their
+    # string form, as in one-hot item names, so 0 and '0' are the same item.
+    def item_positions(self, items: List[Tuple[str, object]]) -> np.ndarray:
+        positions = np.full(len(items), -1, dtype=np.int64)
+        lookup = {
+            col: {str(value): self.offsets[col] + i for i, value in enumerate(self.labels[col])}
+            for col in self.columns
+        }
+        for k, (col, value) in enumerate(items):
+            positions[k] = lookup.get(col, {}).get(str(value), -1)
+        return positions
+
+    def rule_stats(self, antecedents: np.ndarray, consequents: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Count, support, confidence, lift and 2x2 chi-square (with p-value) of the single-item
+        rules antecedents[k] => consequents[k], given as matrix positions, in one vectorized pass.
+        """
+        antecedents = np.asarray(antecedents, dtype=np.int64)
+        consequents = np.asarray(consequents, dtype=np.int64)
+        count_ac = np.asarray(self.counts[antecedents, consequents], dtype=float).ravel()
+        count_a = self.item_counts[antecedents].astype(float)
+        count_c = self.item_counts[consequents].astype(float)
+        stats, p_values = batch_chi_square_2x2(self.n_rows, count_a, count_c, count_ac)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            confidence = count_ac / count_a
+            lift = confidence / (count_c / self.n_rows)
+        return {
+            'count': count_ac.astype(np.int64),
+            'support': count_ac / self.n_rows,
+            'confidence': confidence,
+            'lift': lift,
+            'chi2': stats,
+            'p_value': p_values,
+        }
+
+    # Rule statistics for every (value of col_a => value of col_b) pair that occurs together
+    def pair_stats(self, col_a: str, col_b: str) -> pd.DataFrame:
+        a_idx, b_idx = np.nonzero(self._block(col_a, col_b))
+        stats = self.rule_stats(self.offsets[col_a] + a_idx, self.offsets[col_b] + b_idx)
+        return pd.DataFrame({col_a: self.labels[col_a][a_idx], col_b: self.labels[col_b][b_idx], **stats})
+
+    def nbytes(self) -> int:
+        return int(self.counts.data.nbytes + self.counts.indices.nbytes + self.counts.indptr.nbytes)
+
+
+# Cached matrix for a dataset version; built on the first request for that version
+def get_cooccurrence(df: pd.DataFrame, columns: List[str], version: Optional[str] = None) -> CooccurrenceMatrix:
+    if version is None:
+        return CooccurrenceMatrix.build(df, columns)
+    key = (version, tuple(columns))
+    with _matrix_lock:
+        if key in _matrix_cache:
+            _matrix_cache.move_to_end(key)
+            return _matrix_cache[key]
+    # Built outside the lock so requests for other datasets aren't held up
+    matrix = CooccurrenceMatrix.build(df, columns)
+    with _matrix_lock:
+        _matrix_cache[key] = matrix
+        while len(_matrix_cache) > MAX_CACHED_MATRICES:
+            _matrix_cache.popitem(last=False)
+    return matrix
@@ -0,0 +1,223 @@
+import functools
+import math
+import os
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Dict, Optional, Tuple
+import numpy as np
+from scipy import sparse
+from scipy.special import ndtr
+from instrumentation import span
+from spatial_index import EARTH_RADIUS_M
+
+logger = logging.getLogger(__name__)
+
+# Permutation chunks run in this many worker processes; 1 keeps them in the calling process
+GI_WORKERS = int(os.environ.get('GI_WORKERS', str(os.cpu_count() or 1)))
+# Permutations per task; fixed so the p-values for a seed don't depend on the number of workers
+PERMUTATION_CHUNK = 64
+PERMUTATION_BLOCK = 1_000_000
+MAX_PERMUTATIONS = 999
+WEIGHT_SCHEMES = ('queen', 'radius')
+
+Offsets = Tuple[Tuple[int, int], ...]
+
+
+# (d_lat, d_lon) cell steps of the neighbourhood, the cell itself included (the "star" in Gi*)
+def neighbour_offsets(scheme: str, cell_height_m: float, cell_width_m: float, radius_m: Optional[float] = None) -> Offsets:
+    if scheme == 'queen':
+        return tuple((di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1))
+    if scheme != 'radius':
+        raise ValueError(f"weights has to be one of {', '.join(WEIGHT_SCHEMES)}")
+    if radius_m is None or radius_m <= 0:
+        raise ValueError("radius weights need a positive radius_m")
+    reach_i = int(radius_m // cell_height_m)
+    reach_j = int(radius_m // cell_width_m)
+    return tuple(
+        (di, dj)
+        for di in range(-reach_i, reach_i + 1)
+        for dj in range(-reach_j, reach_j + 1)
+        if (di * cell_height_m) ** 2 + (dj * cell_width_m) ** 2 <= radius_m ** 2
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def grid_weights(n_lat: int, n_lon: int, offsets: Offsets) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """
+    Binary spatial weights between the cells of an n_lat x n_lon grid (row-major cell ids):
+    w[i, j] = 1 when j is i shifted by one of the offsets and still inside the grid.
+    Returns the CSR matrix and each cell's number of neighbours. Cached per grid and scheme.
+    """
+    lat_idx, lon_idx = np.divmod(np.arange(n_lat * n_lon), n_lon)
+    rows, cols = [], []
+    for di, dj in offsets:
+        ni, nj = lat_idx + di, lon_idx + dj
+        inside = (ni >= 0) & (ni < n_lat) & (nj >= 0) & (nj < n_lon)
+        rows.append(np.flatnonzero(inside))
+        cols.append(ni[inside] * n_lon + nj[inside])
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    weights = sparse.csr_matrix((np.ones(rows.size), (rows, cols)), shape=(n_lat * n_lon,) * 2)
+    cardinality = np.diff(weights.indptr)
+    weights.data.setflags(write=False)
+    cardinality.setflags(write=False)
+    return weights, cardinality
+
+
+def gi_star(x: np.ndarray, weights: sparse.csr_matrix, cardinality: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Getis-Ord Gi* z-scores of every cell for binary weights, from one sparse
+    matrix-vector product: (local sum - mean * w_i) / (s * sqrt((n * w_i - w_i^2) / (n - 1))).
+    Also returns the local sums.
+    """
+    n = x.size
+    mean = x.mean()
+    s = math.sqrt(max((x * x).mean() - mean * mean, 0.0))
+    if n < 2 or s == 0:
+        raise ValueError("Gi* needs at least two cells with different counts")
+    local_sum = weights @ x
+    w = cardinality.astype(float)
+    denominator = s * np.sqrt(np.maximum(n * w - w * w, 0.0) / (n - 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(denominator > 0, (local_sum - mean * w) / denominator, 0.0)
+    return z, local_sum
+
+
+def _permutation_counts(x: np.ndarray, cardinality: np.ndarray, local_sum: np.ndarray, permutations: int, seed) -> np.ndarray:
+    """
+    Conditional permutations: each cell keeps its own count and draws its other
+    neighbours' counts at random from the remaining cells. Returns, per cell, how many
+    permuted local sums were >= the observed one. One draw of indices is shared by all
+    cells in a permutation (skipping the cell itself), as in PySAL's crand.
+    """
+    rng = np.random.default_rng(seed)
+    n = x.size
+    others = cardinality - 1
+    max_others = int(others.max())
+    # Cells per block, so that the gathered neighbour counts stay around PERMUTATION_BLOCK values
+    block = max(1, PERMUTATION_BLOCK // max(max_others, 1))
+    larger = np.zeros(n, dtype=np.int64)
+    for _ in range(permutations):
+        draw = rng.choice(n - 1, size=max_others, replace=False)
+        for start in range(0, n, block):
+            cells = np.arange(start, min(start + block, n))
+            # Index k of "all cells but i" is cell k, or k + 1 past i
+            picked = x[draw[None, :] + (draw[None, :] >= cells[:, None])]
+            sums = np.concatenate([np.zeros((cells.size, 1)), np.cumsum(picked, axis=1)], axis=1)
+            larger[cells] += x[cells] + sums[np.arange(cells.size), others[cells]] >= local_sum[cells]
+    return larger
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+# Worker processes are started on first use and reused; spawned so the server's threads aren't forked
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def permutation_p_values(
+    x: np.ndarray,
+    cardinality: np.ndarray,
+    local_sum: np.ndarray,
+    permutations: int,
+    random_state: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> np.ndarray:
+    """
+    One-sided pseudo p-values, (1 + permuted sums at least as extreme) / (permutations + 1),
+    taken in the tail the observed sum falls in. Chunks go to a process pool when workers > 1.
+    """
+    chunks = [PERMUTATION_CHUNK] * (permutations // PERMUTATION_CHUNK)
+    if permutations % PERMUTATION_CHUNK:
+        chunks.append(permutations % PERMUTATION_CHUNK)
+    seeds = np.random.SeedSequence(random_state).spawn(len(chunks))
+    n_workers = max(1, min(workers or GI_WORKERS, len(chunks)))
+    counts = None
+    if n_workers > 1:
+        try:
+            pool = _process_pool(n_workers)
+            futures = [pool.submit(_permutation_counts, x, cardinality, local_sum, size, seed) for size, seed in zip(chunks, seeds)]
+            counts = [future.result() for future in futures]
+        except BrokenProcessPool:
+            # Same chunks and seeds in this process, so the p-values come out identical
+            logger.warning("Gi* worker pool broke; running the permutations in-process")
+            _discard_pool()
+    if counts is None:
+        counts = [_permutation_counts(x, cardinality, local_sum, size, seed) for size, seed in zip(chunks, seeds)]
+    larger = np.sum(counts, axis=0)
+    larger = np.minimum(larger, permutations - larger)
+    return (larger + 1) / (permutations + 1)
+
+
+def hotspot_statistics(
+    grid: Dict[str, object],
+    *,
+    weights: str = 'queen',
+    radius_m: Optional[float] = None,
+    permutations: int = 0,
+    random_state: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> Dict[str, object]:
+    """
+    Gi* hot/cold spots over a count grid from SpatialIndex.grid. Empty cells take part as
+    zero counts; cells with no crimes in their whole neighbourhood are left out of the result.
+    p_value is two-sided from the normal approximation; p_sim comes from the permutations.
+    """
+    if not 0 <= permutations <= MAX_PERMUTATIONS:
+        raise ValueError(f"permutations has to be between 0 and {MAX_PERMUTATIONS}")
+    counts = np.asarray(grid['counts'])
+    n_lat, n_lon = counts.shape
+    lat_edges = np.asarray(grid['lat_edges'])
+    step = float(grid['bin_size'])
+    cell_height_m = EARTH_RADIUS_M * math.radians(step)
+    cell_width_m = cell_height_m * math.cos(math.radians((lat_edges[0] + lat_edges[-1]) / 2))
+    offsets = neighbour_offsets(weights, cell_height_m, cell_width_m, radius_m)
+
+    with span('gi.weights', rows=n_lat * n_lon):
+        w, cardinality = grid_weights(n_lat, n_lon, offsets)
+    x = counts.ravel().astype(float)
+    with span('gi.z_scores', rows=x.size):
+        z, local_sum = gi_star(x, w, cardinality)
+        p_value = 2 * ndtr(-np.abs(z))
+
+    fields = ['lat_idx', 'lon_idx', 'count', 'z', 'p_value']
+    columns = [z, p_value]
+    if permutations:
+        with span('gi.permutations', rows=x.size * permutations):
+            columns.append(permutation_p_values(x, cardinality, local_sum, permutations, random_state, workers))
+        fields.append('p_sim')
+
+    shown = np.flatnonzero(local_sum > 0)
+    lat_idx, lon_idx = np.divmod(shown, n_lon)
+    columns = [x[shown].astype(np.int64)] + [np.round(col[shown], 6) for col in columns]
+    cells = [list(cell) for cell in zip(lat_idx.tolist(), lon_idx.tolist(), *(col.tolist() for col in columns))]
+    return {
+        'bin_size': step,
+        'weights': weights,
+        'neighbours': len(offsets),
+        'n_cells': int(x.size),
+        'permutations': permutations,
+        'fields': fields,
+        'cells': cells,
+    }
@@ -0,0 +1,208 @@
+import math
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from starlette.datastructures import MutableHeaders
+
+# Allocation deltas need tracemalloc, which slows allocation-heavy code; opt in with INSTRUMENT_MEMORY=1
+MEMORY_TRACING = os.environ.get('INSTRUMENT_MEMORY', '0') == '1'
+# Attach a Server-Timing header (stage durations in ms) to every response with SERVER_TIMING=1
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+METRICS_MEDIA_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# 1 KiB to 4 GiB in powers of 4
+BYTES_BUCKETS = tuple(float(4 ** i * 1024) for i in range(12))
+
+if MEMORY_TRACING and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    """
+    Prometheus-style cumulative histogram, one series per label combination.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # bucket counts, then sum and count
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, labels, le)} {_format_value(count)}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(values[-2])}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, labels)} {_format_value(values[-1])}')
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._series: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1.0):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            series = dict(self._series)
+        for labels, value in sorted(series.items()):
+            lines.append(f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}')
+        return lines
+
+
+STAGE_DURATION = Histogram(
+    'crime_stage_duration_seconds', 'Wall time of an analysis stage.', ['stage'], DURATION_BUCKETS
+)
+STAGE_ROWS = Counter('crime_stage_rows_total', 'Rows processed by an analysis stage.', ['stage'])
+STAGE_MEMORY = Histogram(
+    'crime_stage_memory_delta_bytes',
+    'Net traced memory growth over an analysis stage (INSTRUMENT_MEMORY=1 only).',
+    ['stage'],
+    BYTES_BUCKETS,
+)
+REQUEST_DURATION = Histogram(
+    'crime_http_request_duration_seconds',
+    'Wall time of an HTTP request, including streaming the body.',
+    ['method', 'route', 'status'],
+    DURATION_BUCKETS,
+)
+METRICS = [STAGE_DURATION, STAGE_ROWS, STAGE_MEMORY, REQUEST_DURATION]
+
+# Spans finished during the current request, for the Server-Timing header
+_request_spans: ContextVar[Optional[List['Span']]] = ContextVar('request_spans', default=None)
+
+
+class Span:
+    __slots__ = ('stage', 'rows', 'duration', 'memory_delta')
+
+    def __init__(self, stage: str, rows: Optional[int] = None):
+        self.stage = stage
+        # Can be set inside the block once the row count is known
+        self.rows = rows
+        self.duration = 0.0
+        self.memory_delta: Optional[int] = None
+
+
+@contextmanager
+def span(stage: str, rows: Optional[int] = None) -> Iterator[Span]:
+    """
+    Times one stage of an analysis and records it in the /metrics histograms.
+    Stages are dotted names ('sequences.sessionize'); rows is what the stage consumed.
+    """
+    current = Span(stage, rows)
+    tracing = tracemalloc.is_tracing()
+    memory_before = tracemalloc.get_traced_memory()[0] if tracing else 0
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - start
+        STAGE_DURATION.observe((stage,), current.duration)
+        if current.rows is not None:
+            STAGE_ROWS.inc((stage,), current.rows)
+        if tracing:
+            current.memory_delta = tracemalloc.get_traced_memory()[0] - memory_before
+            STAGE_MEMORY.observe((stage,), max(current.memory_delta, 0))
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append(current)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Server-Timing value: one entry per finished span plus the handler total, durations in ms
+def server_timing_header(spans: List[Span], total: float) -> str:
+    entries = [f'{s.stage};dur={s.duration * 1000:.1f}' for s in spans]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI middleware recording request durations by route template and, when enabled,
+    adding a Server-Timing header built from the spans finished before the response starts.
+    """
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        spans: List[Span] = []
+        token = _request_spans.set(spans)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if self.server_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers.append('Server-Timing', server_timing_header(spans, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            REQUEST_DURATION.observe((scope['method'], route, str(status)), time.perf_counter() - start)
+            _request_spans.reset(token)
@@ -1,8 +1,22 @@
+import hashlib
 import math
+import os
 import random
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Optional, Tuple
 import numpy as np
 import pandas as pd
+from instrumentation import span
+
+# Feature matrices kept per (dataset version, columns, dtype); only a handful are ever requested
+MAX_CACHED_FEATURES = 8
+# When set, feature matrices are also written here as .npy files that every worker memory-maps,
+# so a host builds each one once and the workers share the pages
+FEATURE_CACHE_DIR = os.environ.get('FEATURE_CACHE_DIR')
+FEATURE_DTYPES = ('float64', 'float32')
+_feature_cache: "OrderedDict[Tuple, HotspotFeatures]" = OrderedDict()
+_feature_lock = threading.Lock()
 
 # Parse a few time formats like HHMM or HH:MM into timedelta
 def parse_time(val):
@@ -73,50 +87,93 @@ def build_time_location_features(
 
     return X, working.reset_index(drop=False)
 
-# K-Means++ centroid initialization
-def kmeans_plus_plus_init(X: np.ndarray, k: int, rng: random.Random) -> np.ndarray:
-    n_samples = X.shape[0]
-    centroids = []
+# Distinct rows of X with their multiplicities, plus each row's position among the distinct rows.
+# Columns are factorized one at a time into a composite key, so this is O(rows) without sorting.
+def deduplicate_rows(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    inverse = np.zeros(X.shape[0], dtype=np.int64)
+    for j in range(X.shape[1]):
+        codes, uniques = pd.factorize(X[:, j])
+        inverse, _ = pd.factorize(inverse * len(uniques) + codes)
+    # factorize numbers keys in order of first appearance, so a new running max marks a first occurrence
+    first = np.flatnonzero(np.diff(np.maximum.accumulate(inverse), prepend=-1) > 0)
+    # Column-major like the feature matrix; the (points, k, features) distance broadcast is faster that way
+    return np.asfortranarray(X[first]), np.bincount(inverse), inverse
+
+# Squared distances from every point to every centroid as |p|^2 - 2 p.c + |c|^2, so the work is
+# one matrix product; sq_norms are the points' precomputed |p|^2
+def squared_distances(points: np.ndarray, sq_norms: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    distances = points @ centroids.astype(points.dtype).T
+    distances *= -2
+    distances += sq_norms[:, None]
+    distances += np.einsum('ij,ij->i', centroids, centroids)[None, :]
+    return np.maximum(distances, 0)
+
+# K-Means++ centroid initialization. With `inverse`, X holds the distinct points of the rows being
+# sampled: distances are computed per point and only spread to rows for the D^2 draw, so the picks
+# are the same as sampling the rows themselves.
+def kmeans_plus_plus_init(
+    X: np.ndarray,
+    k: int,
+    rng: random.Random,
+    inverse: Optional[np.ndarray] = None,
+    sq_norms: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    if sq_norms is None:
+        sq_norms = np.einsum('ij,ij->i', X, X)
+    n_samples = X.shape[0] if inverse is None else inverse.size
     first_idx = rng.randrange(n_samples)
-    centroids.append(X[first_idx])
+    centroids = [X[first_idx if inverse is None else inverse[first_idx]]]
+    dist_sq = squared_distances(X, sq_norms, np.array(centroids))[:, 0]
 
     for _ in range(1, k):
-        dist_sq = np.min(
-            np.square(np.linalg.norm(X[:, None, :] - np.array(centroids)[None, :, :], axis=2)),
-            axis=1,
-        )
-        probs = dist_sq / dist_sq.sum()
+        row_dist_sq = dist_sq if inverse is None else dist_sq[inverse]
+        probs = row_dist_sq / row_dist_sq.sum()
         cumulative_probs = np.cumsum(probs)
         r = rng.random()
         next_idx = np.searchsorted(cumulative_probs, r)
-        centroids.append(X[next_idx])
+        centroids.append(X[next_idx if inverse is None else inverse[next_idx]])
+        dist_sq = np.minimum(dist_sq, squared_distances(X, sq_norms, centroids[-1][None, :])[:, 0])
 
-    return np.array(centroids)
+    return np.array(centroids, dtype=float)
 
-def kmeans(
-    X: np.ndarray,
+def weighted_kmeans(
+    points: np.ndarray,
+    weights: np.ndarray,
     k: int,
     *,
     max_iter: int = 100,
     tol: float = 1e-4,
     random_state: Optional[int] = None,
+    inverse: Optional[np.ndarray] = None,
+    sq_norms: Optional[np.ndarray] = None,
 ) -> Tuple[np.ndarray, np.ndarray]:
-    # K-Means implementation
+    """
+    K-Means on distinct points, each standing for `weights` identical rows: Lloyd updates
+    use weighted means, so the result is the same as clustering the rows, at the cost of
+    the distinct points. `inverse` (row -> point) keeps the k-means++ draws row-exact.
+    Returns a label per point. Points are best centred: the distance kernel expands |p - c|^2.
+    """
     if k <= 0:
         raise ValueError("k has to be positive")
-    if X.shape[0] < k:
+    if weights.sum() < k:
         raise ValueError("Number of samples has to be >= k")
 
+    if sq_norms is None:
+        sq_norms = np.einsum('ij,ij->i', points, points)
     rng = random.Random(random_state)
-    centroids = kmeans_plus_plus_init(X, k, rng)
+    centroids = kmeans_plus_plus_init(points, k, rng, inverse, sq_norms)
+    weighted_points = points * weights[:, None].astype(points.dtype)
+    weights = weights.astype(float)
 
     for _ in range(max_iter):
-        distances = np.linalg.norm(X[:, None, :] - centroids[None, :, :], axis=2)
-        labels = np.argmin(distances, axis=1)
+        labels = np.argmin(squared_distances(points, sq_norms, centroids), axis=1)
 
-        new_centroids = np.array(
-            [X[labels == i].mean(axis=0) if np.any(labels == i) else centroids[i] for i in range(k)]
+        totals = np.bincount(labels, weights=weights, minlength=k)
+        sums = np.column_stack(
+            [np.bincount(labels, weights=weighted_points[:, d], minlength=k) for d in range(points.shape[1])]
         )
+        # Empty clusters keep their centroid
+        new_centroids = np.where(totals[:, None] > 0, sums / np.maximum(totals, 1)[:, None], centroids)
 
         shift = np.linalg.norm(new_centroids - centroids, axis=1).max()
         centroids = new_centroids
@@ -125,7 +182,133 @@ def kmeans(
 
     return labels, centroids
 
-def run_hotspot_kmeans(
+def kmeans(
+    X: np.ndarray,
+    k: int,
+    *,
+    max_iter: int = 100,
+    tol: float = 1e-4,
+    random_state: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # K-Means over the distinct rows of X (centred); labels are broadcast back to every row
+    points, weights, inverse = deduplicate_rows(X)
+    offset = points.mean(axis=0) if len(points) else np.zeros(X.shape[1])
+    labels, centroids = weighted_kmeans(
+        points - offset, weights, k, max_iter=max_iter, tol=tol, random_state=random_state, inverse=inverse
+    )
+    return labels[inverse], centroids + offset
+
+class HotspotFeatures:
+    """
+    The hotspot k-means feature matrix of a dataset, deduplicated: distinct rows centred on
+    `offset` (in float64 or float32), how often each occurs, the distinct row of every kept
+    row (`inverse`), the frame index of every kept row, and the distinct rows' squared norms
+    for the distance kernel. Arrays are read-only; one instance serves every request.
+    """
+
+    ARRAYS = ('points', 'weights', 'inverse', 'index', 'offset', 'sq_norms')
+
+    def __init__(self, points, weights, inverse, index, offset, sq_norms):
+        self.points = points
+        self.weights = weights
+        self.inverse = inverse
+        self.index = index
+        self.offset = offset
+        self.sq_norms = sq_norms
+        for name in self.ARRAYS:
+            getattr(self, name).setflags(write=False)
+
+    @classmethod
+    def build(
+        cls,
+        df: pd.DataFrame,
+        *,
+        datetime_col: Optional[str] = None,
+        time_col: Optional[str] = None,
+        lat_col: Optional[str] = None,
+        lon_col: Optional[str] = None,
+        dtype: str = 'float64',
+    ) -> 'HotspotFeatures':
+        with span('kmeans.features', rows=len(df)):
+            X, cleaned_df = build_time_location_features(
+                df,
+                datetime_col=datetime_col,
+                time_col=time_col,
+                lat_col=lat_col,
+                lon_col=lon_col,
+            )
+        with span('kmeans.deduplicate', rows=X.shape[0]):
+            points, weights, inverse = deduplicate_rows(X)
+            offset = points.mean(axis=0)
+            # Centred, so the expanded distances don't lose precision to lat/lon magnitudes
+            points = np.asfortranarray((points - offset).astype(dtype))
+            sq_norms = np.einsum('ij,ij->i', points, points)
+        return cls(points, weights, inverse, cleaned_df["index"].to_numpy(), offset, sq_norms)
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.inverse.size)
+
+    def nbytes(self) -> int:
+        return int(sum(getattr(self, name).nbytes for name in self.ARRAYS))
+
+    # One .npy per array under `prefix`; the points file is written last and marks a complete set
+    def save(self, prefix: str):
+        for name in reversed(self.ARRAYS):
+            tmp_path = f"{prefix}.{name}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, getattr(self, name), allow_pickle=False)
+            os.replace(tmp_path, f"{prefix}.{name}.npy")
+
+    @classmethod
+    def load(cls, prefix: str) -> Optional['HotspotFeatures']:
+        if not os.path.exists(f"{prefix}.points.npy"):
+            return None
+        return cls(*(np.load(f"{prefix}.{name}.npy", mmap_mode='r', allow_pickle=False) for name in cls.ARRAYS))
+
+
+def _shared_prefix(key: Tuple) -> str:
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+    return os.path.join(FEATURE_CACHE_DIR, f"hotspot-features-{digest}")
+
+# Cached features for a dataset version; built on the first request for that version and column set
+def get_hotspot_features(
+    df: pd.DataFrame,
+    *,
+    version: Optional[str] = None,
+    datetime_col: Optional[str] = None,
+    time_col: Optional[str] = None,
+    lat_col: Optional[str] = None,
+    lon_col: Optional[str] = None,
+    dtype: str = 'float64',
+) -> HotspotFeatures:
+    if dtype not in FEATURE_DTYPES:
+        raise ValueError(f"dtype has to be one of {', '.join(FEATURE_DTYPES)}")
+    columns = dict(datetime_col=datetime_col, time_col=time_col, lat_col=lat_col, lon_col=lon_col)
+    if version is None:
+        return HotspotFeatures.build(df, dtype=dtype, **columns)
+    key = (version, datetime_col, time_col, lat_col, lon_col, dtype)
+    with _feature_lock:
+        if key in _feature_cache:
+            _feature_cache.move_to_end(key)
+            return _feature_cache[key]
+
+    features = HotspotFeatures.load(_shared_prefix(key)) if FEATURE_CACHE_DIR else None
+    if features is None:
+        features = HotspotFeatures.build(df, dtype=dtype, **columns)
+        # Object indexes can't be memory-mapped; those stay in this process only
+        if FEATURE_CACHE_DIR and features.index.dtype != object:
+            os.makedirs(FEATURE_CACHE_DIR, exist_ok=True)
+            features.save(_shared_prefix(key))
+            features = HotspotFeatures.load(_shared_prefix(key))
+
+    with _feature_lock:
+        _feature_cache[key] = features
+        while len(_feature_cache) > MAX_CACHED_FEATURES:
+            _feature_cache.popitem(last=False)
+    return features
+
+# Cached features plus k-means; returns the raw arrays so callers can format or stream them
+def fit_hotspot_kmeans(
     df: pd.DataFrame,
     *,
     k: int = 5,
@@ -136,26 +319,49 @@ def run_hotspot_kmeans(
     time_col: Optional[str] = None,
     lat_col: Optional[str] = None,
     lon_col: Optional[str] = None,
-) -> Dict[str, object]:
-    # Build features, run k-means, and return labels and centroids
-    X, cleaned_df = build_time_location_features(
+    assignments: bool = True,
+    version: Optional[str] = None,
+    dtype: str = 'float64',
+) -> Dict[str, np.ndarray]:
+    """
+    Clusters the distinct feature rows (crimes share block centroids and the 168 hour x weekday
+    slots), weighted by how often each occurs. With a dataset version the features are cached,
+    so changing k, tol or random_state skips feature building. Per-row "index" and "labels" are
+    only built when assignments are wanted; "point_labels" and "weights" describe the distinct rows.
+    """
+    features = get_hotspot_features(
         df,
+        version=version,
         datetime_col=datetime_col,
         time_col=time_col,
         lat_col=lat_col,
         lon_col=lon_col,
+        dtype=dtype,
     )
 
-    labels, centroids = kmeans(
-        X,
-        k,
-        max_iter=max_iter,
-        tol=tol,
-        random_state=random_state,
-    )
+    with span('kmeans.fit', rows=features.points.shape[0]):
+        point_labels, centroids = weighted_kmeans(
+            features.points,
+            features.weights,
+            k,
+            max_iter=max_iter,
+            tol=tol,
+            random_state=random_state,
+            inverse=features.inverse,
+            sq_norms=features.sq_norms,
+        )
 
-    cleaned_df = cleaned_df.assign(cluster=labels)
+    fit = {
+        "centroids": centroids + features.offset,
+        "point_labels": point_labels,
+        "weights": features.weights,
+    }
+    if assignments:
+        fit["index"] = features.index
+        fit["labels"] = point_labels[features.inverse]
+    return fit
 
+def centroid_records(centroids: np.ndarray) -> List[Dict[str, float]]:
     centroid_dicts: List[Dict[str, float]] = []
     for idx, c in enumerate(centroids):
         centroid_dicts.append(
@@ -169,13 +375,57 @@ def run_hotspot_kmeans(
                 "dow_cos": float(c[5]),
             }
         )
+    return centroid_dicts
 
-    return {
-        "centroids": centroid_dicts,
-        "assignments": cleaned_df[["index", "cluster"]].to_dict(orient="records"),
-        "counts": cleaned_df["cluster"].value_counts().sort_index().to_dict(),
-        "n_rows_used": int(len(cleaned_df)),
-    }
+# Cluster sizes keyed by cluster id, like value_counts().sort_index().to_dict();
+# weights counts each label that many times (labels of distinct rows)
+def cluster_counts(labels: np.ndarray, k: int, weights: Optional[np.ndarray] = None) -> Dict[int, int]:
+    counts = np.bincount(labels, weights=weights, minlength=k)
+    return {int(i): int(c) for i, c in enumerate(counts) if c > 0}
+
+def run_hotspot_kmeans(
+    df: pd.DataFrame,
+    *,
+    k: int = 5,
+    max_iter: int = 100,
+    tol: float = 1e-4,
+    random_state: Optional[int] = None,
+    datetime_col: Optional[str] = None,
+    time_col: Optional[str] = None,
+    lat_col: Optional[str] = None,
+    lon_col: Optional[str] = None,
+    assignments: bool = True,
+    version: Optional[str] = None,
+    dtype: str = 'float64',
+) -> Dict[str, object]:
+    # Build (or reuse) features, run k-means, and return centroids, counts and (unless turned off) per-row labels
+    fit = fit_hotspot_kmeans(
+        df,
+        k=k,
+        max_iter=max_iter,
+        tol=tol,
+        random_state=random_state,
+        datetime_col=datetime_col,
+        time_col=time_col,
+        lat_col=lat_col,
+        lon_col=lon_col,
+        assignments=assignments,
+        version=version,
+        dtype=dtype,
+    )
+
+    with span('kmeans.response', rows=int(fit["weights"].sum())):
+        result = {
+            "centroids": centroid_records(fit["centroids"]),
+            "counts": cluster_counts(fit["point_labels"], len(fit["centroids"]), fit["weights"]),
+            "n_rows_used": int(fit["weights"].sum()),
+        }
+        if assignments:
+            result["assignments"] = [
+                {"index": index, "cluster": cluster}
+                for index, cluster in zip(fit["index"].tolist(), fit["labels"].tolist())
+            ]
+        return result
 
 # Convert sin/cos back to a value in original period
 def decode_cyclical(sin_val: float, cos_val: float, period: float) -> float:
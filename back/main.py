@@ -1,31 +1,170 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 import pandas as pd
 import numpy as np
-import traceback
-from weather_analysis import get_season, run_seasonal_analysis
-from sequence_mining import run_crime_sequence_mining
-from scipy.stats import chi2_contingency
-from typing import Optional
-from kmeans import run_hotspot_kmeans
-from mlxtend.frequent_patterns import apriori, association_rules
-
-app = FastAPI()
-
-# Load your dataset
-df = pd.read_csv('../crime_data_cleaned.csv')
-safetyDF = pd.read_csv('../crime_safety_cleaned.csv')
-
-#Add in the season check for moving forward
-def get_season(month):
-    if month in [12, 1, 2]:
-        return 'Winter'
-    elif month in [3, 4, 5]:
-        return 'Spring'
-    elif month in [6, 7, 8]:
-        return 'Summer'
-    else:
-        return 'Fall'
+import base64
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from bitmap_index import CategoricalBitmapIndex
+from tiles import TilePyramid, TILE_RESOLUTION
+from caching import ConditionalGetMiddleware, dataset_version, make_etag, etag_matches, not_modified
+from compression import CompressionMiddleware, negotiate
+from streaming import ndjson_response, array_batches
+from sorted_index import SortedRowIndex
+from instrumentation import InstrumentationMiddleware, METRICS_MEDIA_TYPE, render_metrics, span
+from profiling import ProfilingMiddleware, is_admin, list_profiles, profile_file, profile_summary, profiled, slow_requests
+from startup import ReadinessMiddleware, clear_precomputed, precomputed, readiness, run_startup, start_in_background
+# The analysis modules (scipy.stats, mlxtend, numba, ...) are imported on first use, inside the handlers,
+# so importing this module and binding the server stay fast
+
+logger = logging.getLogger(__name__)
+
+# Datasets load in a background thread so the server binds (and /healthz answers) right away;
+# /api requests get a 503 until they are in, and /readyz passes once warmup is done as well
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if readiness.status == 'starting':
+        start_in_background(startup)
+    yield
+
+app = FastAPI(lifespan=lifespan)
+# 503 for /api requests that arrive before the datasets are loaded
+app.add_middleware(ReadinessMiddleware)
+# Strong ETags keyed to the dataset versions and request parameters; If-None-Match gets a 304
+app.add_middleware(
+    ConditionalGetMiddleware,
+    version=lambda: None if crime_version is None else f"{crime_version}:{safety_version}",
+)
+# ?profile=1 / X-Profile: 1 (admin token required) and the slowest-requests log
+app.add_middleware(ProfilingMiddleware)
+# zstd / br / gzip, whichever the client prefers and is installed
+app.add_middleware(CompressionMiddleware)
+# Request durations for /metrics, plus a Server-Timing header when SERVER_TIMING=1
+app.add_middleware(InstrumentationMiddleware)
+
+# Load your dataset (paths can be overridden, e.g. to point the benchmarks at synthetic data)
+CRIME_DATA_PATH = os.environ.get('CRIME_DATA_PATH', '../crime_data_cleaned.csv')
+SAFETY_DATA_PATH = os.environ.get('SAFETY_DATA_PATH', '../crime_safety_cleaned.csv')
+TILE_CACHE_CONTROL = "public, max-age=86400"
+
+# The datasets and everything built over them; set by load_datasets() during startup
+df: Optional[pd.DataFrame] = None
+safetyDF: Optional[pd.DataFrame] = None
+crime_version: Optional[str] = None
+safety_version: Optional[str] = None
+crime_index: Optional[CategoricalBitmapIndex] = None
+safety_index: Optional[CategoricalBitmapIndex] = None
+spatial_index = None
+crime_rows: Optional[SortedRowIndex] = None
+safety_rows: Optional[SortedRowIndex] = None
+tile_pyramids: "OrderedDict[Optional[str], TilePyramid]" = OrderedDict()
+# Per-type pyramids kept besides the all-crimes one (key None), which is never evicted
+MAX_CACHED_PYRAMIDS = 16
+_pyramid_lock = threading.Lock()
+_pyramid_builds: Dict[Optional[str], threading.Lock] = {}
+
+def load_datasets():
+    global df, safetyDF, crime_version, safety_version, crime_index, safety_index
+    global spatial_index, crime_rows, safety_rows, tile_pyramids
+    from weather_analysis import get_season
+    from spatial_index import SpatialIndex
+
+    with span('startup.read_csv'):
+        crime_df = pd.read_csv(CRIME_DATA_PATH)
+        safety_df = pd.read_csv(SAFETY_DATA_PATH)
+
+    # Make sure both datasets carry a season column so it can be indexed once
+    for frame in (crime_df, safety_df):
+        if 'season' not in frame.columns and 'date' in frame.columns:
+            frame['season'] = pd.to_datetime(frame['date'], errors='coerce').dt.month.apply(get_season)
+
+    with span('startup.indexes', rows=len(crime_df) + len(safety_df)):
+        # Fingerprints of the loaded data, used to key caches and ETags
+        versions = dataset_version(crime_df), dataset_version(safety_df)
+        # Compressed row-set indexes over the categorical columns
+        indexes = CategoricalBitmapIndex.build(crime_df), CategoricalBitmapIndex.build(safety_df)
+        # Spatial index over the crime coordinates for variable grids and proximity queries
+        spatial = SpatialIndex.from_frame(crime_df) if {'latitude', 'longitude'} <= set(crime_df.columns) else None
+        # Date-ordered row permutations for the previews and paginated browsing
+        rows = SortedRowIndex(crime_df), SortedRowIndex(safety_df)
+        # Tile pyramids for the map view; the all-crimes pyramid is precomputed, per-type ones on first use
+        pyramids = OrderedDict({None: TilePyramid.from_frame(crime_df)} if spatial is not None else {})
+
+    # Publish everything at once, so requests never see a partly loaded state
+    df, safetyDF = crime_df, safety_df
+    crime_version, safety_version = versions
+    crime_index, safety_index = indexes
+    spatial_index = spatial
+    crime_rows, safety_rows = rows
+    tile_pyramids = pyramids
+    clear_precomputed()
+
+# Load the datasets, then run the warmup steps when WARMUP=1 (called by the lifespan, or directly by scripts)
+def startup():
+    run_startup(load_datasets, WARMUP_STEPS)
+
+# Liveness: the process is up, whether or not the datasets are loaded yet
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    return {"status": "ok"}
+
+# Readiness: datasets loaded and warmup done; 503 with the startup state until then
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    state = readiness.snapshot()
+    if not readiness.ready:
+        return JSONResponse(state, status_code=503)
+    return state
+
+# Prometheus text format: per-stage timing/rows/memory histograms and request durations
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(content=render_metrics(), media_type=METRICS_MEDIA_TYPE)
+
+# Admin endpoints take the ADMIN_TOKEN value in an X-Admin-Token header
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="A valid admin token is required.")
+
+# The slowest API requests so far, with the parameters needed to replay them
+@app.get("/admin/slow_requests", include_in_schema=False, dependencies=[Depends(require_admin)])
+def get_slow_requests():
+    return {'slow_requests': slow_requests.entries()}
+
+@app.delete("/admin/slow_requests", include_in_schema=False, dependencies=[Depends(require_admin)])
+def clear_slow_requests():
+    slow_requests.clear()
+    return {'cleared': True}
+
+@app.get("/admin/profiles", include_in_schema=False, dependencies=[Depends(require_admin)])
+def get_profiles():
+    return {'profiles': list_profiles()}
+
+# A stored profile as a .pstats file (for pstats or snakeviz), or its top functions as text
+@app.get("/admin/profiles/{profile_id}", include_in_schema=False, dependencies=[Depends(require_admin)])
+def get_profile(profile_id: str, fmt: str = Query("pstats", alias="format"), sort: str = "cumulative", limit: int = 40):
+    path = profile_file(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found.")
+    if fmt == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.pstats")
+    if fmt != "text":
+        raise HTTPException(status_code=400, detail="format has to be 'pstats' or 'text'.")
+    try:
+        return PlainTextResponse(profile_summary(path, sort=sort, limit=limit))
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key '{sort}'.")
+
+# Turn a crosstab into groupby-style (row, column, count) records, skipping empty cells
+def crosstab_records(table: pd.DataFrame) -> list:
+    stacked = table.stack()
+    return stacked[stacked > 0].reset_index(name='count').to_dict(orient='records')
 
 class HotspotRequest(BaseModel):
     k: int = 5
@@ -36,90 +175,102 @@ class HotspotRequest(BaseModel):
     time_col: Optional[str] = None
     lat_col: Optional[str] = None
     lon_col: Optional[str] = None
-    
+    stream: bool = False # NDJSON: summary line first, then assignment batches
+    assignments: bool = True # per-row cluster labels; off returns only centroids and counts
+    dtype: str = 'float64' # 'float32' halves the cached feature matrix
+
 class AprioriRequest(BaseModel):
     dataset_name: str # 'crime_data' or 'safety_data'
-
-# Renamed df to df_local_param to avoid shadowing global df
-def chi_square_for_rule(df_local_param, antecedent, consequent):
-    # Both antecedent and consequent are tuples of (column_name, value)
-    mask_a = df_local_param[antecedent[0]] == antecedent[1]
-    mask_c = df_local_param[consequent[0]] == consequent[1]
-    table = pd.crosstab(mask_a, mask_c)
-    # More robust check for valid table for chi2
-    if table.shape !=(2,2) or (table.values==0).any():
-        return None, None
-    # Check if there's enough variation for chi2_contingency
-    # Ensure there are at least two unique values for both variables in the crosstab
-    if len(mask_a.unique()) < 2 or len(mask_c.unique()) < 2:
-        return None, None
-    chi2, p, _, _ = chi2_contingency(table)
-    return chi2, p
-
-# Define parse_onehot function globally
-def parse_onehot(item_string: str):
-    """
-    Parses a one-hot encoded item string (e.g., 'column_name_value')
-    to return (original_column_name, value).
-    Handles original column names that might contain underscores.
-    """
-    last_underscore_index = item_string.rfind('_')
-    if last_underscore_index != -1:
-        col_name = item_string[:last_underscore_index]
-        value = item_string[last_underscore_index + 1:]
-        return (col_name, value)
-    else:
-        # Fallback for items that might not be in 'col_value' format
-        # This could happen if the column itself was boolean and passed directly
-        # or if there's a single item not generated from pd.get_dummies
-        return (item_string, True) # Risky, but better than an immediate crash
+    min_support: float = 0.05
+    max_len: Optional[int] = None
+    metric: str = 'lift' # support, confidence, lift, leverage or conviction
+    min_threshold: float = 1.0
+    engine: str = 'native' # 'native' (bitmap itemsets) or 'mlxtend'
+    # Approximate mode: mine a row sample sized so supports are within error_tolerance (default min_support / 4)
+    approximate: bool = False
+    error_tolerance: Optional[float] = None
+    confidence: float = 0.95
+    sampling: str = 'stratified' # 'stratified' (by season) or 'uniform'
+    verify: bool = False # recount the sampled itemsets on every row
+    random_state: Optional[int] = None
 
 # Cluster crimes into hotspots using K-Means on latitude, longitude, and cyclical time features
 @app.post("/api/hotspots")
+@profiled
 def hotspots(request: HotspotRequest):
-    df_local = df.copy()
+    from kmeans import run_hotspot_kmeans, fit_hotspot_kmeans, centroid_records, cluster_counts
+
+    # No copy of the frame: features are built from a copy of the four columns, and cached per version
+    kmeans_args = dict(
+        k=request.k,
+        max_iter=request.max_iter,
+        tol=request.tol,
+        random_state=request.random_state,
+        datetime_col=request.datetime_col,
+        time_col=request.time_col,
+        lat_col=request.lat_col,
+        lon_col=request.lon_col,
+        assignments=request.assignments,
+        version=crime_version,
+        dtype=request.dtype,
+    )
     try:
-        result = run_hotspot_kmeans(
-            df_local,
-            k=request.k,
-            max_iter=request.max_iter,
-            tol=request.tol,
-            random_state=request.random_state,
-            datetime_col=request.datetime_col,
-            time_col=request.time_col,
-            lat_col=request.lat_col,
-            lon_col=request.lon_col,
-        )
+        if request.stream:
+            fit = fit_hotspot_kmeans(df, **kmeans_args)
+        else:
+            result = run_hotspot_kmeans(df, **kmeans_args)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
-    return result
+    if request.stream:
+        header = {
+            "centroids": centroid_records(fit["centroids"]),
+            "counts": cluster_counts(fit["point_labels"], len(fit["centroids"]), fit["weights"]),
+            "n_rows_used": int(fit["weights"].sum()),
+        }
+        if not request.assignments:
+            return ndjson_response(header, [])
+        return ndjson_response(header, array_batches("assignments", {"index": fit["index"], "cluster": fit["labels"]}))
+
+    # A row of assignments per crime; dumping the plain dicts directly skips the per-item encoder walk
+    return Response(content=json.dumps(result), media_type="application/json")
 
 @app.get("/api/seasons")
+@profiled
+@precomputed
 def seasonal_crime_patterns():
-    # It's better to work on a copy of the global df for modifications within an endpoint
-    df_local_seasons = df.copy()
-    df_local_seasons['date'] = pd.to_datetime(df_local_seasons['date'])
-    df_local_seasons['season'] = df_local_seasons['date'].dt.month.apply(get_season)
-    # Group by season and crime_type, count occurrences
-    season_crime = df_local_seasons.groupby(['season', 'crime_type']).size().reset_index(name='count')
-    # Group by season and weapon used, count occurrences
-    if 'weapon_used' in df_local_seasons.columns:
-        season_weapon = df_local_seasons.groupby(['season', 'weapon_used']).size().reset_index(name='count')
-    else:
-        season_weapon = []
+    from cooccurrence import get_cooccurrence
+
+    # Counts are slices of the cached co-occurrence matrix instead of re-parsing dates and grouping
+    season_columns = [col for col in ('season', 'crime_type', 'weapon_used') if col in df.columns]
+    cooccurrence = get_cooccurrence(df, season_columns, crime_version)
+    season_crime = crosstab_records(cooccurrence.contingency('season', 'crime_type'))
+    season_weapon = []
+    if 'weapon_used' in season_columns:
+        season_weapon = crosstab_records(cooccurrence.contingency('season', 'weapon_used'))
     return {
-        "season_crime": season_crime.to_dict(orient='records'),
-        "season_weapon": season_weapon if isinstance(season_weapon, list) else season_weapon.to_dict(orient='records')
+        "season_crime": season_crime,
+        "season_weapon": season_weapon
     }
 
 @app.post("/api/weather_analysis")
+@profiled
 def weather_analysis(request: AprioriRequest):
+    from weather_analysis import run_seasonal_analysis
+
     selected_df = None
+    selected_index = None
+    selected_version = None
     if request.dataset_name == "crime_data":
-        selected_df = df.copy()
+        with span('dataset.copy', rows=len(df)):
+            selected_df = df.copy()
+        selected_index = crime_index
+        selected_version = crime_version
     elif request.dataset_name == "safety_data":
-        selected_df = safetyDF.copy()
+        with span('dataset.copy', rows=len(safetyDF)):
+            selected_df = safetyDF.copy()
+        selected_index = safety_index
+        selected_version = safety_version
     else:
         raise HTTPException(status_code=400, detail="Invalid dataset_name. Choose 'crime_data' or 'safety_data'.")
 
@@ -128,7 +279,22 @@ def weather_analysis(request: AprioriRequest):
 
     try:
         # Call the run_seasonal_analysis function from weather_analysis.py with the selected DataFrame
-        return run_seasonal_analysis(selected_df)
+        return run_seasonal_analysis(
+            selected_df,
+            bitmap_index=selected_index,
+            min_support=request.min_support,
+            max_len=request.max_len,
+            metric=request.metric,
+            min_threshold=request.min_threshold,
+            engine=request.engine,
+            dataset_version=selected_version,
+            approximate=request.approximate,
+            error_tolerance=request.error_tolerance,
+            confidence=request.confidence,
+            sampling=request.sampling,
+            verify=request.verify,
+            random_state=request.random_state,
+        )
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=f"Error in seasonal analysis: {exc}")
     except Exception as exc:
@@ -144,6 +310,8 @@ def weather_analysis(request: AprioriRequest):
     
 # Endpoint to preview the cleaned data
 @app.get("/api/cleaned_data_preview")
+@profiled
+@precomputed
 def get_cleaned_data_preview():
     """
     Returns the first 20 rows of the cleaned crime data.
@@ -158,17 +326,14 @@ def get_cleaned_data_preview():
     
     available_columns = [col for col in display_columns if col in safetyDF.columns]
     
-    preview_df = (
-    safetyDF[available_columns]
-    .assign(date=lambda df: pd.to_datetime(df['date'], errors='coerce'))
-    .sort_values('date')
-    .assign(date=lambda df: df['date'].dt.strftime('%Y-%m-%d'))
-    .head(5)
-)
-    return preview_df.to_dict(orient='records')
+    # First rows in date order, straight from the precomputed permutation
+    positions, _ = safety_rows.page('date', 0, 5)
+    return safety_rows.records(positions, available_columns)
 
 #Endpoint for other data preview
 @app.get("/api/crime_data_preview")
+@profiled
+@precomputed
 def get_crime_data_preview():
     """
     Returns the first 5 rows of the main crime data (df).
@@ -184,86 +349,410 @@ def get_crime_data_preview():
 
     available_columns = [col for col in display_columns if col in df.columns]
 
-    preview_df = (
-        df[available_columns]
-        .assign(date=lambda df_inner: pd.to_datetime(df_inner['date'], errors='coerce'))
-        .sort_values('date')
-        .assign(date=lambda df_inner: df_inner['date'].dt.strftime('%Y-%m-%d'))
-        .head(5)
-    )
-    #Replace NaN values in float columns with None
-    for col in preview_df.select_dtypes(include=[np.number]).columns:
-        if preview_df[col].isnull().any():
-            preview_df[col] = preview_df[col].replace({np.nan: None})
+    # First rows in date order, with NaN values as None
+    positions, _ = crime_rows.page('date', 0, 5)
+    return crime_rows.records(positions, available_columns)
+
+MAX_PAGE_SIZE = 1000
+
+# Page through a cleaned dataset in any column order, optionally filtered by date range and
+# categorical values. Each page costs O(page size) (O(matching rows) with filters), never a full sort.
+@app.get("/api/data/{dataset_name}")
+@profiled
+def browse_data(
+    dataset_name: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    sort: str = "date",
+    order: str = "asc",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    crime_type: Optional[str] = None,
+    season: Optional[str] = None,
+    weapon_used: Optional[str] = None,
+    area_name: Optional[str] = None,
+    time_period: Optional[str] = None,
+):
+    if dataset_name == "crime_data":
+        frame, rows_index, bitmap_index = df, crime_rows, crime_index
+    elif dataset_name == "safety_data":
+        frame, rows_index, bitmap_index = safetyDF, safety_rows, safety_index
+    else:
+        raise HTTPException(status_code=400, detail="Invalid dataset_name. Choose 'crime_data' or 'safety_data'.")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order has to be 'asc' or 'desc'.")
+
+    filters = {
+        'crime_type': crime_type, 'season': season, 'weapon_used': weapon_used,
+        'area_name': area_name, 'time_period': time_period,
+    }
+    rows = None
+    try:
+        for col, value in filters.items():
+            if value is None:
+                continue
+            if not bitmap_index.has_column(col):
+                raise HTTPException(status_code=400, detail=f"Column '{col}' cannot be filtered in {dataset_name}.")
+            matched = bitmap_index.bitmap(col, value).to_rows()
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+        if date_from is not None or date_to is not None:
+            in_range = rows_index.date_range(date_from, date_to)
+            rows = in_range if rows is None else np.intersect1d(rows, in_range, assume_unique=True)
+        positions, total = rows_index.page(sort, offset, limit, descending=order == "desc", rows=rows)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-    return preview_df.to_dict(orient='records')
+    return {
+        "dataset": dataset_name,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "sort": sort,
+        "order": order,
+        "rows": rows_index.records(positions, list(frame.columns)),
+    }
 
-@app.get("/api/hotspot_grid")
-def get_hotspot_grid():
-    """
-    Analyzes crime data to generate a hot spot grid based on latitude and longitude bins.
-    Returns a JSON object with crime counts grouped by geographic bands.
-    """
-    df_grid = df.copy() # Use a copy of the global DataFrame
+# Crime counts on the hotspot grid at bin_size, from the rows with both coordinates
+def hotspot_grid_counts(bin_size: float) -> Dict[str, object]:
+    from spatial_index import hotspot_grid
 
     # Ensure latitude and longitude columns exist and are numeric
-    if 'latitude' not in df_grid.columns or 'longitude' not in df_grid.columns:
+    if 'latitude' not in df.columns or 'longitude' not in df.columns:
         raise HTTPException(status_code=400, detail="Latitude or longitude columns not found in data.")
-    
+
+    lat = df['latitude'].to_numpy(dtype=float)
+    lon = df['longitude'].to_numpy(dtype=float)
     # Drop rows with NaN in 'latitude' or 'longitude'
-    df_grid.dropna(subset=['latitude', 'longitude'], inplace=True)
-    
-    if df_grid.empty:
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    lat, lon = lat[valid], lon[valid]
+
+    if lat.size == 0:
         raise HTTPException(status_code=400, detail="No valid latitude/longitude data to generate grid.")
+    try:
+        return hotspot_grid(lat, lon, bin_size)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+# Nested {"lat_band", "values"} rows kept for older clients, built from the count matrix
+def nested_grid(counts: np.ndarray, lat_bins: np.ndarray, lon_bins: np.ndarray) -> list:
+    # Interval labels exactly as pd.cut(precision=2) would produce them, without binning any rows
+    lat_labels = pd.cut(pd.Series([], dtype=float), bins=lat_bins, include_lowest=True, precision=2).cat.categories
+    lon_labels = pd.cut(pd.Series([], dtype=float), bins=lon_bins, include_lowest=True, precision=2).cat.categories
+    lon_keys = [f"{band.left:.2f}" for band, used in zip(lon_labels, counts.any(axis=0)) if used]
+    used_counts = counts[:, counts.any(axis=0)]
+    output_grid = []
+    for i in np.flatnonzero(counts.any(axis=1)):
+        output_grid.append({
+            "lat_band": f"{lat_labels[i].left:.2f} - {lat_labels[i].right:.2f}",
+            "values": dict(zip(lon_keys, used_counts[i].tolist()))
+        })
+    return output_grid
+
+@app.get("/api/hotspot_grid")
+@profiled
+@precomputed
+def get_hotspot_grid(fmt: str = Query("sparse", alias="format")):
+    """
+    Analyzes crime data to generate a hot spot grid based on latitude and longitude bins.
+    format=sparse (default) returns the bin edges once plus [lat_idx, lon_idx, count]
+    triplets for non-empty cells. format=nested returns the older list of
+    {"lat_band", "values"} rows keyed by formatted band strings.
+    """
+    from spatial_index import sparse_cells
 
-    # Define latitude and longitude bins (adjust these values based on your data's geographic spread)
-    min_lat, max_lat = df_grid['latitude'].min(), df_grid['latitude'].max()
-    min_lon, max_lon = df_grid['longitude'].min(), df_grid['longitude'].max()
+    if fmt not in ("sparse", "nested"):
+        raise HTTPException(status_code=400, detail="format has to be 'sparse' or 'nested'.")
 
     # You might want to adjust bin sizes for different granularities
-    lat_bin_size = .05
-    lon_bin_size = .05
+    grid = hotspot_grid_counts(0.05)
+    lat_bins, lon_bins, counts = grid['lat_edges'], grid['lon_edges'], grid['counts']
 
-    lat_bins = np.arange(np.floor(min_lat * 100) / 100, np.ceil(max_lat * 100) / 100 + lat_bin_size, lat_bin_size)
-    lon_bins = np.arange(np.floor(min_lon * 100) / 100, np.ceil(max_lon * 100) / 100 + lon_bin_size, lon_bin_size)
+    if fmt == "nested":
+        return {"grid": nested_grid(counts, lat_bins, lon_bins)}
 
-    # Bin the data
-    df_grid['lat_bin'] = pd.cut(df_grid['latitude'], bins=lat_bins, include_lowest=True, precision=2)
-    df_grid['lon_bin'] = pd.cut(df_grid['longitude'], bins=lon_bins, include_lowest=True, precision=2)
+    return {
+        "lat_edges": np.round(lat_bins, 6).tolist(),
+        "lon_edges": np.round(lon_bins, 6).tolist(),
+        "cells": sparse_cells(counts).tolist(),
+    }
 
-    # Count crimes per lat/lon bin
-    grid_counts = df_grid.groupby(['lat_bin', 'lon_bin']).size().unstack(fill_value=0)
+# Getis-Ord Gi* hot and cold spots on the hotspot grid (at any bin size, same edges and cells): z-scores of each cell's
+# neighbourhood count against the whole grid, with optional permutation p-values run in worker processes
+@app.get("/api/hotspot_gi")
+@profiled
+def get_hotspot_gi(
+    bin_size: float = 0.05,
+    weights: str = "queen",
+    radius_m: Optional[float] = None,
+    permutations: int = 0,
+    random_state: Optional[int] = None,
+):
+    from getis_ord import hotspot_statistics
 
-    # Convert to a list of dictionaries for JSON output
-    output_grid = []
-    for lat_band, row in grid_counts.iterrows():
-        # Format lat_band to a readable string (e.g., "34.00 - 34.01")
-        if pd.isna(lat_band):
-            lat_band_str = "Unknown Lat"
-        else:
-            lat_band_str = f"{lat_band.left:.2f} - {lat_band.right:.2f}"
-            
-        values_dict = {}
-        for lon_band, count in row.items():
-            if pd.isna(lon_band):
-                lon_band_str = "Unknown Lon"
-            else:
-                lon_band_str = f"{lon_band.left:.2f}" # Using just the left bound for simplicity
-            values_dict[lon_band_str] = int(count)
-
-        # Filter out rows with no crime data
-        if any(v > 0 for v in values_dict.values()):
-            output_grid.append({
-                "lat_band": lat_band_str,
-                "values": values_dict
-            })
-    
-    # Sort output grid by latitude band for consistent display
-    output_grid.sort(key=lambda x: float(x['lat_band'].split(' ')[0]))
+    grid = hotspot_grid_counts(bin_size)
+    try:
+        result = hotspot_statistics(
+            grid,
+            weights=weights,
+            radius_m=radius_m,
+            permutations=permutations,
+            random_state=random_state,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    body = {
+        "lat_edges": np.round(grid['lat_edges'], 6).tolist(),
+        "lon_edges": np.round(grid['lon_edges'], 6).tolist(),
+        **result,
+    }
+    # Unseeded permutations give slightly different p_sim on every run
+    headers = {"Cache-Control": "no-store"} if permutations and random_state is None else None
+    # Fine grids have 100k+ cells; dumping the plain lists directly skips the per-item encoder walk
+    return Response(content=json.dumps(body), media_type="application/json", headers=headers)
+
+# Columns returned for individual crimes by the proximity endpoints
+NEARBY_COLUMNS = ['date', 'time', 'crime_type', 'latitude', 'longitude', 'area_name', 'weapon_used', 'time_period']
+
+def crime_records(rows: np.ndarray) -> list:
+    available_columns = [col for col in NEARBY_COLUMNS if col in df.columns]
+    records_df = df.iloc[rows][available_columns].astype(object)
+    records_df = records_df.where(pd.notna(records_df), None)
+    records_df.insert(0, 'index', df.index[rows])
+    return records_df.to_dict(orient='records')
+
+def require_spatial_index():
+    if spatial_index is None:
+        raise HTTPException(status_code=400, detail="Latitude or longitude columns not found in data.")
+    return spatial_index
+
+@app.get("/api/spatial_grid")
+@profiled
+def get_spatial_grid(bin_size: float = 0.05):
+    """
+    Crime counts on a lat/lon grid of any bin size (snapped to the index base step).
+    Only non-empty cells are returned as [lat_idx, lon_idx, count] triplets.
+    """
+    from spatial_index import sparse_cells
+
+    index = require_spatial_index()
+    try:
+        grid = index.grid(bin_size)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {
+        "bin_size": grid['bin_size'],
+        "lat_edges": np.round(grid['lat_edges'], 6).tolist(),
+        "lon_edges": np.round(grid['lon_edges'], 6).tolist(),
+        "cells": sparse_cells(grid['counts']).tolist(),
+    }
+
+@app.get("/api/crimes_near")
+@profiled
+def get_crimes_near(lat: float, lon: float, radius_m: float = 500, limit: int = 1000):
+    """
+    Crimes within radius_m meters of (lat, lon), nearest first.
+    """
+    index = require_spatial_index()
+    try:
+        rows, distances = index.radius_query(lat, lon, radius_m)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    crimes = crime_records(rows[:max(limit, 0)])
+    for record, distance in zip(crimes, distances[:max(limit, 0)]):
+        record['distance_m'] = round(float(distance), 1)
+    return {"count": int(rows.size), "crimes": crimes}
+
+@app.get("/api/crimes_in_bbox")
+@profiled
+def get_crimes_in_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, limit: int = 1000):
+    """
+    Crimes inside an inclusive latitude/longitude bounding box.
+    """
+    index = require_spatial_index()
+    try:
+        rows = index.bbox_query(min_lat, min_lon, max_lat, max_lon)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"count": int(rows.size), "crimes": crime_records(rows[:max(limit, 0)])}
+
+# Smoothed crime density (crimes per km^2) as a float32 raster over the data extent (or the given bounds),
+# rows south to north. format=json base64-encodes the raster; format=bin sends the raw little-endian floats
+# with the shape and bounds in X-Raster-* headers. Filtered maps share the full extent so they line up.
+@app.get("/api/kde")
+@profiled
+def get_kde(
+    cell_size_m: float = 100,
+    bandwidth_m: float = 300,
+    crime_type: Optional[str] = None,
+    season: Optional[str] = None,
+    hour_from: Optional[int] = Query(None, ge=0, le=23),
+    hour_to: Optional[int] = Query(None, ge=0, le=23),
+    min_lat: Optional[float] = None,
+    min_lon: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    max_lon: Optional[float] = None,
+    fmt: str = Query("json", alias="format"),
+):
+    from kde import data_bounds, kde_surface
+
+    index = require_spatial_index()
+    if fmt not in ("json", "bin"):
+        raise HTTPException(status_code=400, detail="format has to be 'json' or 'bin'.")
+    box = (min_lat, min_lon, max_lat, max_lon)
+    if any(v is not None for v in box) and any(v is None for v in box):
+        raise HTTPException(status_code=400, detail="Give all of min_lat, min_lon, max_lat and max_lon, or none.")
+    bounds = box if box[0] is not None else data_bounds(index.lat, index.lon)
+
+    keep = np.ones(len(index), dtype=bool)
+    for col, value in (('crime_type', crime_type), ('season', season)):
+        if value is None:
+            continue
+        if not crime_index.has_column(col):
+            raise HTTPException(status_code=400, detail=f"Column '{col}' not found in data.")
+        selected = np.zeros(len(df), dtype=bool)
+        selected[crime_index.bitmap(col, value).to_rows()] = True
+        keep &= selected[index.rows]
+    if hour_from is not None or hour_to is not None:
+        if 'hour' not in df.columns:
+            raise HTTPException(status_code=400, detail="Column 'hour' not found in data.")
+        hours = pd.to_numeric(df['hour'], errors='coerce').to_numpy()[index.rows]
+        lo = 0 if hour_from is None else hour_from
+        hi = 23 if hour_to is None else hour_to
+        # hour_from > hour_to wraps past midnight, e.g. 22 to 3
+        keep &= ((hours >= lo) & (hours <= hi)) if lo <= hi else ((hours >= lo) | (hours <= hi))
 
-    return {"grid": output_grid}
+    try:
+        surface = kde_surface(index.lat[keep], index.lon[keep], cell_size_m=cell_size_m, bandwidth_m=bandwidth_m, bounds=bounds)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    raster = surface.pop('density').astype('<f4').tobytes()
+    if fmt == "bin":
+        headers = {
+            "X-Raster-Shape": ",".join(str(n) for n in surface['shape']),
+            "X-Raster-Bounds": ",".join(repr(v) for v in surface['bounds']),
+            "X-Raster-Dtype": "float32",
+        }
+        return Response(content=raster, media_type="application/octet-stream", headers=headers)
+    return {**surface, "dtype": "float32", "data": base64.b64encode(raster).decode('ascii')}
+
+# Knox near-repeat test: counts of crime pairs by distance band x time band against time-shuffled
+# Monte Carlo permutations (run in parallel), e.g. "burglaries within 200 m and 7 days of each other"
+@app.get("/api/near_repeat")
+@profiled
+def get_near_repeat(
+    response: Response,
+    distance_bandwidth_m: float = 200,
+    n_distance_bands: int = 5,
+    time_bandwidth_days: float = 7,
+    n_time_bands: int = 4,
+    permutations: int = 0,
+    crime_type: Optional[str] = None,
+    random_state: Optional[int] = None,
+):
+    """
+    Knox table of crime pairs by distance and time band. The Monte Carlo test (expected counts,
+    Knox ratios, p-values) runs only when permutations > 0; each permutation recounts every
+    pair, so on the full dataset 99 permutations take minutes per core.
+    """
+    from near_repeat import run_near_repeat
+
+    frame = df
+    if crime_type is not None:
+        if not crime_index.has_column('crime_type') or crime_type not in crime_index.values('crime_type'):
+            raise HTTPException(status_code=400, detail=f"Unknown crime_type '{crime_type}'.")
+        frame = df.iloc[crime_index.bitmap('crime_type', crime_type).to_rows()]
+    try:
+        result = run_near_repeat(
+            frame,
+            distance_bandwidth_m=distance_bandwidth_m,
+            n_distance_bands=n_distance_bands,
+            time_bandwidth_days=time_bandwidth_days,
+            n_time_bands=n_time_bands,
+            permutations=permutations,
+            random_state=random_state,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    # Unseeded permutations give slightly different p-values on every run
+    if permutations and random_state is None:
+        response.headers["Cache-Control"] = "no-store"
+    return {"crime_type": crime_type, **result}
+
+# Per-type pyramids are built on first use, one build per type at a time, and kept in a small LRU
+def get_tile_pyramid(crime_type: Optional[str]) -> TilePyramid:
+    # Work on the dataset that was loaded when the request came in, even if a reload swaps it meanwhile
+    pyramids, frame, index = tile_pyramids, df, crime_index
+    with _pyramid_lock:
+        if crime_type in pyramids:
+            pyramids.move_to_end(crime_type)
+            return pyramids[crime_type]
+    if not index.has_column('crime_type') or crime_type not in index.values('crime_type'):
+        raise HTTPException(status_code=400, detail=f"Unknown crime_type '{crime_type}'.")
+
+    with _pyramid_lock:
+        build_lock = _pyramid_builds.setdefault(crime_type, threading.Lock())
+    with build_lock:
+        with _pyramid_lock:
+            pyramid = pyramids.get(crime_type)
+        if pyramid is None:
+            rows = index.bitmap('crime_type', crime_type).to_rows()
+            pyramid = TilePyramid.from_frame(frame.iloc[rows])
+            with _pyramid_lock:
+                pyramids[crime_type] = pyramid
+                evictable = [key for key in pyramids if key is not None]
+                for key in evictable[:max(len(evictable) - MAX_CACHED_PYRAMIDS, 0)]:
+                    del pyramids[key]
+    with _pyramid_lock:
+        _pyramid_builds.pop(crime_type, None)
+    return pyramid
+
+@app.get("/api/tiles/{z}/{x}/{y}")
+@profiled
+def get_tile(
+    z: int,
+    x: int,
+    y: int,
+    request: Request,
+    crime_type: Optional[str] = None,
+    fmt: str = Query("json", alias="format"),
+):
+    """
+    Precomputed crime counts for one Web Mercator map tile.
+    Each tile is a TILE_RESOLUTION x TILE_RESOLUTION grid; only non-empty cells are sent,
+    with cell = row * resolution + col. format=bin returns little-endian int32 (cell, count) pairs.
+    """
+    if spatial_index is None:
+        raise HTTPException(status_code=400, detail="Latitude or longitude columns not found in data.")
+    if fmt not in ("json", "bin"):
+        raise HTTPException(status_code=400, detail="format has to be 'json' or 'bin'.")
+
+    # Tiles carry their own long-lived Cache-Control, so they set their own ETag (per content coding)
+    etag = make_etag(crime_version, "tile", z, x, y, crime_type, fmt, negotiate(request.headers.get("accept-encoding")))
+    if etag_matches(request, etag):
+        return not_modified(etag, TILE_CACHE_CONTROL)
+
+    try:
+        cells = get_tile_pyramid(crime_type).tile(z, x, y)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    headers = {"ETag": etag, "Cache-Control": TILE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if fmt == "bin":
+        return Response(content=cells.astype('<i4').tobytes(), media_type="application/octet-stream", headers=headers)
+    body = {
+        "z": z,
+        "x": x,
+        "y": y,
+        "resolution": TILE_RESOLUTION,
+        "cells": cells[:, 0].tolist(),
+        "counts": cells[:, 1].tolist(),
+    }
+    return Response(content=json.dumps(body), media_type="application/json", headers=headers)
 
 @app.get("/api/time_of_day")
+@profiled
+@precomputed
 def get_time_of_day()-> dict[str, int]:
     """
     Calculates the distribution of crimes by time of day into 3-hour buckets.
@@ -315,15 +804,39 @@ class SequenceMiningRequest(BaseModel):
     time_window_hours: int = 24
     grouping_method: str = 'spatial_temporal'
     area_col: Optional[str] = None # Optional, will default to 'area_name' if needed
+    max_pattern_length: Optional[int] = None
+    on_over_budget: str = 'downgrade' # 'downgrade' (raise support / cap length) or 'reject' when the estimate is over budget
+    # Approximate mode: mine a sample of the sequences sized so supports are within error_tolerance (default min_support / 4)
+    approximate: bool = False
+    error_tolerance: Optional[float] = None
+    confidence: float = 0.95
+    sampling: str = 'stratified' # 'stratified' (by area / spatial cell) or 'uniform'
+    verify: bool = False # recount the sampled patterns on every sequence
+    random_state: Optional[int] = None
+    stream: bool = False # NDJSON: statistics and patterns first, then sequence_metadata batches
+    # min_support levels for a slider: mined once at the lowest, each level's counts and top patterns read off that result
+    support_sweep: Optional[List[float]] = None
+
+# Streamed variant of the sequence mining response
+def stream_crime_sequences(df_local: pd.DataFrame, **mining_args):
+    from sequence_mining import mine_crime_sequences, iter_sequence_metadata_batches
+
+    result, store = mine_crime_sequences(df_local, **mining_args)
+    return ndjson_response(result, iter_sequence_metadata_batches(store))
 
 # Change this from @app.get to @app.post and update parameters
 @app.post("/api/crime_sequences")
+@profiled
 def post_crime_sequences(request: SequenceMiningRequest):
     """
     Run crime sequence mining algo from sequence_mining.py with configurable parameters.
     """
+    from sequence_mining import run_crime_sequence_mining
+    from sequence_cost import MiningBudgetExceeded
+
     try:
-        df_local = df.copy()
+        # No copy of the frame: sessionizing reads a copy of the columns it needs
+        df_local = df
 
         # Handle area_col if grouping_method is 'area_based'
         effective_area_col = request.area_col
@@ -347,34 +860,71 @@ def post_crime_sequences(request: SequenceMiningRequest):
         if df_local.empty:
             raise HTTPException(status_code=404, detail="Crime dataset is empty.")
 
-        result = run_crime_sequence_mining(
-            df_local,
+        mining_args = dict(
             min_support=request.min_support,
             time_window_hours=request.time_window_hours,
             area_col=effective_area_col, # Pass the resolved area_col
             grouping_method=request.grouping_method,
             max_patterns=50, # Keeping this fixed for now, can be made configurable
+            max_pattern_length=request.max_pattern_length,
+            on_over_budget=request.on_over_budget,
+            approximate=request.approximate,
+            error_tolerance=request.error_tolerance,
+            confidence=request.confidence,
+            sampling=request.sampling,
+            verify=request.verify,
+            random_state=request.random_state,
+            version=crime_version,
+            support_sweep=request.support_sweep,
         )
+        if request.stream:
+            return stream_crime_sequences(df_local, **mining_args)
+
+        result = run_crime_sequence_mining(df_local, **mining_args)
         
         return result
 
+    except HTTPException:
+        raise
+    except MiningBudgetExceeded as exc:
+        raise HTTPException(status_code=400, detail={'message': str(exc), 'admission': exc.admission})
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as e:
-        print(f"ERROR in /api/crime_sequences: {traceback.format_exc()}")
+        logger.exception("Error in /api/crime_sequences")
         raise HTTPException(status_code=500, detail=str(e))
                     
 @app.get("/api/crime_sequences")
+@profiled
 def get_crime_sequences(
+    response: Response,
     min_support: float = 0.01,
     time_window_hours: int = 24,
     area_col: str = "area_name",
     grouping_method: str = "spatial_temporal",
     max_patterns: int = 50,
+    max_pattern_length: Optional[int] = None,
+    on_over_budget: str = "downgrade",
+    approximate: bool = False,
+    error_tolerance: Optional[float] = None,
+    confidence: float = 0.95,
+    sampling: str = "stratified",
+    verify: bool = False,
+    random_state: Optional[int] = None,
+    stream: bool = False,
+    support_sweep: Optional[List[float]] = Query(None),
 ):
     """
     Run crime sequence mining algo from sequence_mining.py.
+    stream=true returns NDJSON: statistics and patterns first, then sequence_metadata batches.
+    support_sweep (repeatable) adds pattern counts and top patterns per min_support level from one mining pass.
     """
+    from sequence_mining import run_crime_sequence_mining
+    from sequence_cost import MiningBudgetExceeded
+
     try:
-        df_local=df.copy()
+        # No copy of the frame: sessionizing reads a copy of the columns it needs
+        df_local = df
         if grouping_method == "area_based" and area_col not in df_local.columns:
             raise HTTPException(
                 status_code=400,
@@ -383,17 +933,60 @@ def get_crime_sequences(
         if df_local.empty:
             raise HTTPException(status_code=404, detail="Crime dataset is empty.")
 
-        result = run_crime_sequence_mining(
-            df_local,
+        mining_args = dict(
             min_support=min_support,
             time_window_hours=time_window_hours,
             area_col=area_col,
             grouping_method=grouping_method,
             max_patterns=max_patterns,
+            max_pattern_length=max_pattern_length,
+            on_over_budget=on_over_budget,
+            approximate=approximate,
+            error_tolerance=error_tolerance,
+            confidence=confidence,
+            sampling=sampling,
+            verify=verify,
+            random_state=random_state,
+            version=crime_version,
+            support_sweep=support_sweep,
         )
+        # An unseeded sample gives different results on every run, so they must not get an ETag
+        cache_control = "no-store" if approximate and random_state is None else None
+        if stream:
+            streamed = stream_crime_sequences(df_local, **mining_args)
+            if cache_control:
+                streamed.headers["Cache-Control"] = cache_control
+            return streamed
+
+        result = run_crime_sequence_mining(df_local, **mining_args)
+        if cache_control:
+            response.headers["Cache-Control"] = cache_control
 
         return result
 
+    except HTTPException:
+        raise
+    except MiningBudgetExceeded as exc:
+        raise HTTPException(status_code=400, detail={'message': str(exc), 'admission': exc.admission})
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as e:
-        print(f"ERROR in /api/crime_sequences: {traceback.format_exc()}")
+        logger.exception("Error in /api/crime_sequences")
         raise HTTPException(status_code=500, detail=str(e))
+
+# Imports the analysis modules ahead of their first request
+def warm_imports():
+    import scipy.stats
+    import kmeans, sequence_mining, weather_analysis
+
+# Warmup (WARMUP=1): the analysis imports, then the default responses of the parameterless endpoints
+WARMUP_STEPS = [
+    ('imports', warm_imports),
+    ('seasons', seasonal_crime_patterns),
+    ('time_of_day', get_time_of_day),
+    ('cleaned_data_preview', get_cleaned_data_preview),
+    ('crime_data_preview', get_crime_data_preview),
+    ('hotspot_grid', lambda: get_hotspot_grid(fmt="sparse")),
+    # The Flutter charts page still asks for the nested layout
+    ('hotspot_grid_nested', lambda: get_hotspot_grid(fmt="nested")),
+]
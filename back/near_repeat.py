@@ -0,0 +1,192 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from instrumentation import span
+from sequence_kernels import JIT_OPTIONS, njit
+from spatial_index import project_to_meters
+
+# Permutation counts run on this many threads; the counting kernel releases the GIL
+NEAR_REPEAT_WORKERS = int(os.environ.get('NEAR_REPEAT_WORKERS', str(os.cpu_count() or 1)))
+MAX_PERMUTATIONS = 999
+MAX_BANDS = 50
+
+
+@njit(**JIT_OPTIONS)
+def knox_count_kernel(keys, cell_starts, x, y, t, stride, d_band, n_d, t_band, n_t):
+    """
+    Knox table of event pairs closer than n_d * d_band meters and n_t * t_band days.
+    Events are grouped by spatial hash cell (cell size = the distance limit) and sorted by
+    time within each cell, so only the cell itself and four forward neighbours are scanned,
+    each within its time window; every unordered pair is seen exactly once.
+    """
+    counts = np.zeros(n_d * n_t, dtype=np.int64)
+    d_max = d_band * n_d
+    t_max = t_band * n_t
+    d_max2 = d_max * d_max
+    inv_d = 1.0 / d_band
+    inv_t = 1.0 / t_band
+    # (+1, -1), (+1, 0), (+1, +1), (0, +1) in (x, y) cell steps
+    offsets = np.array([stride - 1, stride, stride + 1, 1], dtype=np.int64)
+    for c in range(keys.size):
+        start = cell_starts[c]
+        end = cell_starts[c + 1]
+        for i in range(start, end):
+            xi, yi, ti = x[i], y[i], t[i]
+            for j in range(i + 1, end):
+                dt = t[j] - ti
+                if dt >= t_max:
+                    break
+                dx = x[j] - xi
+                dy = y[j] - yi
+                d2 = dx * dx + dy * dy
+                if d2 < d_max2:
+                    counts[min(int(np.sqrt(d2) * inv_d), n_d - 1) * n_t + min(int(dt * inv_t), n_t - 1)] += 1
+        for k in range(4):
+            neighbour = keys[c] + offsets[k]
+            pos = np.searchsorted(keys, neighbour)
+            if pos >= keys.size or keys[pos] != neighbour:
+                continue
+            n_start = cell_starts[pos]
+            n_end = cell_starts[pos + 1]
+            neighbour_times = t[n_start:n_end]
+            for i in range(start, end):
+                xi, yi, ti = x[i], y[i], t[i]
+                j = n_start + np.searchsorted(neighbour_times, ti - t_max, side='right')
+                while j < n_end:
+                    dt = t[j] - ti
+                    if dt >= t_max:
+                        break
+                    dx = x[j] - xi
+                    dy = y[j] - yi
+                    d2 = dx * dx + dy * dy
+                    if d2 < d_max2:
+                        counts[min(int(np.sqrt(d2) * inv_d), n_d - 1) * n_t + min(int(abs(dt) * inv_t), n_t - 1)] += 1
+                    j += 1
+    return counts.reshape(n_d, n_t)
+
+
+class SpatialHashGrid:
+    """
+    Events bucketed into square cells of `cell_size` meters. Only occupied cells are kept
+    (sorted int64 keys), so outlying coordinates cost nothing; neighbours are found by key.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, cell_size: float):
+        cx = np.floor(x / cell_size).astype(np.int64)
+        cy = np.floor(y / cell_size).astype(np.int64)
+        cx -= cx.min()
+        # Shifted by one and padded so the y +-1 neighbours never alias into the next column
+        cy -= cy.min() - 1
+        self.stride = int(cy.max()) + 2
+        self.event_keys = cx * self.stride + cy
+
+    # Events ordered by (cell, time), with the occupied cell keys and each cell's start offset
+    def layout(self, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        order = np.lexsort((t, self.event_keys))
+        sorted_keys = self.event_keys[order]
+        keys, starts = np.unique(sorted_keys, return_index=True)
+        cell_starts = np.append(starts, sorted_keys.size).astype(np.int64)
+        return order, keys, cell_starts
+
+
+# Event coordinates (meters) and times (days since the first event); rows without either are dropped
+def event_arrays(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    for col in ('date', 'latitude', 'longitude'):
+        if col not in df.columns:
+            raise ValueError(f"Missing required column '{col}'")
+    when = pd.to_datetime(df['date'], errors='coerce')
+    if 'hour' in df.columns:
+        when = when + pd.to_timedelta(pd.to_numeric(df['hour'], errors='coerce').fillna(0), unit='h')
+    if 'minute' in df.columns:
+        when = when + pd.to_timedelta(pd.to_numeric(df['minute'], errors='coerce').fillna(0), unit='m')
+    lat = pd.to_numeric(df['latitude'], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(df['longitude'], errors='coerce').to_numpy(dtype=float)
+    valid = np.isfinite(lat) & np.isfinite(lon) & when.notna().to_numpy()
+    if not valid.any():
+        return np.empty(0), np.empty(0), np.empty(0)
+    lat, lon = lat[valid], lon[valid]
+    ns = when.to_numpy(dtype='datetime64[ns]')[valid].view(np.int64)
+    xy = project_to_meters(lat, lon, float(lat.mean()))
+    t = (ns - ns.min()) / (86400 * 10**9)
+    return np.ascontiguousarray(xy[:, 0]), np.ascontiguousarray(xy[:, 1]), t
+
+
+def knox_table(grid: SpatialHashGrid, x, y, t, d_band: float, n_d: int, t_band: float, n_t: int) -> np.ndarray:
+    order, keys, cell_starts = grid.layout(t)
+    return knox_count_kernel(
+        keys, cell_starts, x[order], y[order], np.ascontiguousarray(t[order]),
+        np.int64(grid.stride), float(d_band), n_d, float(t_band), n_t,
+    )
+
+
+def run_near_repeat(
+    df: pd.DataFrame,
+    *,
+    distance_bandwidth_m: float = 200.0,
+    n_distance_bands: int = 5,
+    time_bandwidth_days: float = 7.0,
+    n_time_bands: int = 4,
+    permutations: int = 0,
+    random_state: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> Dict[str, object]:
+    """
+    Knox near-repeat test: event pairs counted by distance band x time band, against the
+    counts expected when times are shuffled across locations (Monte Carlo permutations).
+    A Knox ratio above 1 with a small p-value means crimes follow crimes nearby in that band.
+    Bands are half-open, [k * bandwidth, (k + 1) * bandwidth). With permutations=0 only the
+    observed table is counted.
+    """
+    if distance_bandwidth_m <= 0 or time_bandwidth_days <= 0:
+        raise ValueError("Bandwidths have to be positive")
+    if not 1 <= n_distance_bands <= MAX_BANDS or not 1 <= n_time_bands <= MAX_BANDS:
+        raise ValueError(f"The number of bands has to be between 1 and {MAX_BANDS}")
+    if not 0 <= permutations <= MAX_PERMUTATIONS:
+        raise ValueError(f"permutations has to be between 0 and {MAX_PERMUTATIONS}")
+
+    with span('near_repeat.prepare', rows=len(df)):
+        x, y, t = event_arrays(df)
+        if t.size < 2:
+            raise ValueError("At least two events with coordinates and dates are needed")
+        grid = SpatialHashGrid(x, y, distance_bandwidth_m * n_distance_bands)
+
+    bands = (distance_bandwidth_m, n_distance_bands, time_bandwidth_days, n_time_bands)
+    with span('near_repeat.observed', rows=t.size):
+        observed = knox_table(grid, x, y, t, *bands)
+
+    # One independent stream per permutation, so results don't depend on the thread schedule
+    seeds = np.random.SeedSequence(random_state).spawn(permutations)
+
+    def permuted_table(seed: np.random.SeedSequence) -> np.ndarray:
+        return knox_table(grid, x, y, np.random.default_rng(seed).permutation(t), *bands)
+
+    with span('near_repeat.permutations', rows=t.size * permutations):
+        simulated: List[np.ndarray] = []
+        if permutations:
+            n_workers = max(1, min(workers or NEAR_REPEAT_WORKERS, permutations))
+            with ThreadPoolExecutor(max_workers=n_workers) as pool:
+                simulated = list(pool.map(permuted_table, seeds))
+
+    with span('near_repeat.summary'):
+        d_edges = np.arange(n_distance_bands + 1) * distance_bandwidth_m
+        t_edges = np.arange(n_time_bands + 1) * time_bandwidth_days
+        result: Dict[str, object] = {
+            'n_events': int(t.size),
+            'distance_bands_m': [[float(lo), float(hi)] for lo, hi in zip(d_edges[:-1], d_edges[1:])],
+            'time_bands_days': [[float(lo), float(hi)] for lo, hi in zip(t_edges[:-1], t_edges[1:])],
+            'observed': observed.tolist(),
+            'permutations': permutations,
+        }
+        if simulated:
+            stack = np.stack(simulated)
+            expected = stack.mean(axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = np.where(expected > 0, observed / expected, np.nan)
+            # Share of permutations at least as extreme as observed, counting the observed table itself
+            p_value = (1 + (stack >= observed).sum(axis=0)) / (permutations + 1)
+            result['expected'] = np.round(expected, 3).tolist()
+            result['knox_ratio'] = [[None if np.isnan(v) else round(float(v), 4) for v in row] for row in ratio]
+            result['p_value'] = np.round(p_value, 6).tolist()
+        return result
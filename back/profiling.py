@@ -0,0 +1,240 @@
+import cProfile
+import functools
+import heapq
+import hmac
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+# Profiling and the admin endpoints are off unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+ADMIN_TOKEN_HEADER = 'x-admin-token'
+PROFILE_HEADER = 'x-profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'crime-profiles'))
+MAX_STORED_PROFILES = int(os.environ.get('MAX_STORED_PROFILES', '50'))
+# How many of the slowest requests to keep, and the largest request body captured with them
+SLOW_REQUEST_BUFFER = int(os.environ.get('SLOW_REQUEST_BUFFER', '20'))
+MAX_CAPTURED_BODY = 64 * 1024
+# Only API requests are worth replaying; /metrics and /admin are left out
+TRACKED_PREFIX = '/api/'
+
+
+def admin_enabled() -> bool:
+    return bool(ADMIN_TOKEN)
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return admin_enabled() and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+# Query parameters in order, repeated keys included, so a logged request replays exactly
+def query_pairs(scope) -> List[Tuple[str, str]]:
+    return parse_qsl(scope.get('query_string', b'').decode('utf-8', errors='replace'), keep_blank_values=True)
+
+
+# ?profile=1 or X-Profile: 1 (the admin token is checked separately)
+def profile_requested(scope) -> bool:
+    profile = dict(query_pairs(scope)).get('profile')
+    return profile in ('1', 'true') or Headers(scope=scope).get(PROFILE_HEADER) in ('1', 'true')
+
+
+class ProfileState:
+    __slots__ = ('requested', 'profile_id')
+
+    def __init__(self, requested: bool):
+        self.requested = requested
+        self.profile_id: Optional[str] = None
+
+
+# Set per request by ProfilingMiddleware, read by handlers wrapped with @profiled
+_profile_state: ContextVar[Optional[ProfileState]] = ContextVar('profile_state', default=None)
+
+
+def _profile_path(profile_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f'{profile_id}.pstats')
+
+
+def _prune_profiles():
+    paths = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith('.pstats')),
+        key=os.path.getmtime,
+    )
+    for path in paths[:-MAX_STORED_PROFILES]:
+        os.remove(path)
+
+
+def profiled(handler):
+    """
+    Runs the handler under cProfile when the current request asked for profiling
+    (?profile=1 or X-Profile: 1 with a valid admin token). The stats are saved
+    as a .pstats file and their id is returned in the X-Profile-Id header.
+    Applied below the route decorator so it wraps the handler in its worker thread.
+    """
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        state = _profile_state.get()
+        if state is None or not state.requested:
+            return handler(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(handler, *args, **kwargs)
+        finally:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            state.profile_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            profiler.dump_stats(_profile_path(state.profile_id))
+            _prune_profiles()
+
+    return wrapper
+
+
+def list_profiles() -> List[Dict[str, object]]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if name.endswith('.pstats'):
+            path = os.path.join(PROFILE_DIR, name)
+            profiles.append({'id': name[:-len('.pstats')], 'bytes': os.path.getsize(path)})
+    return profiles
+
+
+# Path of a stored profile, or None for unknown (or malformed) ids
+def profile_file(profile_id: str) -> Optional[str]:
+    if os.path.basename(profile_id) != profile_id or not profile_id:
+        return None
+    path = _profile_path(profile_id)
+    return path if os.path.isfile(path) else None
+
+
+# Top functions of a stored profile as pstats prints them
+def profile_summary(path: str, sort: str = 'cumulative', limit: int = 40) -> str:
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+class SlowRequestLog:
+    """
+    The N slowest API requests seen so far, with the method, path, query
+    parameters and JSON body needed to replay them offline.
+    """
+
+    def __init__(self, size: int = SLOW_REQUEST_BUFFER):
+        self.size = size
+        self._heap: List[tuple] = []
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def record(self, duration: float, entry: Dict[str, object]):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._counter += 1
+            item = (duration, self._counter, entry)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif duration > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def entries(self) -> List[Dict[str, object]]:
+        with self._lock:
+            items = sorted(self._heap, reverse=True)
+        return [entry for _, _, entry in items]
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+
+
+slow_requests = SlowRequestLog()
+
+
+def _captured_body(chunks: List[bytes], truncated: bool) -> object:
+    body = b''.join(chunks)
+    if truncated or not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body.decode('utf-8', errors='replace')
+
+
+class ProfilingMiddleware:
+    """
+    Turns ?profile=1 / X-Profile: 1 into a profiling request for @profiled handlers
+    (403 without a valid admin token), adds X-Profile-Id to profiled responses and
+    feeds every API request into the slowest-requests log.
+    """
+
+    def __init__(self, app, log: SlowRequestLog = slow_requests):
+        self.app = app
+        self.log = log
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        query = query_pairs(scope)
+        requested = profile_requested(scope)
+        if requested and not is_admin(headers.get(ADMIN_TOKEN_HEADER)):
+            response = JSONResponse({'detail': 'Profiling requires a valid admin token.'}, status_code=403)
+            await response(scope, receive, send)
+            return
+
+        state = ProfileState(requested)
+        token = _profile_state.set(state)
+        tracked = scope['path'].startswith(TRACKED_PREFIX)
+        body_chunks: List[bytes] = []
+        body_size = 0
+        status = 500
+        start = time.perf_counter()
+
+        async def receive_and_capture():
+            nonlocal body_size
+            message = await receive()
+            if tracked and message['type'] == 'http.request':
+                chunk = message.get('body', b'')
+                body_size += len(chunk)
+                if body_size <= MAX_CAPTURED_BODY:
+                    body_chunks.append(chunk)
+            return message
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if state.profile_id is not None:
+                    MutableHeaders(scope=message).append(PROFILE_ID_HEADER, state.profile_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_and_capture, send_with_profile_id)
+        finally:
+            _profile_state.reset(token)
+            if tracked:
+                duration = time.perf_counter() - start
+                self.log.record(duration, {
+                    'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                    'method': scope['method'],
+                    'path': scope['path'],
+                    # [key, value] pairs, e.g. for requests.get(url, params=query)
+                    'query': [[k, v] for k, v in query if k != 'profile'],
+                    'body': _captured_body(body_chunks, body_size > MAX_CAPTURED_BODY),
+                    'status': status,
+                    'duration_ms': round(duration * 1000, 1),
+                    'profile_id': state.profile_id,
+                })
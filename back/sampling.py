@@ -0,0 +1,108 @@
+import math
+from typing import Dict, Optional, Tuple
+import numpy as np
+from scipy.special import ndtri
+
+SAMPLING_METHODS = ('stratified', 'uniform')
+
+
+def _z(confidence: float) -> float:
+    if not 0 < confidence < 1:
+        raise ValueError("confidence has to be in (0, 1)")
+    return float(ndtri(0.5 + confidence / 2.0))
+
+
+def _fpc(n: int, population: int) -> float:
+    return (population - n) / (population - 1) if population > 1 else 0.0
+
+
+# Support error allowed when none is requested: a quarter of the threshold
+def default_tolerance(min_support: float) -> float:
+    return min_support / 4.0
+
+
+def sample_size(population: int, min_support: float, error_tolerance: float, confidence: float = 0.95) -> int:
+    """
+    Smallest sample (drawn without replacement) that estimates a support of min_support
+    to within error_tolerance at the given confidence, per pattern: the normal-approximation
+    size z^2 p (1 - p) / eps^2 with the finite-population correction. Patterns far from the
+    threshold get wider intervals, but are also far from being misclassified.
+    """
+    if not 0 < error_tolerance < min_support:
+        raise ValueError("error_tolerance has to be in (0, min_support)")
+    if population <= 0:
+        return 0
+    p = min(min_support, 0.5)
+    n0 = _z(confidence) ** 2 * p * (1.0 - p) / error_tolerance ** 2
+    return min(population, int(math.ceil(n0 / (1.0 + (n0 - 1.0) / population))))
+
+
+def support_intervals(
+    counts: np.ndarray, n: int, population: int, confidence: float = 0.95
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Wilson score intervals for the population supports behind sample counts out of n,
+    narrowed by the finite-population correction (zero width for a census).
+    """
+    p = np.asarray(counts, dtype=np.float64) / n
+    fpc = _fpc(n, population)
+    if fpc <= 0:
+        return p, p.copy()
+    z2 = _z(confidence) ** 2
+    n_eff = n / fpc
+    center = (p + z2 / (2 * n_eff)) / (1 + z2 / n_eff)
+    half = np.sqrt(z2 * (p * (1 - p) / n_eff + z2 / (4 * n_eff ** 2))) / (1 + z2 / n_eff)
+    return np.clip(center - half, 0.0, 1.0), np.clip(center + half, 0.0, 1.0)
+
+
+def sample_positions(
+    population: int,
+    n: int,
+    strata: Optional[np.ndarray] = None,
+    random_state: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Sorted positions of a sample of n out of range(population), without replacement.
+    With strata codes (one per position) every stratum gets its proportional share
+    (largest remainder), so supports estimated from the sample need no reweighting.
+    """
+    rng = np.random.default_rng(random_state)
+    if n >= population:
+        return np.arange(population)
+    if strata is None:
+        return np.sort(rng.choice(population, size=n, replace=False))
+
+    codes, inverse, sizes = np.unique(strata, return_inverse=True, return_counts=True)
+    quotas = sizes * (n / population)
+    allocation = np.floor(quotas).astype(np.int64)
+    remainder = n - int(allocation.sum())
+    if remainder > 0:
+        allocation[np.argsort(allocation - quotas, kind='stable')[:remainder]] += 1
+    # Group positions by stratum, then draw each stratum's quota from its slice
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+    parts = [
+        rng.choice(order[bounds[s]:bounds[s + 1]], size=int(allocation[s]), replace=False)
+        for s in range(codes.size) if allocation[s] > 0
+    ]
+    return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+
+def approximation_summary(
+    sampling: str,
+    population: int,
+    n: int,
+    error_tolerance: float,
+    confidence: float,
+    mining_support: float,
+    verified: bool,
+) -> Dict[str, object]:
+    return {
+        'sampling': sampling,
+        'population': int(population),
+        'sample_size': int(n),
+        'error_tolerance': error_tolerance,
+        'confidence': confidence,
+        'mining_support': round(mining_support, 6),
+        'verified': verified,
+    }
@@ -0,0 +1,189 @@
+import os
+from typing import Dict, Optional
+import numpy as np
+from scipy.special import bdtrc
+from sequence_kernels import NUMBA_AVAILABLE, SearchBudget
+from sequence_store import SequenceStore
+
+# Admission limits for /api/crime_sequences, checked against the estimate before mining
+MAX_ESTIMATED_PATTERNS = int(os.environ.get('SEQUENCE_MAX_PATTERNS', '200000'))
+MAX_ESTIMATED_SECONDS = float(os.environ.get('SEQUENCE_MAX_SECONDS', '10'))
+# Hard limits for the search itself, in case the estimate was too optimistic
+SEARCH_MAX_NODES = int(os.environ.get('SEQUENCE_SEARCH_MAX_NODES', '1000000'))
+SEARCH_TIME_LIMIT = float(os.environ.get('SEQUENCE_SEARCH_TIME_LIMIT', '30'))
+# 'downgrade' raises min_support / caps the pattern length until the estimate fits, 'reject' refuses
+OVER_BUDGET_POLICIES = ('downgrade', 'reject')
+# Length cap tried first when downgrading an uncapped request
+DOWNGRADE_MAX_LENGTH = 3
+# Support is raised by this factor per downgrade step
+SUPPORT_STEP = 1.5
+
+# Throughput of the search per backend, measured on synthetic LA data (benchmarks.synthetic):
+# item positions scanned per second, plus a fixed cost per recorded pattern
+ITEMS_PER_SECOND = {'numba': 2e8, 'python': 4.5e6}
+SECONDS_PER_PATTERN = {'numba': 2.5e-5, 'python': 1e-4}
+# Width of the log-probability bins used to count candidate patterns
+LOG_BIN_WIDTH = 0.05
+MAX_ESTIMATED_LENGTH = 64
+MAX_COUNTED_PATTERNS = 1e9
+
+
+def estimate_mining_cost(
+    store: SequenceStore,
+    min_support: float,
+    max_length: Optional[int] = None,
+    backend: Optional[str] = None,
+) -> Dict[str, object]:
+    """
+    Predicts how many patterns PrefixSpan will find and how long it will take, from the
+    sessionized sequences alone. Items are treated as independent draws with their observed
+    frequencies, so a pattern's expected support follows from its frequency product and the
+    sequence lengths. Patterns are counted per level by convolving the histogram of log item
+    frequencies, so the cost is independent of the vocabulary size.
+    On synthetic LA data the counts land within ~15% and the runtime within 2x; strongly
+    correlated crime types would make real counts higher.
+    """
+    backend = backend or ('numba' if NUMBA_AVAILABLE else 'python')
+    n_sequences = len(store)
+    min_count = max(1, int(min_support * n_sequences))
+    estimate = {
+        'n_sequences': n_sequences,
+        'n_items': int(store.items.size),
+        'min_count': min_count,
+        'patterns_by_length': [],
+        'estimated_patterns': 0,
+        'estimated_seconds': 0.0,
+    }
+    if n_sequences == 0:
+        return estimate
+
+    lengths, length_counts = np.unique(store.lengths(), return_counts=True)
+    frequencies = np.bincount(store.items.astype(np.int64)) / store.items.size
+    frequencies = frequencies[frequencies > 0]
+    # Item histogram over bins of -log(frequency)
+    item_bins = np.rint(-np.log(frequencies) / LOG_BIN_WIDTH).astype(np.int64)
+    item_hist = np.bincount(item_bins).astype(np.float64)
+    mean_suffix = float(store.items.size) / n_sequences / 2.0
+
+    longest = int(lengths.max())
+    if max_length is not None:
+        longest = min(longest, max_length)
+    longest = min(longest, MAX_ESTIMATED_LENGTH)
+
+    counts, projected = [], []
+    for k in range(1, longest + 1):
+        # PrefixSpan here counts a k-pattern's support inside the projection of its (k-1)-prefix,
+        # so matching it consumes p1, p1 p2, ..., p1..pk: item i is needed k - i + 1 times
+        needed = k * (k + 1) // 2
+        if needed > lengths.max():
+            break
+        level_hist = np.ones(1)
+        for times in range(1, k + 1):
+            scaled = np.zeros((item_hist.size - 1) * times + 1)
+            scaled[::times] = item_hist
+            level_hist = np.convolve(level_hist, scaled)
+        q = np.exp(-np.arange(level_hist.size) * LOG_BIN_WIDTH)
+        # Expected support of a pattern in each bin, summed over the sequence lengths. Greedy matching
+        # waits a geometric number of positions per needed item; with every item at the geometric
+        # mean frequency p, a length-L sequence contains the pattern iff Binomial(L, p) >= needed
+        p = q ** (1.0 / needed)
+        usable = lengths >= needed
+        containing = bdtrc(needed - 1, lengths[usable, None], p[None, :])
+        support = (length_counts[usable, None] * containing).sum(axis=0)
+        frequent = support >= min_count
+        n_frequent = float(level_hist[frequent].sum())
+        if n_frequent < 0.5:
+            break
+        counts.append(n_frequent)
+        projected.append(float((level_hist[frequent] * support[frequent]).sum()) * mean_suffix)
+        # Far over any budget already; the longer levels would only cost time to count
+        if sum(counts) > MAX_COUNTED_PATTERNS:
+            break
+
+    # Each 1-pattern projects the full database; each extension scans its parent's projection
+    # twice (support count and projection), and each projection is scanned once for frequent items
+    work = store.items.size * (1 + 2 * (counts[0] if counts else 0))
+    for k, size in enumerate(projected):
+        branching = counts[k + 1] / counts[k] if k + 1 < len(counts) else 0.0
+        work += size * (1 + 2 * branching)
+    n_patterns = sum(counts)
+    estimate.update({
+        'patterns_by_length': [int(round(c)) for c in counts],
+        'estimated_patterns': int(round(n_patterns)),
+        'estimated_seconds': round(work / ITEMS_PER_SECOND[backend] + n_patterns * SECONDS_PER_PATTERN[backend], 3),
+    })
+    return estimate
+
+
+class MiningBudgetExceeded(ValueError):
+    def __init__(self, admission: Dict[str, object]):
+        super().__init__(admission['reason'])
+        self.admission = admission
+
+
+def within_budget(estimate: Dict[str, object], max_patterns: int, max_seconds: float) -> bool:
+    return estimate['estimated_patterns'] <= max_patterns and estimate['estimated_seconds'] <= max_seconds
+
+
+def admit_mining_request(
+    store: SequenceStore,
+    min_support: float,
+    max_length: Optional[int] = None,
+    on_over_budget: str = 'downgrade',
+    max_patterns: int = MAX_ESTIMATED_PATTERNS,
+    max_seconds: float = MAX_ESTIMATED_SECONDS,
+) -> Dict[str, object]:
+    """
+    Decides whether a mining request may run as asked. Returns the admission record
+    ('accepted', 'downgraded' or 'rejected') with the estimate and the parameters to
+    mine with. Downgrading first caps the pattern length at DOWNGRADE_MAX_LENGTH, then
+    raises min_support step by step until the estimate fits the budget.
+    """
+    if on_over_budget not in OVER_BUDGET_POLICIES:
+        raise ValueError(f"on_over_budget has to be one of {list(OVER_BUDGET_POLICIES)}")
+    requested = {'min_support': min_support, 'max_pattern_length': max_length}
+    estimate = estimate_mining_cost(store, min_support, max_length)
+    admission = {
+        'status': 'accepted',
+        'requested': requested,
+        'applied': dict(requested),
+        'estimate': estimate,
+        'budget': {'max_patterns': max_patterns, 'max_seconds': max_seconds},
+    }
+    if within_budget(estimate, max_patterns, max_seconds):
+        return admission
+    if on_over_budget == 'reject':
+        admission.update({
+            'status': 'rejected',
+            'reason': (
+                f"Estimated {estimate['estimated_patterns']} patterns / {estimate['estimated_seconds']}s "
+                f"exceeds the budget of {max_patterns} patterns / {max_seconds}s; "
+                "raise min_support or set max_pattern_length."
+            ),
+        })
+        return admission
+
+    reasons = []
+    if max_length is None or max_length > DOWNGRADE_MAX_LENGTH:
+        max_length = DOWNGRADE_MAX_LENGTH
+        reasons.append(f"max_pattern_length capped at {max_length}")
+        estimate = estimate_mining_cost(store, min_support, max_length)
+    raised = min_support
+    while not within_budget(estimate, max_patterns, max_seconds) and raised < 1.0:
+        raised = min(1.0, raised * SUPPORT_STEP)
+        estimate = estimate_mining_cost(store, raised, max_length)
+    if raised != min_support:
+        reasons.append(f"min_support raised from {min_support} to {round(raised, 6)}")
+    admission.update({
+        'status': 'downgraded',
+        'applied': {'min_support': round(raised, 6), 'max_pattern_length': max_length},
+        'estimate': estimate,
+        'requested_estimate': admission['estimate'],
+        'reason': "Request exceeded the mining budget: " + ", ".join(reasons) + ".",
+    })
+    return admission
+
+
+# Hard limits for the search that runs after admission
+def search_budget(max_length: Optional[int] = None) -> SearchBudget:
+    return SearchBudget(max_length=max_length, max_nodes=SEARCH_MAX_NODES, time_limit=SEARCH_TIME_LIMIT)
@@ -0,0 +1,226 @@
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# Numba is optional. Without it the kernels below are plain Python functions: still correct
+# (the parity check runs them that way), but PrefixSpan uses its list-based path instead.
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# Compiled kernels are cached on disk (__pycache__, or NUMBA_CACHE_DIR) so workers skip the JIT
+JIT_OPTIONS = {'cache': True, 'nogil': True}
+
+
+@njit(**JIT_OPTIONS)
+def session_starts_kernel(times, window):
+    starts = np.empty(times.size, dtype=np.int64)
+    n = 0
+    start_time = 0
+    for j in range(times.size):
+        if n == 0 or times[j] - start_time > window:
+            starts[n] = j
+            n += 1
+            start_time = times[j]
+    return starts[:n]
+
+
+def session_starts_python(times: np.ndarray, window: int) -> np.ndarray:
+    starts = []
+    start_time = None
+    for j, t in enumerate(times.tolist()):
+        if start_time is None or t - start_time > window:
+            starts.append(j)
+            start_time = t
+    return np.asarray(starts, dtype=np.int64)
+
+
+# Start index of every session in one group's sorted times: a session starts at its first crime
+# and takes every following crime within `window` of that start
+def session_starts(times: np.ndarray, window: int) -> np.ndarray:
+    if NUMBA_AVAILABLE:
+        return session_starts_kernel(np.ascontiguousarray(times, dtype=np.int64), np.int64(window))
+    return session_starts_python(times, window)
+
+
+# A projected database is a set of (start, end) windows into one flat item-code array,
+# so projecting never copies sequence data.
+
+# Items found in at least min_count windows, in order of first appearance, with their counts
+@njit(**JIT_OPTIONS)
+def frequent_items_kernel(items, starts, ends, n_items, min_count):
+    counts = np.zeros(n_items, dtype=np.int64)
+    first_seen = np.full(n_items, -1, dtype=np.int64)
+    last_window = np.full(n_items, -1, dtype=np.int64)
+    n_seen = 0
+    for s in range(starts.size):
+        for p in range(starts[s], ends[s]):
+            item = items[p]
+            if last_window[item] != s:
+                last_window[item] = s
+                counts[item] += 1
+                if first_seen[item] < 0:
+                    first_seen[item] = n_seen
+                    n_seen += 1
+    order = np.full(n_seen, -1, dtype=np.int64)
+    for item in range(n_items):
+        if first_seen[item] >= 0:
+            order[first_seen[item]] = item
+    n_frequent = 0
+    for k in range(n_seen):
+        if counts[order[k]] >= min_count:
+            n_frequent += 1
+    frequent = np.empty(n_frequent, dtype=np.int64)
+    frequent_counts = np.empty(n_frequent, dtype=np.int64)
+    n_frequent = 0
+    for k in range(n_seen):
+        if counts[order[k]] >= min_count:
+            frequent[n_frequent] = order[k]
+            frequent_counts[n_frequent] = counts[order[k]]
+            n_frequent += 1
+    return frequent, frequent_counts
+
+
+# Number of windows that contain pattern as a subsequence
+@njit(**JIT_OPTIONS)
+def support_count_kernel(items, starts, ends, pattern):
+    count = 0
+    for s in range(starts.size):
+        pattern_idx = 0
+        for p in range(starts[s], ends[s]):
+            if items[p] == pattern[pattern_idx]:
+                pattern_idx += 1
+                if pattern_idx == pattern.size:
+                    count += 1
+                    break
+    return count
+
+
+# Non-empty suffixes after the first complete match of pattern in every window
+@njit(**JIT_OPTIONS)
+def project_kernel(items, starts, ends, pattern):
+    new_starts = np.empty(starts.size, dtype=np.int64)
+    new_ends = np.empty(starts.size, dtype=np.int64)
+    n = 0
+    for s in range(starts.size):
+        pattern_idx = 0
+        for p in range(starts[s], ends[s]):
+            if items[p] == pattern[pattern_idx]:
+                pattern_idx += 1
+                if pattern_idx == pattern.size:
+                    if p + 1 < ends[s]:
+                        new_starts[n] = p + 1
+                        new_ends[n] = ends[s]
+                        n += 1
+                    break
+    return new_starts[:n], new_ends[:n]
+
+
+class SearchBudget:
+    """
+    Hard limits for one PrefixSpan search: the longest pattern to grow, the number of
+    patterns to record and the wall time. None means unlimited. Once the node or time
+    limit is hit the search stops and `exhausted` names the limit; what was found so
+    far is still returned.
+    """
+
+    def __init__(self, max_length: Optional[int] = None, max_nodes: Optional[int] = None, time_limit: Optional[float] = None):
+        self.max_length = max_length
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.nodes = 0
+        self.exhausted: Optional[str] = None
+        self._deadline: Optional[float] = None
+
+    def start(self):
+        self.nodes = 0
+        self.exhausted = None
+        self._deadline = time.perf_counter() + self.time_limit if self.time_limit is not None else None
+
+    # Whether a pattern of this length may be extended further
+    def can_extend(self, length: int) -> bool:
+        return self.max_length is None or length < self.max_length
+
+    # Counts one recorded pattern; False once a limit is exhausted
+    def spend(self) -> bool:
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            self.exhausted = 'max_nodes'
+        elif self._deadline is not None and self.nodes % 64 == 0 and time.perf_counter() > self._deadline:
+            self.exhausted = 'time_limit'
+        return self.exhausted is None
+
+
+def prefixspan_csr(
+    offsets: np.ndarray, items: np.ndarray, min_count: int, budget: Optional[SearchBudget] = None
+) -> List[Tuple[Tuple[int, ...], int]]:
+    """
+    PrefixSpan over integer-coded CSR sequences, driving the kernels above.
+    Follows PrefixSpan's list-based search step for step, so patterns, supports
+    and their order (before the final sort) are identical.
+    """
+    items = np.ascontiguousarray(items, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    budget = budget or SearchBudget()
+    results: List[Tuple[Tuple[int, ...], int]] = []
+    if items.size == 0:
+        return results
+    n_items = int(items.max()) + 1
+
+    def recurse(pattern: Tuple[int, ...], starts: np.ndarray, ends: np.ndarray):
+        frequent, _ = frequent_items_kernel(items, starts, ends, n_items, min_count)
+        for item in frequent.tolist():
+            if budget.exhausted:
+                return
+            new_pattern = pattern + (item,)
+            pattern_codes = np.asarray(new_pattern, dtype=np.int64)
+            support = int(support_count_kernel(items, starts, ends, pattern_codes))
+            if support >= min_count:
+                results.append((new_pattern, support))
+                if budget.spend() and budget.can_extend(len(new_pattern)):
+                    new_starts, new_ends = project_kernel(items, starts, ends, pattern_codes)
+                    if new_starts.size:
+                        recurse(new_pattern, new_starts, new_ends)
+
+    starts, ends = offsets[:-1], offsets[1:]
+    frequent, counts = frequent_items_kernel(items, starts, ends, n_items, min_count)
+    for item, support in zip(frequent.tolist(), counts.tolist()):
+        if budget.exhausted:
+            break
+        pattern = (item,)
+        results.append((pattern, support))
+        if budget.spend() and budget.can_extend(1):
+            new_starts, new_ends = project_kernel(items, starts, ends, np.asarray(pattern, dtype=np.int64))
+            if new_starts.size:
+                recurse(pattern, new_starts, new_ends)
+    return results
+
+
+# Sequences of hashable items as CSR arrays plus the code -> item vocabulary
+def encode_sequences(sequences: List[List]) -> Tuple[np.ndarray, np.ndarray, List]:
+    codes: Dict[object, int] = {}
+    flat = [codes.setdefault(item, len(codes)) for seq in sequences for item in seq]
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(seq) for seq in sequences])
+    return offsets, np.asarray(flat, dtype=np.int64), list(codes)
+
+
+# Support of each pattern over the full sequences, exactly as prefixspan_csr counts it: a
+# k-pattern is counted inside the projection of its (k-1)-prefix, which amounts to containing
+# p1, p1 p2, ..., p1..pk one after another
+def pattern_supports(offsets: np.ndarray, items: np.ndarray, patterns: List[Tuple[int, ...]]) -> List[int]:
+    items = np.ascontiguousarray(items, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    starts, ends = offsets[:-1], offsets[1:]
+    supports = []
+    for pattern in patterns:
+        chained = [code for k in range(1, len(pattern) + 1) for code in pattern[:k]]
+        supports.append(int(support_count_kernel(items, starts, ends, np.asarray(chained, dtype=np.int64))))
+    return supports
@@ -2,13 +2,37 @@ import pandas as pd
 import numpy as np
 from typing import List, Dict, Tuple, Set, Optional
 from collections import defaultdict
-from datetime import timedelta
+from sequence_kernels import (
+    NUMBA_AVAILABLE,
+    session_starts_kernel,
+    session_starts_python,
+    encode_sequences,
+    prefixspan_csr,
+    session_starts,
+    pattern_supports,
+    SearchBudget,
+)
+from sequence_store import SequenceStore, sequence_stores
+from sequence_cost import MiningBudgetExceeded, admit_mining_request, search_budget
+from sampling import SAMPLING_METHODS, approximation_summary, default_tolerance, sample_positions, sample_size, support_intervals
+from instrumentation import span
+
+
+# 'numba' runs the compiled CSR kernels, 'python' the list-based search; 'auto' picks numba when installed
+PREFIXSPAN_BACKENDS = ('auto', 'numba', 'python')
+# Most min_support levels one sweep request may ask for
+MAX_SWEEP_LEVELS = 50
 
 
 class PrefixSpan:
     
-    def __init__(self, min_support: float = 0.01):
+    def __init__(self, min_support: float = 0.01, backend: str = 'auto', budget: Optional[SearchBudget] = None):
+        if backend not in PREFIXSPAN_BACKENDS:
+            raise ValueError(f"backend has to be one of {list(PREFIXSPAN_BACKENDS)}")
         self.min_support = min_support
+        self.backend = ('numba' if NUMBA_AVAILABLE else 'python') if backend == 'auto' else backend
+        # Length/node/time limits; budget.exhausted tells whether the last fit was cut short
+        self.budget = budget or SearchBudget()
         self.frequent_patterns = []
     
     # counts how many times a specific pattern appears across all the sequences 
@@ -72,11 +96,15 @@ class PrefixSpan:
         freq_items = self._get_frequent_items(sequences, min_count)
         
         for item in freq_items:
+            if self.budget.exhausted:
+                return
             new_pattern = pattern + (item,)
             support = self._get_support_count(new_pattern, sequences)
             
             if support >= min_count:
                 results.append((new_pattern, support))
+                if not (self.budget.spend() and self.budget.can_extend(len(new_pattern))):
+                    continue
                 
                 projected = self._project_database(new_pattern, sequences)
                 if projected:
@@ -86,6 +114,13 @@ class PrefixSpan:
     def fit(self, sequences: List[List]) -> List[Tuple]:
         if not sequences:
             return []
+
+        self.budget.start()
+        if self.backend == 'numba':
+            offsets, items, vocabulary = encode_sequences(sequences)
+            patterns = self.fit_csr(offsets, items)
+            self.frequent_patterns = [(tuple(vocabulary[code] for code in pattern), support) for pattern, support in patterns]
+            return self.frequent_patterns
         
         min_count = max(1, int(self.min_support * len(sequences)))
         results = []
@@ -94,9 +129,13 @@ class PrefixSpan:
         freq_items = self._get_frequent_items(sequences, min_count)
         
         for item in freq_items:
+            if self.budget.exhausted:
+                break
             pattern = (item,)
             support = self._get_support_count(pattern, sequences)
             results.append((pattern, support))
+            if not (self.budget.spend() and self.budget.can_extend(1)):
+                continue
             
             # project and recurse
             projected = self._project_database(pattern, sequences)
@@ -106,228 +145,441 @@ class PrefixSpan:
         self.frequent_patterns = sorted(results, key=lambda x: (-x[1], -len(x[0])))
         return self.frequent_patterns
 
+    # Same search over integer-coded CSR sequences (e.g. a SequenceStore's offsets and items);
+    # patterns come back as tuples of item codes
+    def fit_csr(self, offsets: np.ndarray, items: np.ndarray) -> List[Tuple]:
+        n_sequences = len(offsets) - 1
+        if n_sequences <= 0:
+            return []
+        if self.backend == 'python':
+            bounds = np.asarray(offsets).tolist()
+            codes = np.asarray(items).tolist()
+            return self.fit([codes[bounds[i]:bounds[i + 1]] for i in range(n_sequences)])
 
-def prepare_crime_sequences(
+        min_count = max(1, int(self.min_support * n_sequences))
+        self.budget.start()
+        results = prefixspan_csr(offsets, items, min_count, self.budget)
+        self.frequent_patterns = sorted(results, key=lambda x: (-x[1], -len(x[0])))
+        return self.frequent_patterns
+
+
+def prepare_crime_sequence_store(
     df: pd.DataFrame,
     *,
     time_window_hours: int = 24,
     area_col: Optional[str] = None,
     grouping_method: str = 'spatial_temporal'
-) -> Tuple[List[List], pd.DataFrame]:
+) -> SequenceStore:
 
-    df_work = df.copy()
-    
-    # datetime
-    if 'date' in df_work.columns:
-        df_work['date'] = pd.to_datetime(df_work['date'], errors='coerce')
-    
-    # Create full datetime if we have time
-    if 'time' in df_work.columns and 'hour' in df_work.columns:
-        df_work['datetime'] = df_work['date'] + pd.to_timedelta(df_work['hour'], unit='h')
-    else:
-        df_work['datetime'] = df_work['date']
-    
-    # Sort by datetime
-    df_work = df_work.sort_values('datetime').reset_index(drop=True)
-    
-    sequences = []
-    sequence_metadata = []
-    
     # define how crimes are grouped into a single "sequence"
-    # temporal_only: groups crimes based on if occurred within  time_window_hours of  previous crime (regardless of location) 
-    # area_based: groups crimes that occur within geographical area and within time window 
+    # temporal_only: groups crimes based on if occurred within  time_window_hours of  previous crime (regardless of location)
+    # area_based: groups crimes that occur within geographical area and within time window
     # spatial_temporal: default. groups crimes spatially close & temporally close (within  time_window_hours)
-    
-    if grouping_method == 'temporal_only':
-        
-        # groups all nearby crimes by time window regardless of location
-        current_seq = []
-        seq_start_time = None
-        seq_crimes = []
-        
-        for idx, row in df_work.iterrows():
-            crime_type = row.get('crime_type', 'UNKNOWN')
-            crime_time = row['datetime']
-            
-            if seq_start_time is None or (crime_time - seq_start_time) <= timedelta(hours=time_window_hours):
-                current_seq.append(crime_type)
-                seq_crimes.append(idx)
-                if seq_start_time is None:
-                    seq_start_time = crime_time
-            else:
-                # Save current sequence and start new one
-                if len(current_seq) >= 2:  # Only keep sequences with 2+ crimes
-                    sequences.append(current_seq)
-                    sequence_metadata.append({
-                        'seq_id': len(sequences),
-                        'length': len(current_seq),
-                        'start_time': seq_start_time,
-                        'crime_indices': seq_crimes
-                    })
-                current_seq = [crime_type]
-                seq_crimes = [idx]
-                seq_start_time = crime_time
-        
-        # Add last sequence
-        if len(current_seq) >= 2:
-            sequences.append(current_seq)
-            sequence_metadata.append({
-                'seq_id': len(sequences),
-                'length': len(current_seq),
-                'start_time': seq_start_time,
-                'crime_indices': seq_crimes
-            })
-    
-    # groups by a specific area ID 
-    elif grouping_method == 'area_based' and area_col and area_col in df_work.columns:
-        # Group by area, create sequences within each area
-        for area, area_df in df_work.groupby(area_col):
-            area_df = area_df.sort_values('datetime')
-            current_seq = []
-            seq_start_time = None
-            seq_crimes = []
-            
-            for idx, row in area_df.iterrows():
-                crime_type = row.get('crime_type', 'UNKNOWN')
-                crime_time = row['datetime']
-                
-                if seq_start_time is None or (crime_time - seq_start_time) <= timedelta(hours=time_window_hours):
-                    current_seq.append(crime_type)
-                    seq_crimes.append(idx)
-                    if seq_start_time is None:
-                        seq_start_time = crime_time
-                else:
-                    if len(current_seq) >= 2:
-                        sequences.append(current_seq)
-                        sequence_metadata.append({
-                            'seq_id': len(sequences),
-                            'area': area,
-                            'length': len(current_seq),
-                            'start_time': seq_start_time,
-                            'crime_indices': seq_crimes
-                        })
-                    current_seq = [crime_type]
-                    seq_crimes = [idx]
-                    seq_start_time = crime_time
-            
-            if len(current_seq) >= 2:
-                sequences.append(current_seq)
-                sequence_metadata.append({
-                    'seq_id': len(sequences),
-                    'area': area,
-                    'length': len(current_seq),
-                    'start_time': seq_start_time,
-                    'crime_indices': seq_crimes
-                })
-    
-    else:  # spatial_temporal
-        # Use lat/lon clustering for spatial proximity
-        if 'latitude' in df_work.columns and 'longitude' in df_work.columns:
+
+    needed = ['date', 'time', 'hour', 'crime_type', 'latitude', 'longitude', area_col]
+    df_work = df[[c for c in dict.fromkeys(needed) if c and c in df.columns]].copy()
+
+    with span('sequences.parse_dates', rows=len(df_work)):
+        # datetime
+        if 'date' in df_work.columns:
+            df_work['date'] = pd.to_datetime(df_work['date'], errors='coerce')
+
+        # Create full datetime if we have time
+        if 'time' in df_work.columns and 'hour' in df_work.columns:
+            df_work['datetime'] = df_work['date'] + pd.to_timedelta(df_work['hour'], unit='h')
+        else:
+            df_work['datetime'] = df_work['date']
+
+        # Sort by datetime; crime indices are positions in this sorted order
+        df_work = df_work.sort_values('datetime').reset_index(drop=True)
+        times = df_work['datetime'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        valid = df_work['datetime'].notna().to_numpy()
+
+    with span('sequences.group', rows=len(df_work)):
+        if 'crime_type' in df_work.columns:
+            item_codes, vocabulary = pd.factorize(df_work['crime_type'], use_na_sentinel=False)
+            vocabulary = list(vocabulary)
+        else:
+            item_codes = np.zeros(len(df_work), dtype=np.int64)
+            vocabulary = ['UNKNOWN']
+        if len(vocabulary) > np.iinfo(np.uint16).max:
+            raise ValueError("Too many distinct crime types to encode as uint16")
+
+        # Group code per row (-1 = not grouped), with group labels in groupby's sorted order
+        if grouping_method == 'temporal_only':
+            group_field = None
+            group_codes = np.zeros(len(df_work), dtype=np.int64)
+            group_labels = [None]
+        elif grouping_method == 'area_based' and area_col and area_col in df_work.columns:
+            group_field = 'area'
+            group_codes, group_labels = pd.factorize(df_work[area_col], sort=True)
+            group_labels = list(group_labels)
+        else:  # spatial_temporal
+            group_field = 'spatial_cell'
+            if 'latitude' not in df_work.columns or 'longitude' not in df_work.columns:
+                return SequenceStore.empty(vocabulary, group_field)
             # Simple spatial binning (could use your k-means clusters instead!)
-            df_work['lat_bin'] = pd.cut(df_work['latitude'], bins=10, labels=False)
-            df_work['lon_bin'] = pd.cut(df_work['longitude'], bins=10, labels=False)
-            df_work['spatial_cell'] = df_work['lat_bin'].astype(str) + '_' + df_work['lon_bin'].astype(str)
-            
-            # Create sequences within each spatial cell
-            for cell, cell_df in df_work.groupby('spatial_cell'):
-                cell_df = cell_df.sort_values('datetime')
-                current_seq = []
-                seq_start_time = None
-                seq_crimes = []
-                
-                for idx, row in cell_df.iterrows():
-                    crime_type = row.get('crime_type', 'UNKNOWN')
-                    crime_time = row['datetime']
-                    
-                    if seq_start_time is None or (crime_time - seq_start_time) <= timedelta(hours=time_window_hours):
-                        current_seq.append(crime_type)
-                        seq_crimes.append(idx)
-                        if seq_start_time is None:
-                            seq_start_time = crime_time
-                    else:
-                        if len(current_seq) >= 2:
-                            sequences.append(current_seq)
-                            sequence_metadata.append({
-                                'seq_id': len(sequences),
-                                'spatial_cell': cell,
-                                'length': len(current_seq),
-                                'start_time': seq_start_time,
-                                'crime_indices': seq_crimes
-                            })
-                        current_seq = [crime_type]
-                        seq_crimes = [idx]
-                        seq_start_time = crime_time
-                
-                if len(current_seq) >= 2:
-                    sequences.append(current_seq)
-                    sequence_metadata.append({
-                        'seq_id': len(sequences),
-                        'spatial_cell': cell,
-                        'length': len(current_seq),
-                        'start_time': seq_start_time,
-                        'crime_indices': seq_crimes
-                    })
-    
-    metadata_df = pd.DataFrame(sequence_metadata)
-    return sequences, metadata_df
+            lat_bin = pd.cut(df_work['latitude'], bins=10, labels=False)
+            lon_bin = pd.cut(df_work['longitude'], bins=10, labels=False)
+            spatial_cell = lat_bin.astype(str) + '_' + lon_bin.astype(str)
+            group_codes, group_labels = pd.factorize(spatial_cell, sort=True)
+            group_labels = list(group_labels)
 
+    with span('sequences.sessionize') as stage:
+        # Rows of every group, in datetime order (rows without a datetime never join a sequence)
+        positions = np.flatnonzero(valid & (group_codes >= 0))
+        positions = positions[np.argsort(group_codes[positions], kind='stable')]
+        stage.rows = positions.size
+        group_bounds = np.searchsorted(group_codes[positions], np.arange(len(group_labels) + 1))
+        window = int(time_window_hours * 3600 * 10**9)
 
-def run_crime_sequence_mining(
+        row_parts, length_parts, start_parts, group_parts = [], [], [], []
+        for g in range(len(group_labels)):
+            pos = positions[group_bounds[g]:group_bounds[g + 1]]
+            if pos.size < 2:
+                continue
+            if group_field is not None:
+                # Re-sort within the group exactly like sort_values('datetime') (datetime64 argsort, same tie order)
+                pos = pos[np.argsort(times[pos].view('datetime64[ns]'), kind='quicksort')]
+            group_times = times[pos]
+            starts = session_starts(group_times, window)
+            lengths = np.diff(np.append(starts, pos.size))
+            # Only keep sequences with 2+ crimes
+            kept = lengths >= 2
+            row_parts.append(pos[np.repeat(kept, lengths)])
+            length_parts.append(lengths[kept])
+            start_parts.append(group_times[starts[kept]])
+            group_parts.append(np.full(int(kept.sum()), g))
+
+    if not length_parts or sum(part.size for part in length_parts) == 0:
+        return SequenceStore.empty(vocabulary, group_field)
+
+    rows = np.concatenate(row_parts)
+    lengths = np.concatenate(length_parts)
+    return SequenceStore(
+        np.concatenate([[0], np.cumsum(lengths)]),
+        rows,
+        item_codes[rows],
+        np.concatenate(start_parts),
+        vocabulary,
+        group_codes=np.concatenate(group_parts) if group_field else None,
+        group_labels=group_labels if group_field else None,
+        group_field=group_field,
+    )
+
+
+def prepare_crime_sequences(
+    df: pd.DataFrame,
+    *,
+    time_window_hours: int = 24,
+    area_col: Optional[str] = None,
+    grouping_method: str = 'spatial_temporal'
+) -> Tuple[List[List], pd.DataFrame]:
+    # List-of-lists view of the sequence store, kept for callers of the original API
+    store = prepare_crime_sequence_store(
+        df,
+        time_window_hours=time_window_hours,
+        area_col=area_col,
+        grouping_method=grouping_method
+    )
+    return store.to_lists(), store.metadata_frame()
+
+
+# Sessionized store for a dataset version, kept in the stage cache so that only mining
+# re-runs when min_support, pattern lengths or sampling change; area_col only keys area_based
+def cached_crime_sequence_store(
+    df: pd.DataFrame,
+    *,
+    version: Optional[str] = None,
+    time_window_hours: int = 24,
+    area_col: Optional[str] = None,
+    grouping_method: str = 'spatial_temporal'
+) -> SequenceStore:
+    def build() -> SequenceStore:
+        return prepare_crime_sequence_store(
+            df,
+            time_window_hours=time_window_hours,
+            area_col=area_col,
+            grouping_method=grouping_method
+        )
+
+    if version is None:
+        return build()
+    key = (version, grouping_method, area_col if grouping_method == 'area_based' else None, time_window_hours)
+    return sequence_stores.get_or_build(key, build)
+
+
+# The count a pattern needs at min_support, as PrefixSpan computes it
+def support_count(min_support: float, n_sequences: int) -> int:
+    return max(1, int(min_support * n_sequences))
+
+
+def check_support_sweep(thresholds: List[float]) -> List[float]:
+    levels = sorted(set(float(t) for t in thresholds))
+    if not levels:
+        raise ValueError("support_sweep needs at least one min_support level")
+    if len(levels) > MAX_SWEEP_LEVELS:
+        raise ValueError(f"support_sweep takes at most {MAX_SWEEP_LEVELS} levels")
+    if levels[0] <= 0 or levels[-1] > 1:
+        raise ValueError("support_sweep levels have to be in (0, 1]")
+    return levels
+
+
+def format_patterns(store: SequenceStore, patterns: List[Tuple], n_sequences: int, intervals: Optional[List[Tuple]] = None) -> List[Dict]:
+    formatted = []
+    for i, (pattern, support) in enumerate(patterns):
+        formatted.append({
+            'pattern': store.decode(pattern),
+            'support_count': int(support),
+            'support_pct': round(support / n_sequences * 100, 2),
+            'length': len(pattern)
+        })
+        if intervals is not None:
+            formatted[-1]['support_pct_ci'] = [round(bound * 100, 2) for bound in intervals[i]]
+    return formatted
+
+
+def support_sweep_levels(
+    store: SequenceStore,
+    patterns: List[Tuple],
+    n_sequences: int,
+    levels: List[float],
+    mined_support: float,
+    max_patterns: int = 50,
+    intervals: Optional[List[Tuple]] = None,
+) -> List[Dict]:
+    """
+    Pattern counts, length histograms and top patterns at each min_support level, read off one
+    result set mined at the lowest level. Patterns come sorted by descending support, so every
+    level is a prefix of the list. Levels below the support actually mined are marked incomplete.
+    """
+    supports = np.array([support for _, support in patterns], dtype=np.int64)
+    lengths = np.array([len(pattern) for pattern, _ in patterns], dtype=np.int64)
+    top = format_patterns(store, patterns[:max_patterns], n_sequences, intervals)
+    mined_count = support_count(mined_support, n_sequences)
+    result = []
+    for level in levels:
+        count = support_count(level, n_sequences)
+        n_found = int(np.searchsorted(-supports, -count, side='right'))
+        histogram = np.bincount(lengths[:n_found])
+        result.append({
+            'min_support': level,
+            'min_count': count,
+            'n_patterns_found': n_found,
+            'length_histogram': {str(length): int(n) for length, n in enumerate(histogram.tolist()) if n},
+            'patterns': top[:min(n_found, max_patterns)],
+            'complete': count >= mined_count,
+        })
+    return result
+
+
+# Mines patterns and returns the summary plus the sequence store separately,
+# so large metadata can be streamed instead of embedded in one response dict
+def mine_crime_sequences(
     df: pd.DataFrame,
     *,
     min_support: float = 0.01,
     time_window_hours: int = 24,
     area_col: Optional[str] = None,
     grouping_method: str = 'area_based',
-    max_patterns: int = 50, 
-    min_pattern_length: int = 2 
-) -> Dict:
+    max_patterns: int = 50,
+    min_pattern_length: int = 2,
+    max_pattern_length: Optional[int] = None,
+    on_over_budget: str = 'downgrade',
+    approximate: bool = False,
+    error_tolerance: Optional[float] = None,
+    confidence: float = 0.95,
+    sampling: str = 'stratified',
+    verify: bool = False,
+    random_state: Optional[int] = None,
+    version: Optional[str] = None,
+    support_sweep: Optional[List[float]] = None
+) -> Tuple[Dict, SequenceStore]:
 
-    # Prepare sequences
-    sequences, metadata_df = prepare_crime_sequences(
+    # Prepare sequences (reused from the stage cache when the dataset version is known)
+    store = cached_crime_sequence_store(
         df,
+        version=version,
         time_window_hours=time_window_hours,
         area_col=area_col,
         grouping_method=grouping_method
     )
     
-    if not sequences:
+    if len(store) == 0:
         return {
             'n_sequences': 0,
             'patterns': [],
             'message': 'No sequences found with current parameters'
-        }
+        }, store
+
+    # a support sweep mines once at its lowest level; min_support and every level are then
+    # read off that one result set
+    levels = check_support_sweep(support_sweep) if support_sweep is not None else None
+    lowest_support = min(min_support, levels[0]) if levels else min_support
+
+    # approximate mode mines a sample of the sequences sized from error_tolerance (stratified
+    # by area / spatial cell); with verify it mines below min_support by the tolerance so true
+    # patterns survive the sample before their exact recount
+    n_sequences = len(store)
+    mined = store
+    mining_support = lowest_support
+    if approximate:
+        if sampling not in SAMPLING_METHODS:
+            raise ValueError(f"sampling has to be one of {list(SAMPLING_METHODS)}")
+        error_tolerance = error_tolerance or default_tolerance(lowest_support)
+        n_sample = sample_size(n_sequences, lowest_support, error_tolerance, confidence)
+        with span('sequences.sample', rows=n_sequences):
+            strata = store.group_codes if sampling == 'stratified' else None
+            mined = store.take(sample_positions(n_sequences, n_sample, strata, random_state))
+        if verify:
+            mining_support = lowest_support - error_tolerance
     
-    # running PrefixSpan algo 
-    prefixspan = PrefixSpan(min_support=min_support)
-    patterns = prefixspan.fit(sequences)
+    # estimate the search from the sessionized sequences; over-budget requests are
+    # rejected (MiningBudgetExceeded) or mined with raised support / capped length
+    with span('sequences.admission', rows=len(mined)):
+        admission = admit_mining_request(mined, mining_support, max_pattern_length, on_over_budget)
+    if admission['status'] == 'rejected':
+        raise MiningBudgetExceeded(admission)
+    min_support = max(min_support, admission['applied']['min_support'])
+    lowest_support = max(lowest_support, admission['applied']['min_support'])
+    mining_support = admission['applied']['min_support']
+    max_pattern_length = admission['applied']['max_pattern_length']
+
+    # running PrefixSpan algo on integer-coded sequences
+    with span('sequences.prefixspan', rows=int(mined.items.size)):
+        prefixspan = PrefixSpan(min_support=mining_support, budget=search_budget(max_pattern_length))
+        patterns = prefixspan.fit_csr(mined.offsets, mined.items)
+    lengths = store.lengths()
+
+    intervals = None
+    if approximate:
+        n_candidates = len(patterns)
+        if verify:
+            # exact recount of the sampled candidates over every sequence
+            with span('sequences.verify', rows=n_candidates):
+                supports = pattern_supports(store.offsets, store.items, [pattern for pattern, _ in patterns])
+            min_count = support_count(lowest_support, n_sequences)
+            patterns = [(pattern, support) for (pattern, _), support in zip(patterns, supports) if support >= min_count]
+        else:
+            # sample supports scaled to the population, with their confidence intervals
+            counts = np.array([support for _, support in patterns], dtype=np.int64)
+            lower, upper = support_intervals(counts, len(mined), n_sequences, confidence)
+            kept = np.flatnonzero(counts / len(mined) >= lowest_support).tolist()
+            patterns = [(patterns[i][0], round(counts[i] / len(mined) * n_sequences)) for i in kept]
+            intervals = [(float(lower[i]), float(upper[i])) for i in kept]
+        order = sorted(range(len(patterns)), key=lambda i: (-patterns[i][1], -len(patterns[i][0])))
+        patterns = [patterns[i] for i in order]
+        if intervals is not None:
+            intervals = [intervals[i] for i in order]
     
+    sweep = None
+    n_mined = len(patterns)
+    if levels:
+        with span('sequences.sweep', rows=len(patterns)):
+            sweep = support_sweep_levels(store, patterns, n_sequences, levels, lowest_support, max_patterns, intervals)
+    if lowest_support < min_support:
+        # sorted by descending support, so the patterns at min_support are a prefix
+        min_count = support_count(min_support, n_sequences)
+        n_kept = sum(1 for _, support in patterns if support >= min_count)
+        patterns = patterns[:n_kept]
+        if intervals is not None:
+            intervals = intervals[:n_kept]
+
     # Format results
-    formatted_patterns = []
-    for pattern, support in patterns[:max_patterns]:
-        formatted_patterns.append({
-            'pattern': list(pattern),
-            'support_count': int(support),
-            'support_pct': round(support / len(sequences) * 100, 2),
-            'length': len(pattern)
-        })
+    formatted_patterns = format_patterns(
+        store, patterns[:max_patterns], n_sequences, None if intervals is None else intervals[:max_patterns]
+    )
     
     # stats
     stats = {
-        'n_sequences': len(sequences),
+        'n_sequences': n_sequences,
         'n_patterns_found': len(patterns),
-        'avg_sequence_length': round(np.mean([len(s) for s in sequences]), 2),
-        'max_sequence_length': max([len(s) for s in sequences]),
+        'avg_sequence_length': round(float(np.mean(lengths)), 2),
+        'max_sequence_length': int(lengths.max()),
         'min_support_threshold': min_support,
         'min_pattern_length': min_pattern_length, 
+        'max_pattern_length': max_pattern_length,
         'time_window_hours': time_window_hours,
-        'grouping_method': grouping_method
+        'grouping_method': grouping_method,
+        # 'max_nodes' or 'time_limit' when the search was stopped early and the patterns are partial
+        'search_truncated': prefixspan.budget.exhausted,
     }
     
-    return {
+    result = {
         'statistics': stats,
         'patterns': formatted_patterns,
-        'sequence_metadata': metadata_df.to_dict(orient='records') if not metadata_df.empty else []
+        'admission': admission,
+    }
+    if sweep is not None:
+        result['support_sweep'] = {'mined_support': lowest_support, 'n_patterns_mined': n_mined, 'levels': sweep}
+    if approximate:
+        result['approximation'] = approximation_summary(
+            sampling if mined.group_codes is not None else 'uniform',
+            n_sequences, len(mined), error_tolerance, confidence, mining_support, verify,
+        )
+        result['approximation']['candidates'] = n_candidates
+    return result, store
+
+
+def run_crime_sequence_mining(
+    df: pd.DataFrame,
+    *,
+    min_support: float = 0.01,
+    time_window_hours: int = 24,
+    area_col: Optional[str] = None,
+    grouping_method: str = 'area_based',
+    max_patterns: int = 50, 
+    min_pattern_length: int = 2,
+    max_pattern_length: Optional[int] = None,
+    on_over_budget: str = 'downgrade',
+    version: Optional[str] = None,
+    **approximation_args
+) -> Dict:
+
+    result, store = mine_crime_sequences(
+        df,
+        min_support=min_support,
+        time_window_hours=time_window_hours,
+        area_col=area_col,
+        grouping_method=grouping_method,
+        max_patterns=max_patterns,
+        min_pattern_length=min_pattern_length,
+        max_pattern_length=max_pattern_length,
+        on_over_budget=on_over_budget,
+        version=version,
+        **approximation_args
+    )
+    if 'statistics' in result:
+        with span('sequences.metadata', rows=len(store)):
+            result['sequence_metadata'] = store.metadata_records()
+    return result
+
+
+# Sequence metadata as NDJSON-ready batches of records, read straight from the store
+def iter_sequence_metadata_batches(store: SequenceStore, batch_size: int = 10_000):
+    for start in range(0, len(store), batch_size):
+        yield {'sequence_metadata': store.metadata_records(start, min(start + batch_size, len(store)))}
+
+
+def check_backend_parity(store: SequenceStore, min_support: float = 0.01, time_window_hours: int = 24) -> Dict[str, bool]:
+    """
+    Runs the list-based and kernel paths on the same sequences and reports whether
+    they agree. Without numba installed the kernels run uncompiled, which is slow
+    but checks the same logic.
+    """
+    sequences = store.to_lists()
+    python_patterns = PrefixSpan(min_support, backend='python').fit(sequences)
+    kernel_patterns = PrefixSpan(min_support, backend='numba').fit(sequences)
+    csr_patterns = [
+        (tuple(store.decode(pattern)), support)
+        for pattern, support in PrefixSpan(min_support, backend='numba').fit_csr(store.offsets, store.items)
+    ]
+    times = np.sort(store.start_times)
+    window = int(time_window_hours * 3600 * 10**9)
+    return {
+        'prefixspan': python_patterns == kernel_patterns,
+        'prefixspan_csr': python_patterns == csr_patterns,
+        'session_starts': np.array_equal(session_starts_python(times, window), session_starts_kernel(times, window)),
     }
 
 
@@ -373,3 +625,17 @@ if __name__ == "__main__":
         crimes_display = ' → '.join(seq[:5]) + ('...' if len(seq) > 5 else '')
         print(f"{i}. Length {len(seq)}: {crimes_display}")
 
+
+    # memory of the flat store vs the list-of-lists + metadata DataFrame it replaces
+    import sys
+    store = prepare_crime_sequence_store(df, time_window_hours=48, area_col='AREA', grouping_method='area_based')
+    metadata_df = store.metadata_frame()
+    legacy_bytes = int(metadata_df.memory_usage(deep=True).sum()) if not metadata_df.empty else 0
+    legacy_bytes += sum(sys.getsizeof(seq) for seq in sequences)
+    legacy_bytes += sum(sys.getsizeof(idx) + 28 * len(idx) for idx in metadata_df.get('crime_indices', []))
+    print(f"\nSequence store: {len(store)} sequences, {store.nbytes() / 1e6:.2f} MB")
+    print(f"Lists + metadata DataFrame: {legacy_bytes / 1e6:.2f} MB")
+
+    # both PrefixSpan backends and the sessionization walk have to agree
+    parity = check_backend_parity(store, min_support=0.005, time_window_hours=48)
+    print(f"\nBackend parity (numba installed: {NUMBA_AVAILABLE}): {parity}")
@@ -0,0 +1,340 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Sessionized stores kept in memory, by total bytes; mining parameters can change without resessionizing
+SEQUENCE_CACHE_BYTES = int(os.environ.get('SEQUENCE_CACHE_BYTES', str(256 * 1024 * 1024)))
+# When set, stores evicted from memory (or too large for it) are written here and served memory-mapped
+SEQUENCE_CACHE_DIR = os.environ.get('SEQUENCE_CACHE_DIR')
+# Memory-mapped stores don't count against SEQUENCE_CACHE_BYTES, so their number is bounded separately
+SEQUENCE_CACHE_MAPPED = int(os.environ.get('SEQUENCE_CACHE_MAPPED', '32'))
+
+
+class SequenceStore:
+    """
+    Sessionized crime sequences kept as flat typed arrays (CSR layout):
+    sequence i covers positions offsets[i]:offsets[i + 1] of `rows` (row positions
+    in the datetime-sorted frame) and `items` (crime type codes into `vocabulary`).
+    Optional per-sequence group codes record the area or spatial cell it came from.
+    """
+
+    def __init__(
+        self,
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        items: np.ndarray,
+        start_times: np.ndarray,
+        vocabulary: List,
+        *,
+        group_codes: Optional[np.ndarray] = None,
+        group_labels: Optional[List] = None,
+        group_field: Optional[str] = None,
+    ):
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.items = np.asarray(items, dtype=np.uint16)
+        self.start_times = np.asarray(start_times, dtype=np.int64)
+        self.vocabulary = list(vocabulary)
+        self.group_codes = None if group_codes is None else np.asarray(group_codes, dtype=np.int32)
+        self.group_labels = group_labels
+        self.group_field = group_field
+        # True when the arrays are memory-mapped from files written by save()
+        self.mapped = False
+
+    @classmethod
+    def empty(cls, vocabulary: Optional[List] = None, group_field: Optional[str] = None) -> 'SequenceStore':
+        return cls(
+            np.zeros(1, dtype=np.int32),
+            np.empty(0, dtype=np.int32),
+            np.empty(0, dtype=np.uint16),
+            np.empty(0, dtype=np.int64),
+            vocabulary or [],
+            group_codes=np.empty(0, dtype=np.int32) if group_field else None,
+            group_labels=[] if group_field else None,
+            group_field=group_field,
+        )
+
+    def __len__(self) -> int:
+        return int(self.offsets.size - 1)
+
+    def __iter__(self) -> Iterator[List]:
+        for i in range(len(self)):
+            yield self.sequence(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.slice(*key.indices(len(self))[:2])
+        return self.sequence(key)
+
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def codes(self, i: int) -> np.ndarray:
+        return self.items[self.offsets[i]:self.offsets[i + 1]]
+
+    def row_indices(self, i: int) -> np.ndarray:
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    # Crime types of sequence i, decoded through the vocabulary
+    def sequence(self, i: int) -> List:
+        return [self.vocabulary[code] for code in self.codes(i).tolist()]
+
+    def group(self, i: int):
+        if self.group_codes is None:
+            return None
+        return self.group_labels[self.group_codes[i]]
+
+    # Sequences [start, stop) as a new store sharing the vocabulary and group labels
+    def slice(self, start: int, stop: int) -> 'SequenceStore':
+        lo, hi = self.offsets[start], self.offsets[stop]
+        return SequenceStore(
+            self.offsets[start:stop + 1] - lo,
+            self.rows[lo:hi],
+            self.items[lo:hi],
+            self.start_times[start:stop],
+            self.vocabulary,
+            group_codes=None if self.group_codes is None else self.group_codes[start:stop],
+            group_labels=self.group_labels,
+            group_field=self.group_field,
+        )
+
+    # The sequences at the given (sorted) positions as a new store, e.g. a sample
+    def take(self, positions: np.ndarray) -> 'SequenceStore':
+        positions = np.asarray(positions, dtype=np.int64)
+        lengths = self.lengths()[positions]
+        flat = np.repeat(self.offsets[positions].astype(np.int64) - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        flat += np.arange(int(lengths.sum()))
+        return SequenceStore(
+            np.concatenate([[0], np.cumsum(lengths)]),
+            self.rows[flat],
+            self.items[flat],
+            self.start_times[positions],
+            self.vocabulary,
+            group_codes=None if self.group_codes is None else self.group_codes[positions],
+            group_labels=self.group_labels,
+            group_field=self.group_field,
+        )
+
+    # Integer-coded sequences as Python lists, the input format of PrefixSpan
+    def code_lists(self) -> List[List[int]]:
+        items = self.items.tolist()
+        bounds = self.offsets.tolist()
+        return [items[bounds[i]:bounds[i + 1]] for i in range(len(self))]
+
+    def to_lists(self) -> List[List]:
+        return [[self.vocabulary[code] for code in seq] for seq in self.code_lists()]
+
+    def decode(self, pattern) -> List:
+        return [self.vocabulary[code] for code in pattern]
+
+    # Columns of the legacy metadata frame for sequences [start, stop); seq_id is 1-based
+    def metadata_columns(self, start: int = 0, stop: Optional[int] = None) -> Dict[str, object]:
+        stop = len(self) if stop is None else stop
+        lo = self.offsets[start]
+        bounds = (self.offsets[start:stop + 1] - lo).tolist()
+        rows = self.rows[lo:self.offsets[stop]].tolist()
+        columns: Dict[str, object] = {'seq_id': np.arange(start + 1, stop + 1)}
+        if self.group_codes is not None:
+            labels = self.group_labels
+            columns[self.group_field] = [labels[code] for code in self.group_codes[start:stop].tolist()]
+        columns['length'] = np.diff(bounds)
+        columns['start_time'] = pd.to_datetime(self.start_times[start:stop], unit='ns')
+        columns['crime_indices'] = [rows[bounds[i]:bounds[i + 1]] for i in range(stop - start)]
+        return columns
+
+    # Metadata as JSON-ready records with start times as ISO strings, built without a DataFrame
+    def metadata_records(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, object]]:
+        stop = len(self) if stop is None else stop
+        if stop <= start:
+            return []
+        columns = self.metadata_columns(start, stop)
+        columns['seq_id'] = columns['seq_id'].tolist()
+        columns['length'] = columns['length'].tolist()
+        columns['start_time'] = columns['start_time'].strftime('%Y-%m-%dT%H:%M:%S').tolist()
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+    def metadata_frame(self, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        if len(self) == 0:
+            return pd.DataFrame()
+        return pd.DataFrame(self.metadata_columns(start, stop))
+
+    def nbytes(self) -> int:
+        total = self.offsets.nbytes + self.rows.nbytes + self.items.nbytes + self.start_times.nbytes
+        if self.group_codes is not None:
+            total += self.group_codes.nbytes
+        return int(total)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {'offsets': self.offsets, 'rows': self.rows, 'items': self.items, 'start_times': self.start_times}
+        if self.group_codes is not None:
+            arrays['group_codes'] = self.group_codes
+        return arrays
+
+    # Cached stores are shared by concurrent requests, so their arrays must not change
+    def freeze(self) -> 'SequenceStore':
+        for values in self.arrays().values():
+            values.setflags(write=False)
+        return self
+
+    # One .npy per array plus the labels as JSON under `prefix`; the JSON is written last and marks a complete set
+    def save(self, prefix: str):
+        for name, values in self.arrays().items():
+            tmp_path = f"{prefix}.{name}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, values, allow_pickle=False)
+            os.replace(tmp_path, f"{prefix}.{name}.npy")
+        labels = {'vocabulary': self.vocabulary, 'group_labels': self.group_labels, 'group_field': self.group_field}
+        tmp_path = f"{prefix}.{os.getpid()}.tmp.json"
+        with open(tmp_path, 'w') as f:
+            json.dump(labels, f, default=lambda value: value.item())
+        os.replace(tmp_path, f"{prefix}.json")
+
+    @classmethod
+    def load(cls, prefix: str) -> Optional['SequenceStore']:
+        if not os.path.exists(f"{prefix}.json"):
+            return None
+        with open(f"{prefix}.json") as f:
+            labels = json.load(f)
+        arrays = {
+            name: np.load(f"{prefix}.{name}.npy", mmap_mode='r', allow_pickle=False)
+            for name in ('offsets', 'rows', 'items', 'start_times', 'group_codes')
+            if name != 'group_codes' or labels['group_field'] is not None
+        }
+        store = cls(
+            arrays['offsets'],
+            arrays['rows'],
+            arrays['items'],
+            arrays['start_times'],
+            labels['vocabulary'],
+            group_codes=arrays.get('group_codes'),
+            group_labels=labels['group_labels'],
+            group_field=labels['group_field'],
+        )
+        store.mapped = True
+        return store.freeze()
+
+
+StageKey = Tuple
+
+
+class SequenceStoreCache:
+    """
+    LRU of sessionized stores keyed by (dataset version, grouping parameters), bounded by
+    the total bytes of the stores held in memory. With a spill directory, evicted stores go to
+    disk instead of away, and stores larger than the whole budget are written there straight
+    away and kept memory-mapped; mapped stores are bounded by count (max_mapped) instead.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = SEQUENCE_CACHE_BYTES,
+        spill_dir: Optional[str] = SEQUENCE_CACHE_DIR,
+        max_mapped: int = SEQUENCE_CACHE_MAPPED,
+    ):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_mapped = max_mapped
+        self.nbytes = 0
+        self.n_mapped = 0
+        self._entries: "OrderedDict[StageKey, SequenceStore]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Builds in progress, so concurrent requests for the same key wait for one build
+        self._building: Dict[StageKey, Future] = {}
+
+    def _spill_prefix(self, key: StageKey) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+        return os.path.join(self.spill_dir, f"sequences-{digest}")
+
+    def _spill(self, key: StageKey, store: SequenceStore) -> str:
+        prefix = self._spill_prefix(key)
+        if not os.path.exists(f"{prefix}.json"):
+            os.makedirs(self.spill_dir, exist_ok=True)
+            store.save(prefix)
+        return prefix
+
+    def _remove(self, key: StageKey) -> Optional[SequenceStore]:
+        store = self._entries.pop(key, None)
+        if store is not None:
+            if store.mapped:
+                self.n_mapped -= 1
+            else:
+                self.nbytes -= store.nbytes()
+        return store
+
+    def get(self, key: StageKey) -> Optional[SequenceStore]:
+        with self._lock:
+            store = self._entries.get(key)
+            if store is not None:
+                self._entries.move_to_end(key)
+                return store
+        if self.spill_dir is None:
+            return None
+        store = SequenceStore.load(self._spill_prefix(key))
+        if store is not None:
+            self.put(key, store)
+        return store
+
+    def put(self, key: StageKey, store: SequenceStore):
+        if not store.mapped and store.nbytes() > self.max_bytes:
+            if self.spill_dir is None:
+                return
+            # Too large to hold in memory: served from its memory-mapped files instead
+            store = SequenceStore.load(self._spill(key, store))
+        evicted = []
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = store.freeze()
+            if store.mapped:
+                self.n_mapped += 1
+            else:
+                self.nbytes += store.nbytes()
+            while self.nbytes > self.max_bytes or self.n_mapped > self.max_mapped:
+                # Oldest entry of whichever kind is over its bound
+                evicted_key = next(k for k, s in self._entries.items() if s.mapped == (self.nbytes <= self.max_bytes))
+                evicted.append((evicted_key, self._remove(evicted_key)))
+        # Written outside the lock; mapped stores and stores read back from disk are already there
+        if self.spill_dir is not None:
+            for evicted_key, evicted_store in evicted:
+                self._spill(evicted_key, evicted_store)
+
+    def get_or_build(self, key: StageKey, build: Callable[[], SequenceStore]) -> SequenceStore:
+        store = self.get(key)
+        if store is not None:
+            return store
+        with self._lock:
+            future = self._building.get(key)
+            owner = future is None
+            if owner:
+                future = self._building[key] = Future()
+        if not owner:
+            # Gets the store (or the exception) of the build already running, even one too large to cache
+            return future.result()
+        try:
+            # A build for this key may have finished since the lookup above
+            store = self.get(key)
+            if store is None:
+                store = build()
+                self.put(key, store)
+            future.set_result(store)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._building[key]
+        return store
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.n_mapped = 0
+
+
+sequence_stores = SequenceStoreCache()
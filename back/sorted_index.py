@@ -0,0 +1,110 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+class SortedRowIndex:
+    """
+    Row permutations of a dataset ordered by a column, so a page of rows in that order
+    is a slice (or, for a filtered subset, an argpartition over the subset's ranks)
+    instead of a full sort. The date order is built at load; other sort keys on first use.
+    Missing values sort last in both directions, like sort_values.
+    """
+
+    def __init__(self, df: pd.DataFrame, date_col: str = 'date'):
+        self.df = df
+        self.date_col = date_col if date_col in df.columns else None
+        self.dates: Optional[pd.Series] = None
+        # sort key -> (ascending order, descending order, number of non-missing values at their front)
+        self._orders: Dict[str, Tuple[np.ndarray, np.ndarray, int]] = {}
+        # (sort key, descending) -> inverse permutation; both caches are filled under _lock
+        self._ranks: Dict[Tuple[str, bool], np.ndarray] = {}
+        self._lock = threading.Lock()
+        if self.date_col is not None:
+            self.dates = pd.to_datetime(df[self.date_col], errors='coerce').reset_index(drop=True)
+            self._orders[self.date_col] = self._build_order(self.dates)
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    # Both directions are built once, so serving a page never copies a whole permutation
+    @staticmethod
+    def _build_order(values: pd.Series) -> Tuple[np.ndarray, np.ndarray, int]:
+        values = values.reset_index(drop=True)
+        order = values.sort_values().index.to_numpy(dtype=np.int64)
+        n_valid = int(values.notna().sum())
+        descending = np.concatenate([order[:n_valid][::-1], order[n_valid:]])
+        order.setflags(write=False)
+        descending.setflags(write=False)
+        return order, descending, n_valid
+
+    def sort_keys(self) -> List[str]:
+        return list(self.df.columns)
+
+    def order(self, key: str, descending: bool = False) -> np.ndarray:
+        if key not in self.df.columns:
+            raise ValueError(f"Unknown sort key '{key}'.")
+        with self._lock:
+            if key not in self._orders:
+                self._orders[key] = self._build_order(self.df[key])
+            ascending_order, descending_order, _ = self._orders[key]
+        return descending_order if descending else ascending_order
+
+    # Position of every row in the given order (the inverse permutation)
+    def rank(self, key: str, descending: bool = False) -> np.ndarray:
+        cache_key = (key, descending)
+        order = self.order(key, descending)
+        with self._lock:
+            ranks = self._ranks.get(cache_key)
+            if ranks is None:
+                ranks = np.empty(order.size, dtype=np.int64)
+                ranks[order] = np.arange(order.size)
+                ranks.setflags(write=False)
+                self._ranks[cache_key] = ranks
+        return ranks
+
+    # Rows whose date falls in [date_from, date_to], as sorted positions
+    def date_range(self, date_from: Optional[str] = None, date_to: Optional[str] = None) -> np.ndarray:
+        if self.date_col is None:
+            raise ValueError("Dataset has no date column to filter on.")
+        order, _, n_valid = self._orders[self.date_col]
+        sorted_dates = self.dates.to_numpy(dtype='datetime64[ns]')[order[:n_valid]]
+        lo = 0 if date_from is None else np.searchsorted(sorted_dates, np.datetime64(pd.Timestamp(date_from)), side='left')
+        hi = n_valid if date_to is None else np.searchsorted(sorted_dates, np.datetime64(pd.Timestamp(date_to)), side='right')
+        return np.sort(order[lo:hi])
+
+    def page(
+        self,
+        key: str,
+        offset: int,
+        limit: int,
+        descending: bool = False,
+        rows: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, int]:
+        """
+        Positions of rows [offset, offset + limit) in the given order, restricted to `rows`
+        when given, plus the total number of rows being paged over.
+        """
+        if rows is None:
+            order = self.order(key, descending)
+            return order[offset:offset + limit], int(order.size)
+        total = int(rows.size)
+        stop = min(offset + limit, total)
+        if offset >= stop:
+            return np.empty(0, dtype=np.int64), total
+        ranks = self.rank(key, descending)[rows]
+        # Only the first `stop` rows of the subset need ordering
+        nearest = np.argpartition(ranks, stop - 1)[:stop] if stop < total else np.arange(total)
+        nearest = nearest[np.argsort(ranks[nearest], kind='stable')]
+        return rows[nearest[offset:]], total
+
+    # JSON-ready records for the given positions, dates as YYYY-MM-DD and missing values as None
+    def records(self, positions: np.ndarray, columns: List[str]) -> List[Dict[str, object]]:
+        frame = self.df.iloc[positions][columns].reset_index(drop=True)
+        if self.date_col in columns:
+            frame[self.date_col] = self.dates.iloc[positions].dt.strftime(DATE_FORMAT).to_numpy()
+        frame = frame.astype(object).where(frame.notna(), None)
+        return frame.to_dict(orient='records')
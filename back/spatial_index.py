@@ -0,0 +1,159 @@
+import math
+from typing import Dict, Tuple
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_M = 6371008.8
+# Finest grid resolution kept in the summed-area table (~110 m of latitude)
+DEFAULT_BASE_STEP = 0.001
+# Upper bound on base grid cells; coarser base steps are used for very wide extents
+MAX_BASE_CELLS = 25_000_000
+# Upper bound on the cells of a hotspot grid binned straight from the points
+MAX_GRID_CELLS = 4_000_000
+
+
+# Local equirectangular projection to meters around a reference latitude
+def project_to_meters(lat: np.ndarray, lon: np.ndarray, ref_lat: float) -> np.ndarray:
+    lat_rad = np.radians(np.asarray(lat, dtype=float))
+    lon_rad = np.radians(np.asarray(lon, dtype=float))
+    x = EARTH_RADIUS_M * lon_rad * math.cos(math.radians(ref_lat))
+    y = EARTH_RADIUS_M * lat_rad
+    return np.column_stack([x, y])
+
+
+class SpatialIndex:
+    """
+    Built once over the crime coordinates. Keeps a KD-tree on projected
+    coordinates for radius queries, a latitude-sorted permutation for bounding
+    boxes and a summed-area table of counts on a fine base grid so any coarser
+    grid is answered by prefix-sum lookups instead of re-binning every row.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, *, base_step: float = DEFAULT_BASE_STEP):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        if not valid.any():
+            raise ValueError("No valid latitude/longitude values to index")
+
+        # Positions into the original frame for every indexed point
+        self.rows = np.flatnonzero(valid)
+        self.lat = lat[valid]
+        self.lon = lon[valid]
+        self.ref_lat = float(self.lat.mean())
+        self.tree = cKDTree(project_to_meters(self.lat, self.lon, self.ref_lat))
+
+        self.lat_order = np.argsort(self.lat, kind='stable')
+        self.sorted_lat = self.lat[self.lat_order]
+
+        # Anchor the base grid the same way get_hotspot_grid anchors its bins
+        self.origin_lat = math.floor(self.lat.min() * 100) / 100
+        self.origin_lon = math.floor(self.lon.min() * 100) / 100
+        span_lat = self.lat.max() - self.origin_lat
+        span_lon = self.lon.max() - self.origin_lon
+        while (span_lat / base_step + 1) * (span_lon / base_step + 1) > MAX_BASE_CELLS:
+            base_step *= 2
+        self.base_step = base_step
+        self.n_lat = int(math.floor(span_lat / base_step + 1e-9)) + 1
+        self.n_lon = int(math.floor(span_lon / base_step + 1e-9)) + 1
+
+        lat_idx = self._base_index(self.lat, self.origin_lat, self.n_lat)
+        lon_idx = self._base_index(self.lon, self.origin_lon, self.n_lon)
+        counts = np.bincount(lat_idx * self.n_lon + lon_idx, minlength=self.n_lat * self.n_lon)
+        # Zero-padded 2D prefix sums: sat[i, j] = points in base cells [0, i) x [0, j)
+        self.sat = np.zeros((self.n_lat + 1, self.n_lon + 1), dtype=np.int64)
+        self.sat[1:, 1:] = counts.reshape(self.n_lat, self.n_lon).cumsum(axis=0).cumsum(axis=1)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, lat_col: str = 'latitude', lon_col: str = 'longitude', **kwargs) -> 'SpatialIndex':
+        if lat_col not in df.columns or lon_col not in df.columns:
+            raise ValueError(f"Missing required columns: {[c for c in (lat_col, lon_col) if c not in df.columns]}")
+        lat = pd.to_numeric(df[lat_col], errors='coerce').to_numpy(dtype=float)
+        lon = pd.to_numeric(df[lon_col], errors='coerce').to_numpy(dtype=float)
+        return cls(lat, lon, **kwargs)
+
+    def _base_index(self, values: np.ndarray, origin: float, n: int) -> np.ndarray:
+        idx = np.floor((values - origin) / self.base_step + 1e-9).astype(np.int64)
+        return np.clip(idx, 0, n - 1)
+
+    def __len__(self) -> int:
+        return int(self.rows.size)
+
+    # Counts on a grid whose bin size is snapped to a multiple of the base step
+    def grid(self, bin_size: float) -> Dict[str, object]:
+        if bin_size <= 0:
+            raise ValueError("bin_size has to be positive")
+        factor = max(1, int(round(bin_size / self.base_step)))
+        lat_cuts = np.append(np.arange(0, self.n_lat, factor), self.n_lat)
+        lon_cuts = np.append(np.arange(0, self.n_lon, factor), self.n_lon)
+        # Box sums from the summed-area table at every pair of cut points
+        block = self.sat[np.ix_(lat_cuts, lon_cuts)]
+        counts = block[1:, 1:] - block[:-1, 1:] - block[1:, :-1] + block[:-1, :-1]
+        step = factor * self.base_step
+        return {
+            'bin_size': step,
+            'lat_edges': self.origin_lat + lat_cuts * self.base_step,
+            'lon_edges': self.origin_lon + lon_cuts * self.base_step,
+            'counts': counts,
+        }
+
+    # Rows within radius_m meters of a point, nearest first
+    def radius_query(self, lat: float, lon: float, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        if radius_m < 0:
+            raise ValueError("radius_m has to be non-negative")
+        center = project_to_meters(np.array([lat]), np.array([lon]), self.ref_lat)[0]
+        hits = np.asarray(self.tree.query_ball_point(center, r=radius_m), dtype=np.int64)
+        if hits.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=float)
+        distances = np.linalg.norm(self.tree.data[hits] - center, axis=1)
+        order = np.argsort(distances, kind='stable')
+        return self.rows[hits[order]], distances[order]
+
+    # Rows inside an inclusive lat/lon bounding box, in frame order
+    def bbox_query(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        if min_lat > max_lat or min_lon > max_lon:
+            raise ValueError("Bounding box minimums have to be <= maximums")
+        lo = np.searchsorted(self.sorted_lat, min_lat, side='left')
+        hi = np.searchsorted(self.sorted_lat, max_lat, side='right')
+        candidates = self.lat_order[lo:hi]
+        lon = self.lon[candidates]
+        inside = candidates[(lon >= min_lon) & (lon <= max_lon)]
+        return self.rows[np.sort(inside)]
+
+
+# Sparse (lat_idx, lon_idx, count) triplets for the non-empty cells of a grid
+def sparse_cells(counts: np.ndarray) -> np.ndarray:
+    lat_idx, lon_idx = np.nonzero(counts)
+    return np.column_stack([lat_idx, lon_idx, counts[lat_idx, lon_idx]])
+
+
+# Interval of each value, closed on the right with the first interval closed on both sides
+# (pd.cut(include_lowest=True)); -1 outside the edges and for NaN
+def cut_indices(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    idx = np.searchsorted(edges, values, side='left') - 1
+    idx[values == edges[0]] = 0
+    idx[(idx < 0) | (idx >= len(edges) - 1) | np.isnan(values)] = -1
+    return idx
+
+
+def hotspot_grid(lat: np.ndarray, lon: np.ndarray, bin_size: float = 0.05) -> Dict[str, object]:
+    """
+    Crime counts on the hotspot grid: edges start at the minimum floored to 0.01 degrees and
+    step by bin_size past the maximum ceiled to 0.01, binned as by cut_indices. Both
+    /api/hotspot_grid and /api/hotspot_gi count on this grid, so their cell indices line up.
+    """
+    if bin_size <= 0:
+        raise ValueError("bin_size has to be positive")
+    lat_bins = np.arange(np.floor(lat.min() * 100) / 100, np.ceil(lat.max() * 100) / 100 + bin_size, bin_size)
+    lon_bins = np.arange(np.floor(lon.min() * 100) / 100, np.ceil(lon.max() * 100) / 100 + bin_size, bin_size)
+    n_lat, n_lon = len(lat_bins) - 1, len(lon_bins) - 1
+    if n_lat * n_lon > MAX_GRID_CELLS:
+        raise ValueError(f"A {n_lat} x {n_lon} grid is over the {MAX_GRID_CELLS:,} cell limit; use a larger bin_size")
+
+    # Count crimes per lat/lon bin in one bincount over flattened cell ids
+    lat_idx = cut_indices(lat, lat_bins)
+    lon_idx = cut_indices(lon, lon_bins)
+    binned = (lat_idx >= 0) & (lon_idx >= 0)
+    counts = np.bincount(lat_idx[binned] * n_lon + lon_idx[binned], minlength=n_lat * n_lon).reshape(n_lat, n_lon)
+    return {'bin_size': bin_size, 'lat_edges': lat_bins, 'lon_edges': lon_bins, 'counts': counts}
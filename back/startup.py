@@ -0,0 +1,152 @@
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# WARMUP=1 precomputes the default responses of the parameterless endpoints before /readyz passes
+WARMUP = os.environ.get('WARMUP', '0') == '1'
+GATED_PREFIX = '/api/'
+RETRY_AFTER_SECONDS = 5
+
+
+class Readiness:
+    """
+    Startup progress of the app: 'starting' -> 'loading' -> 'warming' -> 'ready', or 'failed'.
+    API requests are served once the datasets are loaded ('warming' or 'ready');
+    /readyz only passes when everything, warmup included, is done.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self.status = 'starting'
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.stage_seconds: Dict[str, float] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self.status in ('warming', 'ready')
+
+    @property
+    def ready(self) -> bool:
+        return self.status == 'ready'
+
+    def set_status(self, status: str, error: Optional[str] = None):
+        with self._lock:
+            self.status = status
+            self.error = error
+        if status in ('ready', 'failed'):
+            self._done.set()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.stage_seconds[stage] = round(seconds, 3)
+
+    # Block until startup finished (or failed); True when the app is ready
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        self._done.wait(timeout)
+        return self.ready
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'status': self.status,
+                'error': self.error,
+                'uptime_s': round(time.time() - self.started_at, 3),
+                'stages': dict(self.stage_seconds),
+            }
+
+
+readiness = Readiness()
+
+
+def run_startup(load: Callable[[], None], warmup_steps: List[Tuple[str, Callable[[], object]]], warmup: bool = WARMUP):
+    """
+    Loads the datasets, then (optionally) runs the warmup steps, updating `readiness`.
+    A failing warmup step is logged and skipped; a failing load marks the app as failed.
+    """
+    readiness.set_status('loading')
+    start = time.perf_counter()
+    try:
+        load()
+    except Exception as exc:
+        logger.exception("Loading the datasets failed")
+        readiness.set_status('failed', error=str(exc))
+        return
+    readiness.record('load', time.perf_counter() - start)
+
+    if warmup:
+        readiness.set_status('warming')
+        for name, step in warmup_steps:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                logger.exception("Warmup step '%s' failed", name)
+                continue
+            readiness.record(f'warmup.{name}', time.perf_counter() - start)
+    readiness.set_status('ready')
+
+
+# Runs the startup in a daemon thread so the server binds (and /healthz answers) right away
+def start_in_background(target: Callable[[], None]) -> threading.Thread:
+    thread = threading.Thread(target=target, name='startup', daemon=True)
+    thread.start()
+    return thread
+
+
+# Responses of parameterless endpoints by (handler, arguments); cleared whenever the datasets are loaded
+_precomputed: Dict[Tuple, object] = {}
+_precomputed_lock = threading.Lock()
+
+
+def precomputed(handler):
+    """
+    Memoizes a handler whose response depends only on the loaded datasets and a few
+    small-domain arguments (e.g. format), so warmup can compute it ahead of the first request.
+    """
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        key = (handler.__name__, args, tuple(sorted(kwargs.items())))
+        if key in _precomputed:
+            return _precomputed[key]
+        result = handler(*args, **kwargs)
+        with _precomputed_lock:
+            _precomputed[key] = result
+        return result
+
+    return wrapper
+
+
+def clear_precomputed():
+    with _precomputed_lock:
+        _precomputed.clear()
+
+
+class ReadinessMiddleware:
+    """
+    Answers API requests with 503 (and Retry-After) until the datasets are loaded,
+    instead of failing on half-initialized state. Health, metrics and admin routes pass through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or readiness.loaded or not scope['path'].startswith(GATED_PREFIX):
+            await self.app(scope, receive, send)
+            return
+        state = readiness.snapshot()
+        detail = "Datasets failed to load." if state['status'] == 'failed' else "Datasets are still loading."
+        response = JSONResponse(
+            {'detail': detail, 'status': state['status']},
+            status_code=503,
+            headers={'Retry-After': str(RETRY_AFTER_SECONDS)},
+        )
+        await response(scope, receive, send)
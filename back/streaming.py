@@ -0,0 +1,55 @@
+import json
+from typing import Any, Dict, Iterable, Iterator
+import numpy as np
+import pandas as pd
+from fastapi.responses import StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+# Rows per NDJSON line when streaming large arrays
+STREAM_BATCH_SIZE = 10_000
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+# One JSON document per line; NumPy arrays are written without going through Python lists
+def dumps_line(payload: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(
+            payload,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE,
+        )
+    return (json.dumps(payload, default=_default) + "\n").encode()
+
+
+# Columnar batches {name: {column: array slice}} over equally long arrays
+def array_batches(name: str, columns: Dict[str, np.ndarray], batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    n_rows = len(next(iter(columns.values()))) if columns else 0
+    for start in range(0, n_rows, batch_size):
+        yield {name: {col: values[start:start + batch_size] for col, values in columns.items()}}
+
+
+def ndjson_response(header: Dict[str, Any], batches: Iterable[Dict[str, Any]]) -> StreamingResponse:
+    """
+    Streams the small summary first, then the large parts as NDJSON lines, so
+    clients can start rendering before the whole payload has been encoded.
+    """
+    def generate() -> Iterator[bytes]:
+        yield dumps_line(header)
+        for batch in batches:
+            yield dumps_line(batch)
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,97 @@
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import chi2_contingency
+import cooccurrence
+from cooccurrence import CooccurrenceMatrix, get_cooccurrence
+
+
+# Fixed categorical frame with skewed columns, a numeric column and some missing values
+def synthetic_frame(n_rows=2000, seed=11):
+    rng = np.random.default_rng(seed)
+    season = rng.choice(['Winter', 'Spring', 'Summer', 'Fall'], size=n_rows)
+    crime = np.where(season == 'Summer', rng.choice(['Theft', 'Assault'], size=n_rows, p=[0.7, 0.3]),
+                     rng.choice(['Theft', 'Assault', 'Fraud'], size=n_rows))
+    df = pd.DataFrame({'season': season, 'crime_type': crime, 'weapon_used': rng.integers(0, 2, size=n_rows)})
+    df.loc[rng.random(n_rows) < 0.05, 'crime_type'] = np.nan
+    return df
+
+
+COLUMNS = ['season', 'crime_type', 'weapon_used']
+
+
+@pytest.mark.parametrize('col_a,col_b', [('season', 'crime_type'), ('season', 'weapon_used'), ('crime_type', 'weapon_used')])
+def test_contingency_matches_crosstab(col_a, col_b):
+    df = synthetic_frame()
+    matrix = CooccurrenceMatrix.build(df, COLUMNS)
+    expected = pd.crosstab(df[col_a], df[col_b])
+    pd.testing.assert_frame_equal(matrix.contingency(col_a, col_b), expected, check_names=False)
+    stat, p = matrix.chi_square(col_a, col_b)
+    expected_stat, expected_p, _, _ = chi2_contingency(expected)
+    assert stat == pytest.approx(expected_stat) and p == pytest.approx(expected_p)
+
+
+def test_pair_stats_match_crosstab():
+    df = synthetic_frame()
+    matrix = CooccurrenceMatrix.build(df, COLUMNS)
+    stats = matrix.pair_stats('season', 'crime_type')
+    n_rows = len(df)
+    for row in stats.itertuples(index=False):
+        mask_a = df['season'] == row.season
+        mask_c = df['crime_type'] == row.crime_type
+        table = pd.crosstab(mask_a, mask_c)
+        assert row.count == table.loc[True, True]
+        assert row.support == pytest.approx(row.count / n_rows)
+        assert row.confidence == pytest.approx(row.count / mask_a.sum())
+        assert row.lift == pytest.approx(row.confidence / (mask_c.sum() / n_rows))
+        expected_stat, expected_p, _, _ = chi2_contingency(table)
+        assert row.chi2 == pytest.approx(expected_stat) and row.p_value == pytest.approx(expected_p)
+
+
+def test_rule_stats_match_mlxtend():
+    mlxtend = pytest.importorskip('mlxtend.frequent_patterns')
+    df = synthetic_frame()
+    onehot = pd.get_dummies(df[COLUMNS].astype(str).where(df[COLUMNS].notna()))
+    itemsets = mlxtend.apriori(onehot, min_support=0.01, max_len=2, use_colnames=True)
+    rules = mlxtend.association_rules(itemsets, metric='lift', min_threshold=0.0)
+    assert not rules.empty
+
+    matrix = CooccurrenceMatrix.build(df, COLUMNS)
+    # One-hot names are 'column_value'; none of these column names is a prefix of another
+    def item(itemset):
+        (name,) = itemset
+        col = next(c for c in COLUMNS if name.startswith(c + '_'))
+        return col, name[len(col) + 1:]
+
+    antecedents = matrix.item_positions([item(a) for a in rules['antecedents']])
+    consequents = matrix.item_positions([item(c) for c in rules['consequents']])
+    assert (antecedents >= 0).all() and (consequents >= 0).all()
+    stats = matrix.rule_stats(antecedents, consequents)
+    for metric in ('support', 'confidence', 'lift'):
+        np.testing.assert_allclose(stats[metric], rules[metric].to_numpy(), rtol=1e-12)
+
+
+def test_item_positions_missing_item():
+    matrix = CooccurrenceMatrix.build(synthetic_frame(), COLUMNS)
+    positions = matrix.item_positions([('season', 'Winter'), ('season', 'Monsoon'), ('area', 'X'), ('weapon_used', '1')])
+    assert positions[0] >= 0 and positions[3] >= 0
+    assert positions[1] == -1 and positions[2] == -1
+
+
+def test_cache_is_shared_across_threads(monkeypatch):
+    monkeypatch.setattr(cooccurrence, '_matrix_cache', type(cooccurrence._matrix_cache)())
+    df = synthetic_frame(500)
+    results = []
+
+    def worker(k):
+        for i in range(20):
+            results.append(get_cooccurrence(df, COLUMNS, version=f"v{(k + i) % 12}"))
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 160
+    assert len(cooccurrence._matrix_cache) == cooccurrence.MAX_CACHED_MATRICES
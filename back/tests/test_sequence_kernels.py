@@ -0,0 +1,104 @@
+import importlib
+import sys
+import numpy as np
+import pytest
+from sequence_kernels import NUMBA_AVAILABLE, session_starts, session_starts_kernel, session_starts_python
+from sequence_mining import PrefixSpan
+from sequence_store import SequenceStore
+
+
+# Fixed CSR sequences: a few hand-written ones with repeats and shared subsequences,
+# then random ones over a small vocabulary so patterns of length 3+ are frequent
+def synthetic_csr(n_sequences=300, n_items=6, max_length=9, seed=7):
+    rng = np.random.default_rng(seed)
+    sequences = [[0, 1, 2, 1, 0], [1, 1, 1], [2, 0, 1], [0], [3, 2, 1, 0, 3]]
+    for _ in range(n_sequences):
+        sequences.append(rng.integers(0, n_items, size=rng.integers(1, max_length + 1)).tolist())
+    offsets = np.concatenate([[0], np.cumsum([len(seq) for seq in sequences])]).astype(np.int32)
+    items = np.concatenate(sequences).astype(np.uint16)
+    return offsets, items, sequences
+
+
+@pytest.mark.parametrize('min_support', [0.5, 0.1, 0.02])
+def test_prefixspan_backends_agree(min_support):
+    offsets, items, sequences = synthetic_csr()
+    python_patterns = PrefixSpan(min_support, backend='python').fit(sequences)
+    assert python_patterns
+    assert PrefixSpan(min_support, backend='numba').fit(sequences) == python_patterns
+    assert PrefixSpan(min_support, backend='numba').fit_csr(offsets, items) == python_patterns
+    assert PrefixSpan(min_support, backend='python').fit_csr(offsets, items) == python_patterns
+
+
+def test_prefixspan_backends_agree_on_labels():
+    _, _, sequences = synthetic_csr(n_sequences=100)
+    labelled = [[f"CRIME {code}" for code in seq] for seq in sequences]
+    python_patterns = PrefixSpan(0.05, backend='python').fit(labelled)
+    assert PrefixSpan(0.05, backend='numba').fit(labelled) == python_patterns
+    assert all(isinstance(item, str) for pattern, _ in python_patterns for item in pattern)
+
+
+def test_prefixspan_empty_input():
+    empty = SequenceStore.empty()
+    assert PrefixSpan(0.1, backend='python').fit([]) == []
+    assert PrefixSpan(0.1, backend='numba').fit_csr(empty.offsets, empty.items) == []
+
+
+@pytest.mark.parametrize('window', [0, 5, 60, 10**6])
+def test_session_starts_kernel_matches_python(window):
+    rng = np.random.default_rng(3)
+    times = np.sort(rng.integers(0, 2000, size=500)).astype(np.int64)
+    expected = session_starts_python(times, window)
+    assert np.array_equal(session_starts_kernel(times, np.int64(window)), expected)
+    assert np.array_equal(session_starts(times, window), expected)
+
+
+def test_session_starts_boundaries():
+    times = np.array([0, 10, 10, 11, 25, 26, 40], dtype=np.int64)
+    # A session takes every crime within the window of its first one, the window itself included
+    assert session_starts_python(times, 10).tolist() == [0, 3, 4, 6]
+    assert session_starts_kernel(times, np.int64(10)).tolist() == [0, 3, 4, 6]
+    assert session_starts_python(times[:0], 10).tolist() == []
+    assert session_starts_kernel(times[:0], np.int64(10)).tolist() == []
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba is not installed")
+def test_kernels_are_compiled():
+    assert hasattr(session_starts_kernel, 'py_func')
+
+
+# Reimports the kernels and the miner with `import numba` failing
+@pytest.fixture
+def without_numba(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'numba', None)
+    for name in ('sequence_kernels', 'sequence_mining'):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    kernels = importlib.import_module('sequence_kernels')
+    mining = importlib.import_module('sequence_mining')
+    yield kernels, mining
+    for name in ('sequence_kernels', 'sequence_mining'):
+        sys.modules.pop(name, None)
+
+
+def test_fallback_without_numba(without_numba):
+    kernels, mining = without_numba
+    assert not kernels.NUMBA_AVAILABLE
+    assert not hasattr(kernels.session_starts_kernel, 'py_func')
+    assert mining.PrefixSpan().backend == 'python'
+
+    offsets, items, sequences = synthetic_csr(n_sequences=120)
+    expected = PrefixSpan(0.05, backend='python').fit(sequences)
+    # The uncompiled kernels still run and agree with the list-based search
+    assert mining.PrefixSpan(0.05).fit_csr(offsets, items) == expected
+    assert mining.PrefixSpan(0.05, backend='numba').fit_csr(offsets, items) == expected
+
+    times = np.sort(np.random.default_rng(5).integers(0, 500, size=200)).astype(np.int64)
+    assert np.array_equal(kernels.session_starts(times, 20), session_starts_python(times, 20))
+
+
+def test_check_backend_parity():
+    from sequence_mining import check_backend_parity
+    offsets, items, sequences = synthetic_csr(n_sequences=80)
+    store = SequenceStore(offsets, np.arange(items.size), items, np.arange(len(sequences)) * 3600 * 10**9, list(range(6)))
+    assert check_backend_parity(store, min_support=0.05, time_window_hours=2) == {
+        'prefixspan': True, 'prefixspan_csr': True, 'session_starts': True,
+    }
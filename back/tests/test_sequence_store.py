@@ -0,0 +1,56 @@
+import threading
+import time
+import numpy as np
+import pytest
+from sequence_store import SequenceStore, SequenceStoreCache
+
+
+def small_store():
+    offsets = np.array([0, 2, 5])
+    return SequenceStore(offsets, np.arange(5), np.array([0, 1, 1, 2, 0]), np.array([0, 3600 * 10**9]), ['A', 'B', 'C'])
+
+
+def run_concurrently(target, n_threads=8):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+# Stores over the memory budget with no spill directory are never cached, so waiters must share the built one
+@pytest.mark.parametrize('max_bytes', [1 << 20, 0])
+def test_get_or_build_builds_once(max_bytes):
+    cache = SequenceStoreCache(max_bytes=max_bytes, spill_dir=None)
+    calls = []
+
+    def build():
+        calls.append(1)
+        time.sleep(0.05)
+        return small_store()
+
+    results = run_concurrently(lambda: cache.get_or_build(('v1', 'key'), build))
+    assert len(calls) == 1
+    assert len(results) == 8 and all(store is results[0] for store in results)
+    assert not cache._building
+
+
+def test_get_or_build_failure_reaches_waiters():
+    cache = SequenceStoreCache(spill_dir=None)
+
+    def build():
+        time.sleep(0.05)
+        raise ValueError('bad parameters')
+
+    def call():
+        try:
+            return cache.get_or_build(('v1', 'key'), build)
+        except ValueError as exc:
+            return exc
+
+    results = run_concurrently(call)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert not cache._building
+    assert cache.get_or_build(('v1', 'key'), small_store).vocabulary == ['A', 'B', 'C']
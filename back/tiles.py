@@ -0,0 +1,70 @@
+import math
+from typing import Dict
+import numpy as np
+import pandas as pd
+
+# Zoom levels kept in the pyramid; city-wide views start around zoom 9
+MIN_ZOOM = 8
+MAX_ZOOM = 16
+# Each tile is split into TILE_RESOLUTION x TILE_RESOLUTION count cells
+TILE_BITS = 6
+TILE_RESOLUTION = 1 << TILE_BITS
+# Web Mercator is undefined at the poles
+MAX_MERCATOR_LAT = 85.05112878
+
+
+# Global Web Mercator cell coordinates at the finest level (MAX_ZOOM tiles x TILE_RESOLUTION cells)
+def mercator_cells(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    lat = np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    scale = float(1 << (MAX_ZOOM + TILE_BITS))
+    x = (lon + 180.0) / 360.0
+    lat_rad = np.radians(lat)
+    y = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / math.pi) / 2.0
+    cx = np.clip(np.floor(x * scale), 0, scale - 1).astype(np.int64)
+    cy = np.clip(np.floor(y * scale), 0, scale - 1).astype(np.int64)
+    return np.column_stack([cx, cy])
+
+
+class TilePyramid:
+    """
+    Crime counts per tile cell for every zoom level, computed once.
+    Every level stores a sorted array of packed (tile, cell) keys with their counts,
+    so a tile lookup is two binary searches and a slice.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        cells = mercator_cells(lat[valid], lon[valid])
+        self.n_points = int(valid.sum())
+        self.levels: Dict[int, tuple] = {}
+        for z in range(MIN_ZOOM, MAX_ZOOM + 1):
+            shift = MAX_ZOOM - z
+            cx = cells[:, 0] >> shift
+            cy = cells[:, 1] >> shift
+            tile = ((cx >> TILE_BITS) << z) | (cy >> TILE_BITS)
+            local = ((cy & (TILE_RESOLUTION - 1)) << TILE_BITS) | (cx & (TILE_RESOLUTION - 1))
+            keys, counts = np.unique((tile << (2 * TILE_BITS)) | local, return_counts=True)
+            self.levels[z] = (keys, counts.astype(np.int32))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, lat_col: str = 'latitude', lon_col: str = 'longitude') -> 'TilePyramid':
+        lat = pd.to_numeric(df[lat_col], errors='coerce').to_numpy(dtype=float)
+        lon = pd.to_numeric(df[lon_col], errors='coerce').to_numpy(dtype=float)
+        return cls(lat, lon)
+
+    # Non-empty cells of tile (z, x, y) as (cell, count) with cell = row * TILE_RESOLUTION + col
+    def tile(self, z: int, x: int, y: int) -> np.ndarray:
+        if z not in self.levels:
+            raise ValueError(f"Zoom level has to be between {MIN_ZOOM} and {MAX_ZOOM}")
+        if not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            raise ValueError("Tile coordinates out of range for this zoom level")
+        keys, counts = self.levels[z]
+        base = ((x << z) | y) << (2 * TILE_BITS)
+        lo = np.searchsorted(keys, base, side='left')
+        hi = np.searchsorted(keys, base + (1 << (2 * TILE_BITS)), side='left')
+        return np.column_stack([keys[lo:hi] - base, counts[lo:hi]]).astype(np.int32)
+
+    def nbytes(self) -> int:
+        return sum(keys.nbytes + counts.nbytes for keys, counts in self.levels.values())
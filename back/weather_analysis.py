@@ -1,7 +1,13 @@
+import numpy as np
 import pandas as pd
-from scipy.stats import chi2_contingency
-from mlxtend.frequent_patterns import apriori, association_rules
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from bitmap_index import CategoricalBitmapIndex
+from frequent_itemsets import mine_frequent_itemsets, itemsets_frame, generate_rules, count_itemsets
+from cooccurrence import get_cooccurrence
+from instrumentation import span
+from sampling import SAMPLING_METHODS, approximation_summary, default_tolerance, sample_positions, sample_size, support_intervals
+
+APRIORI_ENGINES = ('native', 'mlxtend')
 
 # Helper function for season (also used in preprocess_data.py)
 def get_season(month: int) -> str:
@@ -14,46 +20,78 @@ def get_season(month: int) -> str:
     else:
         return 'Fall'
 
-# Helper function to parse one-hot encoded item strings
-def parse_onehot(item_string: str):
-    """
-    Parses a one-hot encoded item string (e.g., 'column_name_value')
-    to return (original_column_name, value).
-    Handles original column names that might contain underscores.
-    """
-    last_underscore_index = item_string.rfind('_')
-    if last_underscore_index != -1:
-        col_name = item_string[:last_underscore_index]
-        value = item_string[last_underscore_index + 1:]
-        return (col_name, value)
-    else:
-        # Fallback for items that might not be in 'col_value' format
-        return (item_string, True) # Potentially risky, consider error handling
-
-# Helper function for Chi-square test
-def chi_square_for_rule(df_local_param: pd.DataFrame, antecedent: tuple, consequent: tuple) -> tuple[Optional[float], Optional[float]]:
-    # Both antecedent and consequent are tuples of (column_name, value)
-    mask_a = df_local_param[antecedent[0]] == antecedent[1]
-    mask_c = df_local_param[consequent[0]] == consequent[1]
-    table = pd.crosstab(mask_a, mask_c)
-    # More robust check for valid table for chi2
-    if table.shape != (2,2) or (table.values==0).any():
-        return None, None
-    # Check if there's enough variation for chi2_contingency
-    if len(mask_a.unique()) < 2 or len(mask_c.unique()) < 2:
-        return None, None
-    chi2, p, _, _ = chi2_contingency(table)
-    return float(chi2), float(p)
-
-def run_seasonal_analysis(df: pd.DataFrame) -> Dict[str, Any]:
+# (column, value) of a one-hot item name; column names may contain underscores, so the longest match wins
+def item_column_value(name: str, columns: List[str]) -> Tuple[str, str]:
+    col = max((c for c in columns if name.startswith(c + '_')), key=len, default=None)
+    if col is None:
+        return name, ''
+    return col, name[len(col) + 1:]
+
+# Rules by descending lift; ties (to 12 decimals, so both engines' rounding agrees) go by
+# antecedent then consequent items, so the order doesn't depend on how the rules were generated
+def sort_rules(rules_df: pd.DataFrame) -> pd.DataFrame:
+    keys = pd.DataFrame({
+        'lift': rules_df['lift'].round(12),
+        'antecedents': rules_df['antecedents'].map(lambda items: ', '.join(sorted(items))),
+        'consequents': rules_df['consequents'].map(lambda items: ', '.join(sorted(items))),
+    }, index=rules_df.index)
+    order = keys.sort_values(['lift', 'antecedents', 'consequents'], ascending=[False, True, True], kind='stable').index
+    return rules_df.loc[order]
+
+def run_seasonal_analysis(
+    df: pd.DataFrame,
+    bitmap_index: Optional[CategoricalBitmapIndex] = None,
+    *,
+    min_support: float = 0.05,
+    max_len: Optional[int] = None,
+    metric: str = 'lift',
+    min_threshold: float = 1.0,
+    engine: str = 'native',
+    dataset_version: Optional[str] = None,
+    approximate: bool = False,
+    error_tolerance: Optional[float] = None,
+    confidence: float = 0.95,
+    sampling: str = 'stratified',
+    verify: bool = False,
+    random_state: Optional[int] = None,
+) -> Dict[str, Any]:
     """
     Performs seasonal crime analysis including Apriori algorithm and Chi-square tests.
+    A prebuilt bitmap index over the same rows can be passed in to skip building one.
+    engine='native' mines itemsets from the bitmap index; 'mlxtend' uses one-hot + mlxtend.
+    With a dataset_version the season/crime/weapon co-occurrence matrix is cached across calls.
+    approximate=True mines a row sample sized from error_tolerance (stratified by season) and
+    reports support intervals; verify=True recounts the sampled itemsets on all rows instead.
     """
-    dfLocal = df.copy() # Work on a copy of the input DataFrame
+    if engine not in APRIORI_ENGINES:
+        raise ValueError(f"engine has to be one of {list(APRIORI_ENGINES)}")
+
+    full_df = df
+    population = len(df)
+    mining_support = min_support
+    if approximate:
+        if engine != 'native':
+            raise ValueError("approximate mode needs engine='native'")
+        if sampling not in SAMPLING_METHODS:
+            raise ValueError(f"sampling has to be one of {list(SAMPLING_METHODS)}")
+        error_tolerance = error_tolerance or default_tolerance(min_support)
+        n_sample = sample_size(population, min_support, error_tolerance, confidence)
+        if sampling == 'stratified' and 'season' not in df.columns:
+            sampling = 'uniform'
+        with span('seasonal.sample', rows=population):
+            strata = pd.factorize(df['season'])[0] if sampling == 'stratified' else None
+            df = df.iloc[sample_positions(population, n_sample, strata, random_state)]
+        # Verified runs mine below min_support by the tolerance so itemsets truly above it
+        # survive the sample before their exact recount
+        if verify:
+            mining_support = min_support - error_tolerance
+
+    with span('seasonal.prepare', rows=len(df)):
+        dfLocal = df.copy() # Work on a copy of the input DataFrame
     
-    # Add season column
-    dfLocal['date'] = pd.to_datetime(dfLocal['date'])
-    dfLocal['season'] = dfLocal['date'].dt.month.apply(get_season)
+        # Add season column
+        dfLocal['date'] = pd.to_datetime(dfLocal['date'])
+        dfLocal['season'] = dfLocal['date'].dt.month.apply(get_season)
     
     if dfLocal.empty:
         raise ValueError("Dataset is empty after date processing.")
@@ -70,75 +108,137 @@ def run_seasonal_analysis(df: pd.DataFrame) -> Dict[str, Any]:
     if not cols_for_apriori:
         raise ValueError('No relevant columns found for Apriori analysis.')
 
-    apriori_df = dfLocal[cols_for_apriori].astype(str)
-    onehot = pd.get_dummies(apriori_df)
-    
-    if onehot.empty:
-        raise ValueError('No suitable data for Apriori after encoding.')
-    
+    full_index = bitmap_index
+    with span('seasonal.index', rows=len(dfLocal)):
+        if bitmap_index is None or bitmap_index.n_rows != len(dfLocal) or not all(
+            bitmap_index.has_column(col) for col in cols_for_apriori
+        ):
+            bitmap_index = CategoricalBitmapIndex.build(dfLocal, cols_for_apriori)
+
     frequent_itemsets_df = pd.DataFrame()
     rules_df = pd.DataFrame()
     apriori_results = []
     top5 = []
 
-    frequent_itemsets_df = apriori(onehot, min_support=0.05, use_colnames=True)
+    with span('seasonal.itemsets', rows=len(dfLocal)):
+        if engine == 'native':
+            # Itemsets straight from the integer-coded row sets, no dense one-hot frame
+            itemset_counts = mine_frequent_itemsets(
+                bitmap_index, cols_for_apriori, min_support=mining_support, max_len=max_len
+            )
+            n_rows = len(dfLocal)
+            support_ci = None
+            if approximate:
+                n_candidates = len(itemset_counts)
+                if verify:
+                    # Exact counts of the sampled candidates over every row
+                    if full_index is None or full_index.n_rows != population or not all(
+                        full_index.has_column(col) for col in cols_for_apriori
+                    ):
+                        full_index = CategoricalBitmapIndex.build(full_df, cols_for_apriori)
+                    itemset_counts = count_itemsets(full_index, cols_for_apriori, list(itemset_counts))
+                    n_rows = population
+                    itemset_counts = {k: v for k, v in itemset_counts.items() if v / n_rows >= min_support}
+                else:
+                    lower, upper = support_intervals(
+                        np.fromiter(itemset_counts.values(), dtype=np.int64, count=len(itemset_counts)),
+                        n_rows, population, confidence,
+                    )
+                    support_ci = {k: [float(lo), float(hi)] for k, lo, hi in zip(itemset_counts, lower, upper)}
+            frequent_itemsets_df = itemsets_frame(itemset_counts, n_rows)
+        else:
+            from mlxtend.frequent_patterns import apriori
+            # Missing values are no item, as in the native engine's index (and pd.crosstab)
+            apriori_df = dfLocal[cols_for_apriori].astype(str).where(dfLocal[cols_for_apriori].notna())
+            onehot = pd.get_dummies(apriori_df)
+
+            if onehot.empty:
+                raise ValueError('No suitable data for Apriori after encoding.')
+
+            frequent_itemsets_df = apriori(onehot, min_support=min_support, max_len=max_len, use_colnames=True)
+
     if frequent_itemsets_df.empty:
-        raise ValueError('No frequent item sets with min_support=0.05. Consider lowering it or checking data.')
-        
-    rules_df = association_rules(frequent_itemsets_df, metric="lift", min_threshold=1)
-    if rules_df.empty:
-        # It's possible to have no rules with min_threshold=1,
-        # but let's make sure it doesn't cause a crash later if apriori_results is empty
-        pass
-    else:
-        rules_df = rules_df.sort_values(by='lift', ascending=False)
-        processed_rules_df = rules_df[['antecedents', 'consequents', 'support', 'confidence', 'lift']].copy()
-        processed_rules_df['antecedents'] = processed_rules_df['antecedents'].apply(lambda x: list(x))
-        processed_rules_df['consequents'] = processed_rules_df['consequents'].apply(lambda x: list(x))
+        raise ValueError(f'No frequent item sets with min_support={min_support}. Consider lowering it or checking data.')
+
+    with span('seasonal.rules', rows=len(frequent_itemsets_df)):
+        if engine == 'native':
+            rules_df = generate_rules(itemset_counts, n_rows, metric=metric, min_threshold=min_threshold)
+        else:
+            from mlxtend.frequent_patterns import association_rules
+            rules_df = association_rules(frequent_itemsets_df, metric=metric, min_threshold=min_threshold)
+        if rules_df.empty:
+            # It's possible to have no rules with min_threshold=1,
+            # but let's make sure it doesn't cause a crash later if apriori_results is empty
+            pass
+        else:
+            rules_df = sort_rules(rules_df)
+            processed_rules_df = rules_df[['antecedents', 'consequents', 'support', 'confidence', 'lift']].copy()
+            processed_rules_df['antecedents'] = processed_rules_df['antecedents'].apply(sorted)
+            processed_rules_df['consequents'] = processed_rules_df['consequents'].apply(sorted)
+            if engine == 'native' and support_ci is not None:
+                processed_rules_df['support_ci'] = [
+                    support_ci[a | c] for a, c in zip(rules_df['antecedents'], rules_df['consequents'])
+                ]
         
-        apriori_results = processed_rules_df.to_dict(orient='records')
-        top5_df = processed_rules_df.head(5).copy()
-        top5 = top5_df.to_dict(orient='records')
+            apriori_results = processed_rules_df.to_dict(orient='records')
+            top5_df = processed_rules_df.head(5).copy()
+            top5 = top5_df.to_dict(orient='records')
     
-    # --- Annotate each rule with chi-square ---
-    for rule in apriori_results:
-        if len(rule['antecedents']) == 1 and len(rule['consequents']) == 1:
-            antecedent_str = rule['antecedents'][0]
-            consequent_str = rule['consequents'][0]
-            
-            antecedent = parse_onehot(antecedent_str)
-            consequent = parse_onehot(consequent_str)
-            
-            chi2, p = chi_square_for_rule(dfLocal, antecedent, consequent)
-            rule['chi2'] = chi2
-            rule['p_value'] = p
+    # Rule and global tests are slices of one co-occurrence matrix
+    with span('seasonal.cooccurrence', rows=len(dfLocal)):
+        if not approximate:
+            cooccurrence = get_cooccurrence(dfLocal, cols_for_apriori, dataset_version)
+        elif all(col in full_df.columns for col in cols_for_apriori):
+            # One pass over all rows (cached per version), so the tests and charts stay exact
+            cooccurrence = get_cooccurrence(full_df, cols_for_apriori, dataset_version)
         else:
+            cooccurrence = get_cooccurrence(dfLocal, cols_for_apriori)
+
+    # --- Annotate each rule with chi-square ---
+    # All single-antecedent/single-consequent rules are tested in one vectorized pass
+    # over the matrix's pair counts and item totals
+    with span('seasonal.rule_chi_square', rows=len(apriori_results)):
+        pair_rules = [
+            i for i, rule in enumerate(apriori_results)
+            if len(rule['antecedents']) == 1 and len(rule['consequents']) == 1
+        ]
+        for rule in apriori_results:
             rule['chi2'] = None
             rule['p_value'] = None
+        if pair_rules:
+            antecedents = cooccurrence.item_positions(
+                [item_column_value(apriori_results[i]['antecedents'][0], cols_for_apriori) for i in pair_rules]
+            )
+            consequents = cooccurrence.item_positions(
+                [item_column_value(apriori_results[i]['consequents'][0], cols_for_apriori) for i in pair_rules]
+            )
+            found = (antecedents >= 0) & (consequents >= 0)
+            pair_rules = [i for i, ok in zip(pair_rules, found) if ok]
+            stats = cooccurrence.rule_stats(antecedents[found], consequents[found])
+            for i, stat, p in zip(pair_rules, stats['chi2'], stats['p_value']):
+                if not np.isnan(stat):
+                    apriori_results[i]['chi2'] = float(stat)
+                    apriori_results[i]['p_value'] = float(p)
 
-    # --- Chi-square Test: Season vs Crime Type ---
-    contingency1 = pd.crosstab(dfLocal['season'], dfLocal['crime_type'])
-    chi2_1, p_1 = None, None
-    if not contingency1.empty and contingency1.shape[0] > 1 and contingency1.shape[1] > 1:
-        chi2_1, p_1, _, _ = chi2_contingency(contingency1)
-        chi2_1 = float(chi2_1)
-        p_1 = float(p_1)
-
-    # --- Chi-square Test: Season vs Weapon Used ---
-    chi2_2, p_2 = None, None
-    season_weapon_chart = []
-    if 'weapon_used' in dfLocal.columns:
-        contingency2 = pd.crosstab(dfLocal['season'], dfLocal['weapon_used'])
-        if not contingency2.empty and contingency2.shape[0] > 1 and contingency2.shape[1] > 1:
-            chi2_2, p_2, _, _ = chi2_contingency(contingency2)
-            chi2_2 = float(chi2_2)
-            p_2 = float(p_2)
-            season_weapon_chart = [{
-                "season": season,
-                "weapon_counts": contingency2.loc[season].to_dict()
-                }
-                for season in contingency2.index
-            ]
+    # Global tests of independence between whole columns
+    with span('seasonal.global_chi_square', rows=len(dfLocal)):
+        # --- Chi-square Test: Season vs Crime Type ---
+        contingency1 = cooccurrence.contingency('season', 'crime_type')
+        chi2_1, p_1 = cooccurrence.chi_square('season', 'crime_type')
+
+        # --- Chi-square Test: Season vs Weapon Used ---
+        chi2_2, p_2 = None, None
+        season_weapon_chart = []
+        if 'weapon_used' in dfLocal.columns:
+            contingency2 = cooccurrence.contingency('season', 'weapon_used')
+            chi2_2, p_2 = cooccurrence.chi_square('season', 'weapon_used')
+            if chi2_2 is not None:
+                season_weapon_chart = [{
+                    "season": season,
+                    "weapon_counts": contingency2.loc[season].to_dict()
+                    }
+                    for season in contingency2.index
+                ]
             
     # --- Prepare Chart Data for Frontend ---
     season_crime_chart = []
@@ -158,9 +258,9 @@ def run_seasonal_analysis(df: pd.DataFrame) -> Dict[str, Any]:
             for row in top5
         ]
 
-    return {
+    result = {
         "summary": {
-            "n_records": len(dfLocal),
+            "n_records": population,
             "n_rules": len(apriori_results)
         },
         "apriori_rules": apriori_results,
@@ -176,4 +276,10 @@ def run_seasonal_analysis(df: pd.DataFrame) -> Dict[str, Any]:
           },
           "top_5_rules_chart": top_rules_chart
       }
-    }
\ No newline at end of file
+    }
+    if approximate:
+        result["approximation"] = approximation_summary(
+            sampling, population, len(dfLocal), error_tolerance, confidence, mining_support, verify
+        )
+        result["approximation"]["candidates"] = n_candidates
+    return result
@@ -72,7 +72,7 @@ class _ChartsPageState extends State<ChartsPage> {
         _error = 'Hotspots request failed (${hotspotsResp.statusCode})';
       }
       //Retrieve the hot spot grid
-      final gridResp = await http.get(Uri.parse('$baseUrl/api/hotspot_grid'));
+      final gridResp = await http.get(Uri.parse('$baseUrl/api/hotspot_grid?format=nested'));
       if(!mounted) return;
       if (gridResp.statusCode == 200) {
         final gridJson = json.decode(gridResp.body) as Map<String, dynamic>;